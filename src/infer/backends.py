@@ -0,0 +1,303 @@
+"""Inference backends for video prediction.
+
+Every backend exposes ``names`` (class id -> name) and ``predict(frames)``, which
+takes a list of BGR frames and returns one (xyxy boxes, confidences, classes)
+tuple of numpy arrays per frame, in original frame pixels. The same work is
+also available as two stages for the pipelined engine (infer.pipeline):
+``prepare(frame)`` does the per-frame preprocessing and ``infer(items)`` runs
+the model on a list of prepared items. ``thread_safe`` tells whether infer()
+may be called from several threads at once.
+
+- ``ultralytics``: the trained .pt (or any format) through ultralytics.YOLO.
+- ``onnx``: the .onnx exported by train.py, run directly on ONNX Runtime's CPU
+  provider with explicit thread settings, full graph optimization and a
+  preallocated input tensor. Optionally dynamically quantized to int8 first.
+"""
+
+from pathlib import Path
+import ast
+import threading
+
+import cv2
+import numpy as np
+
+BACKENDS = ("ultralytics", "onnx")
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, classes=None) -> np.ndarray:
+    """Greedy non-maximum suppression, returns kept indices by descending score.
+
+    With classes given, boxes of different classes never suppress each other.
+    """
+    if not len(boxes):
+        return np.empty(0, dtype=np.int64)
+
+    if classes is not None:
+        # shift every class into its own coordinate range, one span of all the
+        # boxes apart so negative (tiled or clipped) coordinates cannot overlap
+        low, span = boxes.min(), boxes.max() - boxes.min() + 1
+        boxes = boxes - low + (classes * span)[:, None]
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+class UltralyticsBackend:
+    thread_safe = False
+
+    def __init__(self, model_path: Path, **predict_kwargs):
+        from ultralytics import YOLO
+
+        self.model = YOLO(str(model_path))
+        self.names = self.model.names
+        self.predict_kwargs = predict_kwargs
+
+    def predict(self, frames: list) -> list:
+        results = self.model.predict(
+            frames, stream=True, verbose=False, **self.predict_kwargs
+        )
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            detections.append(
+                (
+                    boxes.xyxy.cpu().numpy(),
+                    boxes.conf.cpu().numpy(),
+                    boxes.cls.cpu().numpy().astype(np.int64),
+                )
+            )
+        return detections
+
+    # ultralytics letterboxes internally, so preparing a frame is a no-op
+    def prepare(self, frame: np.ndarray):
+        return frame
+
+    def infer(self, items: list) -> list:
+        return self.predict(items)
+
+
+class OnnxBackend:
+    thread_safe = True
+
+    def __init__(
+        self,
+        model_path: Path,
+        batch_size: int = 8,
+        imgsz: int = 640,
+        conf: float = 0.25,
+        iou: float = 0.7,
+        max_det: int = 300,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 1,
+        quantize: bool = False,
+    ):
+        import onnxruntime as ort
+
+        model_path = Path(model_path)
+        if quantize:
+            model_path = quantize_onnx(model_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads  # 0 = one per core
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL
+            if inter_op_threads > 1
+            else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+        # static dims come from the export, symbolic ones from the arguments
+        batch, _, height, width = model_input.shape
+        self.static_batch = isinstance(batch, int)
+        self.batch_size = batch if self.static_batch else batch_size
+        self.height = height if isinstance(height, int) else imgsz
+        self.width = width if isinstance(width, int) else imgsz
+
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+        # input tensors and IO bindings are allocated once per calling thread
+        # and reused for every batch instead of allocating a tensor per frame
+        self.local = threading.local()
+
+    def buffers(self):
+        if not hasattr(self.local, "input"):
+            self.local.input = np.full(
+                (self.batch_size, 3, self.height, self.width), 114 / 255, dtype=np.float32
+            )
+            self.local.binding = self.session.io_binding()
+        return self.local.input, self.local.binding
+
+    def letterbox(self, frame: np.ndarray, out: np.ndarray):
+        """Resizes a BGR frame into the RGB CHW slot `out`, returns (gain, left, top)."""
+        h, w = frame.shape[:2]
+        gain = min(self.height / h, self.width / w)
+        nh, nw = round(h * gain), round(w * gain)
+        top, left = (self.height - nh) // 2, (self.width - nw) // 2
+
+        resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        out.fill(114 / 255)
+        np.multiply(
+            resized[..., ::-1].transpose(2, 0, 1),
+            1 / 255,
+            out=out[:, top:top + nh, left:left + nw],
+            casting="unsafe",
+        )
+        return gain, left, top
+
+    def run(self, n: int) -> np.ndarray:
+        """Runs the first n slots of the input buffer, returns their n predictions."""
+        buffer, binding = self.buffers()
+        if n < self.batch_size and self.static_batch:
+            # an export with a fixed batch only takes full batches: zero the
+            # unused slots and drop their predictions
+            buffer[n:] = 0
+            binding.bind_cpu_input(self.input_name, buffer)
+        else:
+            binding.bind_cpu_input(self.input_name, buffer if n == self.batch_size else buffer[:n])
+        binding.bind_output(self.output_name)
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0][:n]
+
+    def postprocess(self, prediction: np.ndarray, frame_shape, gain, left, top):
+        # YOLOv8/11 export: (4 + classes, anchors) with cx, cy, w, h first
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        cls = scores.argmax(1)
+        conf = scores[np.arange(len(cls)), cls]
+
+        keep = conf >= self.conf
+        xywh, conf, cls = prediction[keep, :4], conf[keep], cls[keep]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        keep = nms(boxes, conf, self.iou, cls)[: self.max_det]
+        boxes, conf, cls = boxes[keep], conf[keep], cls[keep]
+
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - left) / gain).clip(0, frame_shape[1])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - top) / gain).clip(0, frame_shape[0])
+        return boxes, conf, cls.astype(np.int64)
+
+    def predict(self, frames: list) -> list:
+        buffer, _ = self.buffers()
+        detections = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            letterboxes = [
+                self.letterbox(frame, buffer[i]) for i, frame in enumerate(chunk)
+            ]
+            predictions = self.run(len(chunk))
+            for frame, prediction, (gain, left, top) in zip(chunk, predictions, letterboxes):
+                detections.append(
+                    self.postprocess(prediction, frame.shape, gain, left, top)
+                )
+        return detections
+
+    def prepare(self, frame: np.ndarray):
+        tensor = np.empty((3, self.height, self.width), dtype=np.float32)
+        return tensor, frame.shape, self.letterbox(frame, tensor)
+
+    def infer(self, items: list) -> list:
+        buffer, _ = self.buffers()
+        detections = []
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            for i, (tensor, _, _) in enumerate(chunk):
+                buffer[i] = tensor
+            predictions = self.run(len(chunk))
+            for (_, frame_shape, (gain, left, top)), prediction in zip(chunk, predictions):
+                detections.append(
+                    self.postprocess(prediction, frame_shape, gain, left, top)
+                )
+        return detections
+
+
+def quantize_onnx(model_path: Path) -> Path:
+    """Writes a dynamically int8-quantized copy next to the model (once) and returns its path."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = model_path.with_name(f"{model_path.stem}.int8.onnx")
+    if not quantized.exists() or quantized.stat().st_mtime < model_path.stat().st_mtime:
+        quantize_dynamic(str(model_path), str(quantized), weight_type=QuantType.QInt8)
+    return quantized
+
+
+def load_backend(name: str, model_path: Path, **options):
+    if name == "onnx":
+        return OnnxBackend(model_path, **options)
+    if name == "ultralytics":
+        return UltralyticsBackend(model_path, **options)
+    raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS}")
+
+
+def add_backend_arguments(parser):
+    """Adds the backend selection flags shared by the inference scripts."""
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="ultralytics",
+        help="Run the model through ultralytics or directly on ONNX Runtime (CPU).",
+    )
+    parser.add_argument(
+        "--intra_op_threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime threads used inside one operator (0 = all cores).",
+    )
+    parser.add_argument(
+        "--inter_op_threads",
+        type=int,
+        default=1,
+        help="ONNX Runtime threads used to run independent operators in parallel.",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Dynamically quantize the ONNX model to int8 before running it.",
+    )
+    parser.add_argument(
+        "--imgsz", type=int, default=640, help="ONNX input size if the export is dynamic."
+    )
+
+
+def backend_from_args(args, **options):
+    # with tiled inference (see infer.tiling) the model sees tiles, not frames
+    tile = getattr(args, "tile", 0)
+    if args.backend == "onnx":
+        options.update(
+            batch_size=args.batch_size,
+            imgsz=tile or args.imgsz,
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+            quantize=args.quantize,
+        )
+    elif tile:
+        options.setdefault("imgsz", tile)
+    return load_backend(args.backend, Path(args.model_path), **options)
@@ -0,0 +1,322 @@
+"""Geo-deduplication of geotagged detections.
+
+A drone pass sees the same piece of litter in many consecutive frames. This
+merges the detections of one class that lie within a ground radius of each
+other (and, optionally, within a time window in the same video) into unique
+items with observation counts. Run from the src folder on a geotag store:
+
+    python -m infer.dedup -s <geotagged store> -i <dji folder> -o items.parquet --radius 1.5
+
+Detections are matched on the ground position of their box center (see
+infer.geotiles.project_to_ground), not on the drone's position, so litter at
+the edge of one frame and the center of the next still falls together.
+
+Matching is done on a grid hash instead of comparing all pairs: detections
+are first collapsed into grid cells small enough that everything in one cell
+is within the radius, then neighbouring cells are found by a few sorted-key
+lookups and linked when any pair of their detections is within the radius.
+The linked cells are joined into items (connected components), which is exact
+single linkage. Everything is vectorized, so millions of detections take
+seconds.
+"""
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from infer.geotag import GeotagStore
+from utils.utils import get_video_resolutions
+
+EARTH_RADIUS = 6_371_000.0
+POSITION_COLUMNS = ("GroundLatitude", "GroundLongitude")
+
+
+def to_local_metres(lat: np.ndarray, lon: np.ndarray):
+    """Equirectangular projection around the mean latitude, fine for a survey area."""
+    lat0 = np.radians(np.nanmean(lat)) if len(lat) else 0.0
+    x = EARTH_RADIUS * np.radians(lon) * np.cos(lat0)
+    y = EARTH_RADIUS * np.radians(lat)
+    return x, y
+
+
+def pack_keys(columns: list, spans: list) -> np.ndarray:
+    """Packs integer columns with values in [0, span) into one int64 key per row."""
+    if np.prod([float(span) for span in spans]) >= 2.0**62:
+        raise ValueError("Grid too large to pack, increase the radius or time window")
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for column, span in zip(columns, spans):
+        key = key * span + column
+    return key
+
+
+def connected_components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Labels n nodes by component given edges a-b, by min-label propagation."""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        # pointer jumping: follow labels to their roots
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def linked_cells(a, b, members, starts, counts, x, y, t, radius, time_window, chunk=1 << 22):
+    """Mask of the cell pairs a-b with at least one pair of detections within
+    `radius` (and `time_window` seconds if t is given).
+
+    `members` lists the detections grouped by cell, cell c owning
+    members[starts[c]:starts[c] + counts[c]]. All detection pairs across the two
+    cells are compared, about `chunk` pairs at a time.
+    """
+    sizes = counts[a] * counts[b]
+    linked = np.zeros(len(a), dtype=bool)
+    if not len(a):
+        return linked
+    batch = (np.cumsum(sizes) - sizes) // chunk
+    for pairs in np.split(np.arange(len(a)), np.flatnonzero(np.diff(batch)) + 1):
+        pair = np.repeat(pairs, sizes[pairs])
+        k = np.arange(len(pair)) - np.repeat(np.cumsum(sizes[pairs]) - sizes[pairs], sizes[pairs])
+        width = counts[b[pair]]
+        i = members[starts[a[pair]] + k // width]
+        j = members[starts[b[pair]] + k % width]
+        close = np.hypot(x[i] - x[j], y[i] - y[j]) <= radius
+        if t is not None:
+            close &= np.abs(t[i] - t[j]) <= time_window
+        linked[pair[close]] = True
+    return linked
+
+
+def assign_items(
+    x: np.ndarray,
+    y: np.ndarray,
+    cls: np.ndarray,
+    video: np.ndarray = None,
+    t: np.ndarray = None,
+    radius: float = 1.0,
+    time_window: float = 0.0,
+) -> np.ndarray:
+    """Returns an item id per detection.
+
+    Detections of the same class are linked when they are within `radius`
+    metres, and with a positive `time_window` only when they are also in the
+    same video and at most that many seconds apart. Linked detections form one
+    item (single linkage). Cells of radius / sqrt(2) are always merged whole;
+    neighbouring cells are linked when any of their detection pairs is.
+    """
+    n = len(x)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+
+    windowed = time_window > 0 and t is not None
+    cell = radius / np.sqrt(2)
+    # two cells of margin so neighbour lookups never go negative
+    gx = np.floor((x - x.min()) / cell).astype(np.int64) + 2
+    gy = np.floor((y - y.min()) / cell).astype(np.int64) + 2
+    gt = (
+        np.floor((t - t.min()) / time_window).astype(np.int64) + 1
+        if windowed
+        else np.zeros(n, dtype=np.int64)
+    )
+    gv = video.astype(np.int64) if windowed and video is not None else np.zeros(n, dtype=np.int64)
+    gc = cls.astype(np.int64) - cls.min()
+    spans = [gc.max() + 1, gv.max() + 1, gt.max() + 2, gx.max() + 3, gy.max() + 3]
+
+    keys, inverse = np.unique(pack_keys([gc, gv, gt, gx, gy], spans), return_inverse=True)
+    inverse = inverse.ravel()
+    m = len(keys)
+    counts = np.bincount(inverse, minlength=m)
+    members = np.argsort(inverse, kind="stable")
+    starts = np.cumsum(counts) - counts
+
+    # cell coordinates of every occupied cell, in key order
+    first = members[starts]
+    cell_c, cell_v, cell_t, cell_x, cell_y = (column[first] for column in (gc, gv, gt, gx, gy))
+
+    # half of the neighbourhood is enough, edges are symmetric
+    offsets = [
+        (dt, dx, dy)
+        for dt in ((-1, 0, 1) if windowed else (0,))
+        for dx in range(-2, 3)
+        for dy in range(-2, 3)
+        if (dt, dx, dy) > (0, 0, 0)
+    ]
+    sources, targets = [], []
+    for dt, dx, dy in offsets:
+        neighbour = pack_keys([cell_c, cell_v, cell_t + dt, cell_x + dx, cell_y + dy], spans)
+        j = np.searchsorted(keys, neighbour).clip(max=m - 1)
+        found = keys[j] == neighbour
+        i, j = np.flatnonzero(found), j[found]
+        linked = linked_cells(
+            i, j, members, starts, counts, x, y, t if windowed else None, radius, time_window
+        )
+        sources.append(i[linked])
+        targets.append(j[linked])
+
+    labels = connected_components(m, np.concatenate(sources), np.concatenate(targets))
+    return np.unique(labels[inverse], return_inverse=True)[1].ravel()
+
+
+def summarize_items(detections: pd.DataFrame, items: np.ndarray, names: dict = None) -> pd.DataFrame:
+    """One row per item: class, confidence weighted position, observation count,
+    confidence and the first and last sighting."""
+    detections = detections.assign(ItemId=items).sort_values(
+        ["ItemId", "SourceFile", "FrameTime"], kind="stable"
+    )
+    lat, lon = POSITION_COLUMNS
+    weight = detections["Confidence"].astype(np.float64)
+    detections = detections.assign(
+        WeightedLat=detections[lat] * weight,
+        WeightedLon=detections[lon] * weight,
+        Weight=weight,
+    )
+    grouped = detections.groupby("ItemId", sort=True)
+    summary = grouped.agg(
+        Class=("Class", "first"),
+        Observations=("Class", "size"),
+        Frames=("FrameIndex", "nunique"),
+        MeanConfidence=("Confidence", "mean"),
+        MaxConfidence=("Confidence", "max"),
+        FirstSource=("SourceFile", "first"),
+        FirstFrameTime=("FrameTime", "first"),
+        LastSource=("SourceFile", "last"),
+        LastFrameTime=("FrameTime", "last"),
+        WeightedLat=("WeightedLat", "sum"),
+        WeightedLon=("WeightedLon", "sum"),
+        Weight=("Weight", "sum"),
+    )
+    summary[lat] = summary.pop("WeightedLat") / summary["Weight"]
+    summary[lon] = summary.pop("WeightedLon") / summary.pop("Weight")
+    if names:
+        summary.insert(1, "ClassName", summary["Class"].map(names))
+    return summary.reset_index()
+
+
+def deduplicate(
+    store: GeotagStore,
+    resolutions: dict,
+    radius: float = 1.0,
+    time_window: float = 0.0,
+    min_conf: float = 0.0,
+    **projection,
+):
+    """Reads a geotag store and returns (detections with ItemId, items).
+
+    `resolutions` and `projection` (fov, fov_axis, heading, tracks, baseline)
+    are passed on to infer.geotiles.ground_detections.
+    """
+    # geotiles builds on this module, so import it here
+    from infer.geotiles import ground_detections
+
+    detections = ground_detections(store, resolutions, min_conf=min_conf, **projection)
+    x, y = to_local_metres(*(detections[c].to_numpy() for c in POSITION_COLUMNS))
+    video = detections["SourceFile"].astype("category").cat.codes.to_numpy()
+    items = assign_items(
+        x,
+        y,
+        detections["Class"].to_numpy(),
+        video=video,
+        t=detections["FrameTime"].to_numpy(),
+        radius=radius,
+        time_window=time_window,
+    )
+    return detections.assign(ItemId=items), summarize_items(detections, items, store.names)
+
+
+def write_table(df: pd.DataFrame, out: Path):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".csv":
+        df.to_csv(out, index=False)
+    else:
+        df.to_parquet(out, index=False, compression="zstd")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="dedup",
+        description="Merge geotagged detections of the same litter item into unique items.",
+    )
+    parser.add_argument("--store", "-s", type=str, required=True, help="Geotag store.")
+    parser.add_argument(
+        "--input_folder", "-i", type=str, required=True, help="Folder with the source videos."
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, required=True, help="Items file (.parquet or .csv)."
+    )
+    parser.add_argument(
+        "--radius", type=float, default=1.0, help="Ground distance in metres within which detections merge."
+    )
+    parser.add_argument(
+        "--time_window",
+        type=float,
+        default=0.0,
+        help="Only merge detections of the same video at most this many seconds apart (0 = no limit).",
+    )
+    parser.add_argument(
+        "--min_conf", type=float, default=0.0, help="Ignore detections below this confidence."
+    )
+    parser.add_argument(
+        "--fov", type=float, default=82.1, help="Camera field of view in degrees."
+    )
+    parser.add_argument(
+        "--fov_axis",
+        choices=("diagonal", "horizontal", "vertical"),
+        default="diagonal",
+        help="Axis the field of view is measured along.",
+    )
+    parser.add_argument(
+        "--heading",
+        type=float,
+        default=None,
+        help="Fixed camera heading in degrees from north instead of the direction of travel.",
+    )
+    parser.add_argument(
+        "--heading_baseline",
+        type=float,
+        default=5.0,
+        help="Metres of flight path the direction of travel is measured over.",
+    )
+    parser.add_argument(
+        "--assignments",
+        type=str,
+        default=None,
+        help="Also write every detection with its ItemId to this file.",
+    )
+    args = parser.parse_args()
+
+    from infer.geotiles import load_tracks
+
+    store_path = Path(args.store)
+    if not store_path.exists():
+        raise FileNotFoundError(f"Store not found: {store_path}")
+
+    detections, items = deduplicate(
+        GeotagStore(store_path),
+        get_video_resolutions(args.input_folder),
+        args.radius,
+        args.time_window,
+        args.min_conf,
+        fov=args.fov,
+        fov_axis=args.fov_axis,
+        heading=args.heading,
+        tracks=load_tracks(args.input_folder) if args.heading is None else None,
+        baseline=args.heading_baseline,
+    )
+    write_table(items, Path(args.output))
+    print(f"{len(detections)} detections -> {len(items)} unique items: {args.output}")
+
+    if args.assignments:
+        write_table(detections, Path(args.assignments))
+
+
+if __name__ == "__main__":
+    main()
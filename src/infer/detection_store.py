@@ -0,0 +1,170 @@
+"""Columnar store for per-frame detections.
+
+A store is a directory of Parquet part files plus a _meta.json with the class
+names. Every part holds the detections of one video, ordered by frame, in
+row groups of bounded size, so reads filtered by video, frame range or class
+skip whole files and row groups using the Parquet statistics. Appending (a new
+run, a resumed video) just adds parts. The run manifest (infer.manifest) lists
+the parts of every video, so parts are never merged or renamed in place.
+"""
+
+from pathlib import Path
+import json
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_SCHEMA = pa.schema(
+    [
+        ("SourceFile", pa.string()),
+        ("FrameIndex", pa.int64()),
+        ("FrameTime", pa.float64()),
+        ("Class", pa.int16()),
+        ("Confidence", pa.float32()),
+        ("X1", pa.float32()),
+        ("Y1", pa.float32()),
+        ("X2", pa.float32()),
+        ("Y2", pa.float32()),
+    ]
+)
+
+
+class DetectionStore:
+    schema = STORE_SCHEMA
+
+    def __init__(
+        self,
+        root: Path,
+        names: dict = None,
+        rows_per_group: int = 65536,
+        rows_per_part: int = 1 << 20,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.rows_per_group = rows_per_group
+        self.rows_per_part = rows_per_part
+
+        meta_path = self.root / "_meta.json"
+        if names is not None:
+            meta_path.write_text(json.dumps({"names": {int(k): v for k, v in names.items()}}))
+        self.names = (
+            {int(k): v for k, v in json.loads(meta_path.read_text())["names"].items()}
+            if meta_path.exists()
+            else {}
+        )
+
+        self.video = None
+        self.parts = []
+        self.rows = 0
+        # part file names written by this instance, per video
+        self.written = {}
+
+    # ---------------------------------------------------------
+    # writing
+    # ---------------------------------------------------------
+    def add(self, video: str, frame_index, frame_time, boxes, conf, cls):
+        """Buffers the detections of one frame; switching video flushes the previous one."""
+        if video != self.video:
+            self.flush()
+            self.video = video
+
+        n = len(cls)
+        if not n:
+            return
+        self.parts.append(
+            (
+                np.full(n, frame_index, dtype=np.int64),
+                np.full(n, frame_time, dtype=np.float64),
+                np.asarray(cls, dtype=np.int16),
+                np.asarray(conf, dtype=np.float32),
+                np.asarray(boxes, dtype=np.float32).reshape(n, 4),
+            )
+        )
+        self.rows += n
+        if self.rows >= self.rows_per_part:
+            self.flush()
+
+    def extra_columns(self, video: str, frame_time: np.ndarray) -> dict:
+        """Hook for subclasses that store more columns than STORE_SCHEMA."""
+        return {}
+
+    def flush(self):
+        """Writes the buffered detections as a new, complete part file."""
+        if not self.parts:
+            return
+
+        frame_index, frame_time, cls, conf, boxes = (
+            np.concatenate(column) for column in zip(*self.parts)
+        )
+        columns = {
+            "SourceFile": pa.array([self.video] * len(cls), pa.string()),
+            "FrameIndex": frame_index,
+            "FrameTime": frame_time,
+            "Class": cls,
+            "Confidence": conf,
+            "X1": boxes[:, 0],
+            "Y1": boxes[:, 1],
+            "X2": boxes[:, 2],
+            "Y2": boxes[:, 3],
+        }
+        columns.update(self.extra_columns(self.video, frame_time))
+        table = pa.table(columns).cast(self.schema)
+
+        # written under a dot-name (ignored by readers) and renamed when complete
+        stem = Path(self.video).stem
+        part = self.root / f"{stem}-{time.time_ns()}-{os.getpid()}.parquet"
+        tmp = part.with_name(f".{part.name}.tmp")
+        pq.write_table(table, tmp, row_group_size=self.rows_per_group, compression="zstd")
+        tmp.replace(part)
+        self.written.setdefault(self.video, []).append(part.name)
+
+        self.parts = []
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.video = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------------------------------------
+    # reading
+    # ---------------------------------------------------------
+    def dataset(self):
+        return ds.dataset(self.root, format="parquet", schema=self.schema)
+
+    def read(self, videos=None, frames=None, classes=None, columns=None) -> pa.Table:
+        """Reads detections, optionally only of some videos, a (first, last) frame
+        range and some class ids. Filters are pushed down to the Parquet reader."""
+        expression = None
+        conditions = []
+        if videos is not None:
+            conditions.append(ds.field("SourceFile").isin(list(videos)))
+        if frames is not None:
+            first, last = frames
+            conditions.append(
+                (ds.field("FrameIndex") >= first) & (ds.field("FrameIndex") <= last)
+            )
+        if classes is not None:
+            conditions.append(ds.field("Class").isin([int(c) for c in classes]))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        return self.dataset().to_table(columns=columns, filter=expression)
+
+    def read_pandas(self, **filters):
+        df = self.read(**filters).to_pandas()
+        df["ClassName"] = df["Class"].map(self.names)
+        return df
+
+    def videos(self) -> list:
+        table = self.dataset().to_table(columns=["SourceFile"])
+        return sorted(table.column("SourceFile").unique().to_pylist())
@@ -0,0 +1,167 @@
+"""Single-pass geotagged detection for DJI videos.
+
+Every video is decoded once: the frames go through the detection backend and each
+detection is tagged with the GPS position interpolated from the video's SRT
+telemetry at the frame's timestamp. All detections stream into one detection
+store (see infer.detection_store). Run from the src folder:
+
+    python -m infer.geotag -m best.pt -i <dji folder> -o <output folder>
+"""
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pyarrow as pa
+
+from infer.backends import add_backend_arguments, backend_from_args
+from infer.detection_store import STORE_SCHEMA, DetectionStore
+from infer.pipeline import add_pipeline_arguments
+from infer.manifest import HashCache, RunManifest, result_settings, run_id
+from infer.predict import (
+    add_manifest_arguments,
+    detect_video,
+    iter_videos,
+    pipeline_from_args,
+    plan_videos,
+    run_videos,
+)
+from infer.tiling import add_tiling_arguments, tiled_from_args
+from preproces.video_processing.extract_gps import (
+    GPS_CHANNELS,
+    extract_embedded_srt,
+    interpolate_gps,
+    parse_dji_srt,
+)
+
+GEOTAG_SCHEMA = pa.schema(
+    list(STORE_SCHEMA) + [pa.field(channel, pa.float64()) for channel in GPS_CHANNELS]
+)
+
+
+def load_gps(video_path: Path, subtitle_stream: int = 2):
+    srt = video_path.with_suffix(".srt")
+    if not srt.exists():
+        print("  ↳ Extracting embedded DJI subtitles")
+        extract_embedded_srt(video_path, srt, subtitle_stream)
+    return parse_dji_srt(srt)
+
+
+class GeotagStore(DetectionStore):
+    """Detection store whose rows also carry the GPS channels at the frame time."""
+
+    schema = GEOTAG_SCHEMA
+
+    def __init__(self, root: Path, names: dict = None, **kwargs):
+        super().__init__(root, names, **kwargs)
+        self.tracks = {}
+
+    def set_track(self, video: str, gps):
+        self.tracks[video] = gps
+
+    def extra_columns(self, video: str, frame_time: np.ndarray) -> dict:
+        located = interpolate_gps(self.tracks[video], {"FrameTime": frame_time})
+        return {
+            channel: located.get(channel, np.full(len(frame_time), np.nan))
+            for channel in GPS_CHANNELS
+        }
+
+
+def geotag_video(
+    backend,
+    video_path: Path,
+    store: GeotagStore,
+    batch_size: int = 8,
+    pipeline=None,
+    subtitle_stream: int = 2,
+    **resume,
+):
+    """detect_video with the video's GPS track loaded into the store; returns
+    (frames, detections)."""
+    store.set_track(video_path.name, load_gps(video_path, subtitle_stream))
+    try:
+        return detect_video(backend, video_path, store, batch_size, pipeline, **resume)
+    finally:
+        del store.tracks[video_path.name]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="geotag",
+        description="Detect litter in DJI videos and tag every detection with its GPS position.",
+    )
+
+    parser.add_argument(
+        "--model_path", "-m", type=str, required=True, help="Model path."
+    )
+    parser.add_argument(
+        "--input_folder", "-i", type=str, required=True, help="input folder."
+    )
+    parser.add_argument(
+        "--output_folder", "-o", type=str, required=True, help="output folder"
+    )
+    parser.add_argument(
+        "--conf", type=float, default=0.25, help="Minimum detection confidence."
+    )
+    parser.add_argument(
+        "--batch_size",
+        "-b",
+        type=int,
+        default=8,
+        help="Number of frames sent to the model at once.",
+    )
+    add_backend_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_tiling_arguments(parser)
+    add_manifest_arguments(parser)
+
+    args = parser.parse_args()
+
+    model_path = Path(args.model_path)
+    input_folder = Path(args.input_folder)
+    output_folder = Path(args.output_folder)
+
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model weights not found: {model_path}")
+
+    if not input_folder.exists():
+        raise FileNotFoundError(f"DJI folder not found: {input_folder}")
+
+    videos = sorted(video for video in iter_videos(input_folder) if video.is_file())
+
+    if not videos:
+        raise FileNotFoundError(f"No videos found in {input_folder}")
+
+    videos, records = plan_videos(videos, args.catalog)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    backend = tiled_from_args(backend_from_args(args, conf=args.conf), args)
+    pipeline = pipeline_from_args(backend, args)
+
+    hashes = HashCache(output_folder / "_hashes.json")
+    model_hash = hashes(model_path)
+    settings = result_settings(args)
+    store_path = output_folder / f"geotagged-{run_id(model_hash, settings)}"
+    manifest = RunManifest(store_path, model_hash, settings)
+
+    with GeotagStore(store_path, names=backend.names) as store:
+
+        def detect(video_path, **resume):
+            stream = records[video_path]["subtitle_stream"]
+            return geotag_video(
+                backend,
+                video_path,
+                store,
+                args.batch_size,
+                pipeline,
+                subtitle_stream=2 if stream is None else stream,
+                **resume,
+            )
+
+        for _, frames, detections in run_videos(
+            videos, store, manifest, hashes, detect, args.checkpoint_every, args.force
+        ):
+            print(f"  ↳ {frames} frames, {detections} detections")
+
+
+if __name__ == "__main__":
+    main()
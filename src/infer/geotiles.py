@@ -0,0 +1,354 @@
+"""Ground projection of detections and geotile aggregation.
+
+Every detection's box center is projected from pixels onto the ground using
+the drone's position and height above take-off (RelativeAltitude), the camera's
+field of view and the frame resolution, assuming a nadir (straight down)
+gimbal. The heading is not in DJI's SRT telemetry, so it is taken from the
+direction of travel along the video's full GPS track (the .srt next to the
+video), measured over a few metres of flight path. All detections of a store
+are projected at once.
+
+The ground positions are then counted per class in geohash cells, giving a
+compact tile table for the heatmap dashboards. Run from the src folder:
+
+    python -m infer.geotiles -s <geotagged store> -i <dji folder> -o tiles.parquet --precision 8
+"""
+
+from pathlib import Path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from infer.dedup import EARTH_RADIUS, assign_items, to_local_metres, write_table
+from infer.geotag import GeotagStore
+from preproces.video_processing.extract_gps import parse_dji_srt
+from utils.utils import get_video_resolutions
+
+GEOHASH_ALPHABET = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+def focal_length_px(width: np.ndarray, height: np.ndarray, fov: float, axis: str = "diagonal"):
+    """Focal length in pixels from a field of view in degrees along the given axis."""
+    size = {
+        "diagonal": np.hypot(width, height),
+        "horizontal": np.asarray(width, dtype=np.float64),
+        "vertical": np.asarray(height, dtype=np.float64),
+    }[axis]
+    return size / 2 / np.tan(np.radians(fov) / 2)
+
+
+def nearest_sample(sample_t: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Index of the sample nearest in time to every t, for sorted sample times."""
+    if len(sample_t) < 2:
+        return np.zeros(len(t), dtype=np.int64)
+    right = np.searchsorted(sample_t, t).clip(1, len(sample_t) - 1)
+    left = right - 1
+    return np.where(t - sample_t[left] <= sample_t[right] - t, left, right)
+
+
+def track_heading(t: np.ndarray, lat: np.ndarray, lon: np.ndarray, baseline: float = 5.0):
+    """Direction of travel in radians clockwise from north at every sample of one
+    video's GPS track, sorted by time; NaN if the drone never moves.
+
+    The heading at a sample is taken between the track positions `baseline` / 2
+    metres of flight path before and after it, so it does not depend on the
+    sampling rate. Samples that moved less than half the baseline over that
+    stretch (hovering, GPS jitter) take the heading of the nearest moving sample.
+    """
+    if not len(t):
+        return np.empty(0)
+    x, y = to_local_metres(lat, lon)
+    path = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))])
+    ahead = np.searchsorted(path, path + baseline / 2).clip(max=len(path) - 1)
+    behind = (np.searchsorted(path, path - baseline / 2, side="right") - 1).clip(min=0)
+    dx, dy = x[ahead] - x[behind], y[ahead] - y[behind]
+    moving = np.flatnonzero(np.hypot(dx, dy) >= baseline / 2)
+    if not len(moving):
+        return np.full(len(t), np.nan)
+    heading = np.arctan2(dx, dy)
+    return heading[moving[nearest_sample(t[moving], t)]]
+
+
+def load_tracks(input_folder) -> dict:
+    """{video name: DJI telemetry} from the .srt next to every mp4 of the folder
+    (geotag extracts the embedded subtitles there)."""
+    tracks = {}
+    for video in sorted(Path(input_folder).glob("*.mp4")):
+        srt = video.with_suffix(".srt")
+        if srt.exists():
+            tracks[video.name] = parse_dji_srt(srt)
+    return tracks
+
+
+def detection_heading(detections: pd.DataFrame, tracks: dict = None, baseline: float = 5.0):
+    """Heading in radians of every detection row from its video's GPS track.
+
+    Videos without a track in `tracks` fall back to the positions of their
+    detected frames. Rows of a video whose drone never moves are NaN.
+    """
+    tracks = tracks or {}
+    yaw = np.full(len(detections), np.nan)
+    frame_time = detections["FrameTime"].to_numpy(np.float64)
+    for video, rows in detections.groupby("SourceFile", sort=False).indices.items():
+        gps = tracks.get(video)
+        if gps is None:
+            gps = detections.iloc[rows].rename(columns={"FrameTime": "SampleTime"})
+        gps = (
+            gps[["SampleTime", "GPSLatitude", "GPSLongitude"]]
+            .dropna()
+            .drop_duplicates("SampleTime")
+            .sort_values("SampleTime")
+        )
+        t = gps["SampleTime"].to_numpy(np.float64)
+        heading = track_heading(
+            t, gps["GPSLatitude"].to_numpy(np.float64), gps["GPSLongitude"].to_numpy(np.float64), baseline
+        )
+        if len(t):
+            yaw[rows] = heading[nearest_sample(t, frame_time[rows])]
+    return yaw
+
+
+def project_to_ground(
+    detections: pd.DataFrame,
+    resolutions: dict,
+    fov: float = 82.1,
+    fov_axis: str = "diagonal",
+    heading: float = None,
+    tracks: dict = None,
+    baseline: float = 5.0,
+):
+    """Returns the ground (latitude, longitude) of every detection's box center.
+
+    `resolutions` maps SourceFile to (width, height), as get_video_resolutions
+    returns. `heading` in degrees overrides the heading from the GPS `tracks`
+    (see detection_heading); rows without a known heading are NaN.
+    """
+    size = np.array(
+        [resolutions.get(video) or (np.nan, np.nan) for video in detections["SourceFile"]],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    width, height = size.T
+    focal = focal_length_px(width, height, fov, fov_axis)
+
+    lat = detections["GPSLatitude"].to_numpy(np.float64)
+    lon = detections["GPSLongitude"].to_numpy(np.float64)
+    altitude = detections["RelativeAltitude"].to_numpy(np.float64)
+
+    # camera frame: right and forward (image up) in metres
+    u = (detections["X1"].to_numpy(np.float64) + detections["X2"].to_numpy(np.float64)) / 2
+    v = (detections["Y1"].to_numpy(np.float64) + detections["Y2"].to_numpy(np.float64)) / 2
+    right = (u - width / 2) / focal * altitude
+    forward = (height / 2 - v) / focal * altitude
+
+    if heading is None:
+        yaw = detection_heading(detections, tracks, baseline)
+    else:
+        yaw = np.full(len(lat), np.radians(heading))
+    east = right * np.cos(yaw) + forward * np.sin(yaw)
+    north = forward * np.cos(yaw) - right * np.sin(yaw)
+
+    ground_lat = lat + np.degrees(north / EARTH_RADIUS)
+    ground_lon = lon + np.degrees(east / (EARTH_RADIUS * np.cos(np.radians(lat))))
+    return ground_lat, ground_lon
+
+
+def ground_detections(
+    store: GeotagStore,
+    resolutions: dict,
+    min_conf: float = 0.0,
+    fov: float = 82.1,
+    fov_axis: str = "diagonal",
+    heading: float = None,
+    tracks: dict = None,
+    baseline: float = 5.0,
+) -> pd.DataFrame:
+    """Reads the located detections of a store with their ground position added
+    as GroundLatitude and GroundLongitude.
+
+    Detections below `min_conf`, without a position or altitude, of videos
+    without a known resolution, or without a heading (the drone never moved and
+    no fixed `heading` was given) are left out.
+    """
+    detections = store.read().to_pandas()
+    detections = detections[
+        (detections["Confidence"] >= min_conf)
+        & detections[["GPSLatitude", "GPSLongitude", "RelativeAltitude"]].notna().all(axis=1)
+    ].reset_index(drop=True)
+
+    missing = sorted(set(detections["SourceFile"]) - {k for k, v in resolutions.items() if v})
+    if missing:
+        print(f"Skipping {len(missing)} videos without a known resolution: {', '.join(missing)}")
+        detections = detections[~detections["SourceFile"].isin(missing)].reset_index(drop=True)
+
+    lat, lon = project_to_ground(
+        detections, resolutions, fov=fov, fov_axis=fov_axis, heading=heading, tracks=tracks, baseline=baseline
+    )
+    grounded = np.isfinite(lat) & np.isfinite(lon)
+    if not grounded.all():
+        videos = sorted(set(detections["SourceFile"][~grounded]))
+        print(
+            f"Skipping {np.count_nonzero(~grounded)} detections without a heading, the drone never "
+            f"moved (pass --heading): {', '.join(videos)}"
+        )
+    located = detections.assign(GroundLatitude=lat, GroundLongitude=lon)
+    return located[grounded].reset_index(drop=True)
+
+
+def geohash(lat: np.ndarray, lon: np.ndarray, precision: int = 8):
+    """Vectorized geohash encoding, returns (hashes, cell center lat, cell center lon)."""
+    if not 1 <= precision <= 12:
+        # 5 bits per character, packed into one int64
+        raise ValueError(f"Geohash precision must be 1 to 12, got {precision}")
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lat_cell = np.floor((np.asarray(lat) + 90) / 180 * (1 << lat_bits)).astype(np.int64)
+    lon_cell = np.floor((np.asarray(lon) + 180) / 360 * (1 << lon_bits)).astype(np.int64)
+    lat_cell = lat_cell.clip(0, (1 << lat_bits) - 1)
+    lon_cell = lon_cell.clip(0, (1 << lon_bits) - 1)
+
+    # interleave, longitude first, most significant bit first
+    code = np.zeros(len(lat_cell), dtype=np.int64)
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lon_cell >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_cell >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+
+    shifts = 5 * np.arange(precision - 1, -1, -1)
+    chars = GEOHASH_ALPHABET[(code[:, None] >> shifts) & 31]
+    hashes = np.ascontiguousarray(chars).view(f"<U{precision}").ravel()
+
+    center_lat = (lat_cell + 0.5) / (1 << lat_bits) * 180 - 90
+    center_lon = (lon_cell + 0.5) / (1 << lon_bits) * 360 - 180
+    return hashes, center_lat, center_lon
+
+
+def aggregate_tiles(
+    detections: pd.DataFrame,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    precision: int = 8,
+    names: dict = None,
+    items: np.ndarray = None,
+) -> pd.DataFrame:
+    """Counts detections (and unique items, if given) per geohash cell and class."""
+    hashes, center_lat, center_lon = geohash(lat, lon, precision)
+    cells = pd.DataFrame(
+        {
+            "Geohash": hashes,
+            "Class": detections["Class"].to_numpy(),
+            "Confidence": detections["Confidence"].to_numpy(),
+            "Latitude": center_lat,
+            "Longitude": center_lon,
+        }
+    )
+    aggregations = dict(
+        Latitude=("Latitude", "first"),
+        Longitude=("Longitude", "first"),
+        Detections=("Class", "size"),
+        MeanConfidence=("Confidence", "mean"),
+    )
+    if items is not None:
+        cells["ItemId"] = items
+        aggregations["Items"] = ("ItemId", "nunique")
+
+    tiles = cells.groupby(["Geohash", "Class"], sort=True).agg(**aggregations).reset_index()
+    if names:
+        tiles.insert(2, "ClassName", tiles["Class"].map(names))
+    tiles["Detections"] = tiles["Detections"].astype(np.int32)
+    tiles["MeanConfidence"] = tiles["MeanConfidence"].astype(np.float32)
+    if "Items" in tiles:
+        tiles["Items"] = tiles["Items"].astype(np.int32)
+    return tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="geotiles",
+        description="Project geotagged detections onto the ground and count them per geohash cell.",
+    )
+    parser.add_argument("--store", "-s", type=str, required=True, help="Geotag store.")
+    parser.add_argument(
+        "--input_folder", "-i", type=str, required=True, help="Folder with the source videos."
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, required=True, help="Tile table (.parquet or .csv)."
+    )
+    parser.add_argument(
+        "--precision", type=int, default=8, help="Geohash length, 1 to 12 (8 = about 38 x 19 m)."
+    )
+    parser.add_argument(
+        "--fov", type=float, default=82.1, help="Camera field of view in degrees."
+    )
+    parser.add_argument(
+        "--fov_axis",
+        choices=("diagonal", "horizontal", "vertical"),
+        default="diagonal",
+        help="Axis the field of view is measured along.",
+    )
+    parser.add_argument(
+        "--heading",
+        type=float,
+        default=None,
+        help="Fixed camera heading in degrees from north instead of the direction of travel.",
+    )
+    parser.add_argument(
+        "--heading_baseline",
+        type=float,
+        default=5.0,
+        help="Metres of flight path the direction of travel is measured over.",
+    )
+    parser.add_argument(
+        "--min_conf", type=float, default=0.0, help="Ignore detections below this confidence."
+    )
+    parser.add_argument(
+        "--dedup_radius",
+        type=float,
+        default=0.0,
+        help="Also count unique items, merging ground positions within this many metres (see infer.dedup).",
+    )
+    parser.add_argument(
+        "--detections",
+        type=str,
+        default=None,
+        help="Also write every detection with its ground position to this file.",
+    )
+    args = parser.parse_args()
+
+    store_path = Path(args.store)
+    if not store_path.exists():
+        raise FileNotFoundError(f"Store not found: {store_path}")
+
+    store = GeotagStore(store_path)
+    detections = ground_detections(
+        store,
+        get_video_resolutions(args.input_folder),
+        min_conf=args.min_conf,
+        fov=args.fov,
+        fov_axis=args.fov_axis,
+        heading=args.heading,
+        tracks=load_tracks(args.input_folder) if args.heading is None else None,
+        baseline=args.heading_baseline,
+    )
+    lat = detections["GroundLatitude"].to_numpy()
+    lon = detections["GroundLongitude"].to_numpy()
+
+    items = None
+    if args.dedup_radius > 0:
+        x, y = to_local_metres(lat, lon)
+        items = assign_items(x, y, detections["Class"].to_numpy(), radius=args.dedup_radius)
+
+    tiles = aggregate_tiles(detections, lat, lon, args.precision, store.names, items)
+    write_table(tiles, Path(args.output))
+    print(f"{len(detections)} detections -> {len(tiles)} tiles: {args.output}")
+
+    if args.detections:
+        if items is not None:
+            detections["ItemId"] = items
+        write_table(detections, Path(args.detections))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Content-hash keyed run manifest for incremental inference.
+
+A run is identified by the hash of the model weights plus the settings that
+change the results (backend, input size, confidence, tiling, ...), and writes
+into its own store named after that id, so re-running a folder with the same
+model appends to the same store instead of starting a new dated one.
+
+Inside the store, _manifest.json records per video content hash whether the
+video is done, or up to which frame its detections were checkpointed and in
+which part files. Finished videos are skipped; an interrupted video drops the
+parts written after its last checkpoint and resumes from that frame. A video
+whose content changed under the same name replaces its old entry and parts
+when it is first checkpointed. Hashes are cached by path, size and mtime, so
+every file is only read once.
+"""
+
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+
+HASH_CHUNK = 1 << 20
+
+# arguments that change the detections; worker counts and batch sizes do not
+RESULT_SETTINGS = (
+    "backend",
+    "imgsz",
+    "quantize",
+    "conf",
+    "tile",
+    "tile_overlap",
+    "tile_iou",
+    "tile_full_frame",
+)
+
+
+def write_json(path: Path, data):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+class HashCache:
+    """blake2b content hashes, cached in a JSON file by path, size and mtime."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def __call__(self, file: Path) -> str:
+        file = Path(file).resolve()
+        stat = file.stat()
+        cached = self.entries.get(str(file))
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["hash"]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                digest.update(chunk)
+        self.entries[str(file)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": digest.hexdigest(),
+        }
+        self.save()
+        return digest.hexdigest()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(self.path, self.entries)
+
+
+def result_settings(args) -> dict:
+    return {name: getattr(args, name) for name in RESULT_SETTINGS if hasattr(args, name)}
+
+
+def run_id(model_hash: str, settings: dict) -> str:
+    key = json.dumps({"model": model_hash, "settings": settings}, sort_keys=True)
+    return hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+
+
+class RunManifest:
+    def __init__(self, store_root: Path, model_hash: str = None, settings: dict = None):
+        self.root = Path(store_root)
+        self.path = self.root / "_manifest.json"
+        self.data = (
+            json.loads(self.path.read_text())
+            if self.path.exists()
+            else {"model": model_hash, "settings": settings, "videos": {}}
+        )
+        self.videos = self.data["videos"]
+
+    def done(self, video_hash: str) -> bool:
+        return self.videos.get(video_hash, {}).get("status") == "done"
+
+    def resume_point(self, video_hash: str):
+        """(first frame to process, detections stored so far) of a video."""
+        entry = self.videos.get(video_hash)
+        if entry is None:
+            return 0, 0
+        return entry["frames"], entry["detections"]
+
+    def checkpoint(self, video_hash, video, frames, detections, parts, done=False):
+        # a video whose content changed under the same name replaces the old
+        # entry, so its SourceFile does not end up with both sets of detections
+        replaced = [
+            other
+            for other, entry in self.videos.items()
+            if other != video_hash and entry.get("video") == video
+        ]
+        for other in replaced:
+            self.forget(other)
+        entry = self.videos.setdefault(video_hash, {"parts": []})
+        entry.update(
+            video=video,
+            frames=frames,
+            detections=detections,
+            status="done" if done else "partial",
+            updated=datetime.now().isoformat(timespec="seconds"),
+        )
+        entry["parts"] = sorted(set(entry["parts"]) | set(parts))
+        self.save()
+
+    def forget(self, video_hash: str):
+        """Drops a video's entry and deletes its parts, to process it again."""
+        entry = self.videos.pop(video_hash, None)
+        if entry is None:
+            return
+        for part in entry["parts"]:
+            (self.root / part).unlink(missing_ok=True)
+        self.save()
+
+    def remove_unreferenced_parts(self, video: str) -> int:
+        """Deletes parts of a video that no checkpoint refers to, i.e. the ones
+        written after the last checkpoint of an interrupted run."""
+        referenced = {part for entry in self.videos.values() for part in entry["parts"]}
+        pattern = re.compile(rf"{re.escape(Path(video).stem)}-\d+-\d+\.parquet")
+        removed = 0
+        for part in self.root.glob("*.parquet"):
+            if pattern.fullmatch(part.name) and part.name not in referenced:
+                part.unlink()
+                removed += 1
+        return removed
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_json(self.path, self.data)
@@ -0,0 +1,192 @@
+"""Pipelined video inference.
+
+Decoding, preprocessing, inference and writing run as separate stages connected
+by bounded queues, so every stage works on its own frames at the same time:
+
+    decode (1 thread) -> preprocess (N threads) -> infer (M threads) -> write (caller)
+
+OpenCV decoding and resizing, numpy and ONNX Runtime all release the GIL, so the
+stages overlap on separate cores. A full queue blocks the stage feeding it, which
+caps the number of frames in flight (and so the memory) at roughly
+queue_size * 2 + inference_workers * batch_size. Results come out in frame
+order whatever order the inference workers finish in.
+"""
+
+import queue
+import threading
+
+DONE = object()
+
+
+class Aborted(Exception):
+    """Raised inside a stage when another stage failed."""
+
+
+class Pipeline:
+    def __init__(
+        self,
+        backend,
+        batch_size: int = 8,
+        preprocess_workers: int = 2,
+        inference_workers: int = 1,
+        queue_size: int = 32,
+    ):
+        if inference_workers > 1 and not getattr(backend, "thread_safe", False):
+            raise ValueError(
+                f"{type(backend).__name__} cannot run inference on several threads, "
+                "use --inference_workers 1"
+            )
+        self.backend = backend
+        self.batch_size = batch_size
+        self.preprocess_workers = max(preprocess_workers, 1)
+        self.inference_workers = max(inference_workers, 1)
+        self.queue_size = queue_size
+
+    # ---------------------------------------------------------
+    # queue helpers, all waits wake up regularly to notice an abort
+    # ---------------------------------------------------------
+    def put(self, q: queue.Queue, item):
+        while True:
+            if self.abort.is_set():
+                raise Aborted
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, q: queue.Queue):
+        while True:
+            if self.abort.is_set():
+                raise Aborted
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def stage(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except Aborted:
+                pass
+            except BaseException as e:
+                self.errors.append(e)
+                self.abort.set()
+
+        thread = threading.Thread(target=run, daemon=True, name=target.__name__)
+        thread.start()
+        return thread
+
+    # ---------------------------------------------------------
+    # stages
+    # ---------------------------------------------------------
+    def decode(self, frames):
+        for item in frames:
+            self.put(self.decoded, item)
+        for _ in range(self.preprocess_workers):
+            self.put(self.decoded, DONE)
+
+    def preprocess(self):
+        while (item := self.get(self.decoded)) is not DONE:
+            frame_index, frame_time, frame = item
+            self.put(self.prepared, (frame_index, frame_time, self.backend.prepare(frame)))
+
+        # the last preprocess worker to finish releases every inference worker
+        with self.lock:
+            self.preprocess_running -= 1
+            last = self.preprocess_running == 0
+        if last:
+            for _ in range(self.inference_workers):
+                self.put(self.prepared, DONE)
+
+    def infer(self):
+        finished = False
+        while not finished:
+            batch = []
+            while len(batch) < self.batch_size:
+                item = self.get(self.prepared)
+                if item is DONE:
+                    finished = True
+                    break
+                batch.append(item)
+            if batch:
+                detections = self.backend.infer([prepared for _, _, prepared in batch])
+                self.put(
+                    self.results,
+                    [
+                        (frame_index, frame_time, *detection)
+                        for (frame_index, frame_time, _), detection in zip(batch, detections)
+                    ],
+                )
+        self.put(self.results, DONE)
+
+    # ---------------------------------------------------------
+    # driver
+    # ---------------------------------------------------------
+    def iter_detections(self, frames, first_index: int = 0):
+        """Runs the stages over (index, time, frame) tuples such as predict.iter_frames
+        yields, numbered consecutively from first_index, and yields (frame index,
+        frame time, boxes, conf, cls) in frame order."""
+        self.abort = threading.Event()
+        self.errors = []
+        self.lock = threading.Lock()
+        self.preprocess_running = self.preprocess_workers
+        self.decoded = queue.Queue(self.queue_size)
+        self.prepared = queue.Queue(self.queue_size)
+        self.results = queue.Queue(max(self.queue_size // self.batch_size, 2))
+
+        threads = [self.stage(self.decode, frames)]
+        threads += [self.stage(self.preprocess) for _ in range(self.preprocess_workers)]
+        threads += [self.stage(self.infer) for _ in range(self.inference_workers)]
+
+        pending = {}
+        next_index = first_index
+        running = self.inference_workers
+        try:
+            while running:
+                batch = self.get(self.results)
+                if batch is DONE:
+                    running -= 1
+                    continue
+                for result in batch:
+                    pending[result[0]] = result
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        except Aborted:
+            pass
+        finally:
+            # stop the stages if the consumer left early
+            if running:
+                self.abort.set()
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+        # only left over if the frame indices have gaps
+        for frame_index in sorted(pending):
+            yield pending[frame_index]
+
+
+def add_pipeline_arguments(parser):
+    """Adds the stage worker flags shared by the inference scripts."""
+    parser.add_argument(
+        "--preprocess_workers",
+        type=int,
+        default=0,
+        help="Threads letterboxing frames; 0 runs all stages in lockstep on one thread.",
+    )
+    parser.add_argument(
+        "--inference_workers",
+        type=int,
+        default=1,
+        help="Threads running the model concurrently (onnx backend only).",
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=32,
+        help="Frames buffered between two stages before the earlier one waits.",
+    )
@@ -1,8 +1,16 @@
 from pathlib import Path
 
-from ultralytics import YOLO
 from datetime import date
+from itertools import islice
 import argparse
+import cv2
+
+from infer.backends import add_backend_arguments, backend_from_args
+from infer.detection_store import DetectionStore
+from infer.manifest import HashCache, RunManifest, result_settings, run_id
+from infer.pipeline import Pipeline, add_pipeline_arguments
+from infer.tiling import add_tiling_arguments, tiled_from_args
+from utils.video_catalog import DEFAULT_CATALOG, VideoCatalog
 
 VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv"}
 TODAY = str(date.today())
@@ -13,6 +21,176 @@ def iter_videos(directory: Path):
         yield from directory.glob(f"*{extension}")
 
 
+def iter_frames(video_path: Path, start: int = 0):
+    """Decodes a video once, yielding (frame index, presentation time in s, BGR frame)
+    from frame `start` on."""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open {video_path}")
+
+    idx = 0
+    try:
+        # seeking by frame number is not exact for every codec, grabbing is
+        while idx < start and cap.grab():
+            idx += 1
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield idx, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame
+            idx += 1
+    finally:
+        cap.release()
+
+
+def iter_batches(iterable, batch_size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def predict_frames(backend, frames, batch_size: int = 8):
+    """Runs a backend (see infer.backends) on (index, time, frame) tuples in batches.
+
+    Yields (frame index, frame time, xyxy boxes, confidences, classes) as numpy
+    arrays per frame. Each batch's frames and results are dropped before the
+    next batch is decoded, so memory stays flat however long the video is.
+    """
+    for batch in iter_batches(frames, batch_size):
+        detections = backend.predict([frame for _, _, frame in batch])
+        for (frame_index, frame_time, _), (boxes, conf, cls) in zip(batch, detections):
+            yield frame_index, frame_time, boxes, conf, cls
+
+
+def detect_video(
+    backend,
+    video_path: Path,
+    store: DetectionStore,
+    batch_size: int = 8,
+    pipeline: Pipeline = None,
+    start: int = 0,
+    checkpoint=None,
+    checkpoint_every: int = 0,
+):
+    """Runs the backend over a video and appends every frame's detections to the store.
+
+    With a pipeline (see infer.pipeline) decoding, preprocessing and inference run
+    on separate threads; without one they run in lockstep on this thread.
+    Processing starts at frame `start`; every `checkpoint_every` frames the store
+    is flushed and checkpoint(next frame, detections so far) is called.
+    """
+    if pipeline is not None:
+        results = pipeline.iter_detections(iter_frames(video_path, start), first_index=start)
+    else:
+        results = predict_frames(backend, iter_frames(video_path, start), batch_size=batch_size)
+
+    frames = detections = 0
+    for frame_index, frame_time, boxes, conf, cls in results:
+        store.add(video_path.name, frame_index, frame_time, boxes, conf, cls)
+        frames += 1
+        detections += len(cls)
+        if checkpoint is not None and checkpoint_every and frames % checkpoint_every == 0:
+            store.flush()
+            checkpoint(frame_index + 1, detections)
+    store.flush()
+    return frames, detections
+
+
+def plan_videos(videos: list, catalog_path: Path = None):
+    """Looks the videos up in the video catalog; returns the readable ones and
+    their metadata records, and prints how much footage there is to process."""
+    with VideoCatalog(catalog_path or DEFAULT_CATALOG) as catalog:
+        records = catalog.scan(videos)
+
+    readable = []
+    for video in videos:
+        if records[video] is None:
+            print(f"Skipping {video}: unreadable video")
+        else:
+            readable.append(video)
+
+    frames = sum(records[video]["frame_count"] for video in readable)
+    hours = sum(records[video]["duration"] for video in readable) / 3600
+    print(f"{len(readable)} videos, {frames} frames ({hours:.1f} h of footage)")
+    return readable, records
+
+
+def run_videos(
+    videos,
+    store: DetectionStore,
+    manifest: RunManifest,
+    hashes: HashCache,
+    detect,
+    checkpoint_every: int = 1000,
+    force: bool = False,
+):
+    """Runs detect(video_path, start=..., checkpoint=..., checkpoint_every=...) on
+    every video the manifest has not finished, resuming interrupted ones, and
+    yields (video path, frames, detections) per processed video."""
+    for video_path in videos:
+        video_hash = hashes(video_path)
+        if force:
+            manifest.forget(video_hash)
+        elif manifest.done(video_hash):
+            print(f"Skipping {video_path}: already processed")
+            continue
+
+        print(f"Processing {video_path} -> {store.root}")
+        manifest.remove_unreferenced_parts(video_path.name)
+        start, previous = manifest.resume_point(video_hash)
+        if start:
+            print(f"  ↳ Resuming at frame {start}")
+
+        def checkpoint(next_frame, detections, done=False):
+            manifest.checkpoint(
+                video_hash,
+                video_path.name,
+                next_frame,
+                previous + detections,
+                store.written.get(video_path.name, []),
+                done=done,
+            )
+
+        frames, detections = detect(
+            video_path, start=start, checkpoint=checkpoint, checkpoint_every=checkpoint_every
+        )
+        checkpoint(start + frames, detections, done=True)
+        yield video_path, frames, previous + detections
+
+
+def pipeline_from_args(backend, args):
+    if args.preprocess_workers <= 0:
+        return None
+    return Pipeline(
+        backend,
+        batch_size=args.batch_size,
+        preprocess_workers=args.preprocess_workers,
+        inference_workers=args.inference_workers,
+        queue_size=args.queue_size,
+    )
+
+
+def add_manifest_arguments(parser):
+    """Adds the incremental run flags shared by the inference scripts."""
+    parser.add_argument(
+        "--checkpoint_every",
+        type=int,
+        default=1000,
+        help="Frames between checkpoints an interrupted video resumes from (0 = none).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Process videos again even if the run manifest has them as done.",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=None,
+        help="Video catalog database (default: $VIDEO_CATALOG or ~/.cache/dodo_analytics).",
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="ProgramName",
@@ -29,6 +207,22 @@ def main():
     parser.add_argument(
         "--output_folder", "-o", type=str, required=True, help="output folder"
     )
+    parser.add_argument(
+        "--batch_size",
+        "-b",
+        type=int,
+        default=8,
+        help="Number of frames sent to the model at once.",
+    )
+    parser.add_argument(
+        "--render",
+        action="store_true",
+        help="Also write annotated videos (see infer.render to render later).",
+    )
+    add_backend_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_tiling_arguments(parser)
+    add_manifest_arguments(parser)
 
     args = parser.parse_args()
 
@@ -47,19 +241,35 @@ def main():
     if not videos:
         raise FileNotFoundError(f"No videos found in {input_folder}")
 
+    videos, _ = plan_videos(videos, args.catalog)
     output_folder.mkdir(parents=True, exist_ok=True)
-    model = YOLO(str(model_path))
+    backend = tiled_from_args(backend_from_args(args), args)
+    pipeline = pipeline_from_args(backend, args)
 
-    for video_path in videos:
-        run_name = video_path.stem + TODAY
-        print(f"Processing {video_path} -> {output_folder / run_name}")
-        model.predict(
-            source=str(video_path),
-            save=True,
-            project=str(output_folder),
-            name=run_name,
-            exist_ok=True,
-        )
+    # one store per model and result settings, see infer.manifest
+    hashes = HashCache(output_folder / "_hashes.json")
+    model_hash = hashes(model_path)
+    settings = result_settings(args)
+    store_path = output_folder / f"detections-{run_id(model_hash, settings)}"
+    store = DetectionStore(store_path, names=backend.names)
+    manifest = RunManifest(store_path, model_hash, settings)
+
+    def detect(video_path, **resume):
+        return detect_video(backend, video_path, store, args.batch_size, pipeline, **resume)
+
+    for video_path, frames, detections in run_videos(
+        videos, store, manifest, hashes, detect, args.checkpoint_every, args.force
+    ):
+        print(f"  ↳ {frames} frames, {detections} detections")
+
+        if args.render:
+            from infer.render import render_video
+
+            out_path = output_folder / f"{video_path.stem}{TODAY}.mp4"
+            print(f"  ↳ Rendering {out_path}")
+            render_video(store, video_path, out_path)
+
+    store.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+"""Renders annotated videos from a detection store.
+
+Rendering is a separate, optional step after inference:
+
+    python -m infer.render -s <store> -i <dji folder> -o <output folder> [--video DJI_0001.MP4]
+"""
+
+from pathlib import Path
+import argparse
+
+import cv2
+import numpy as np
+
+from infer.detection_store import DetectionStore
+from infer.predict import iter_frames
+
+
+def class_colors(n: int) -> np.ndarray:
+    hues = np.linspace(0, 179, max(n, 1), endpoint=False, dtype=np.uint8)
+    hsv = np.stack([hues, np.full_like(hues, 220), np.full_like(hues, 255)], axis=1)
+    return cv2.cvtColor(hsv[None], cv2.COLOR_HSV2BGR)[0]
+
+
+def render_video(store: DetectionStore, video_path: Path, out_path: Path, min_conf: float = 0.0):
+    table = store.read(
+        videos=[video_path.name],
+        columns=["FrameIndex", "Class", "Confidence", "X1", "Y1", "X2", "Y2"],
+    ).sort_by("FrameIndex")
+    frame_index = table.column("FrameIndex").to_numpy()
+    cls = table.column("Class").to_numpy()
+    conf = table.column("Confidence").to_numpy()
+    boxes = np.stack(
+        [table.column(c).to_numpy() for c in ("X1", "Y1", "X2", "Y2")], axis=1
+    ).round().astype(np.int32)
+    colors = class_colors(max(store.names, default=0) + 1)
+
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(out_path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for idx, _, frame in iter_frames(video_path):
+            start, end = np.searchsorted(frame_index, [idx, idx + 1])
+            for i in range(start, end):
+                if conf[i] < min_conf:
+                    continue
+                color = tuple(int(c) for c in colors[cls[i]])
+                x1, y1, x2, y2 = boxes[i]
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                label = f"{store.names.get(int(cls[i]), cls[i])} {conf[i]:.2f}"
+                cv2.putText(frame, label, (x1, max(y1 - 4, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="render",
+        description="Draw stored detections onto their source videos.",
+    )
+    parser.add_argument("--store", "-s", type=str, required=True, help="Detection store.")
+    parser.add_argument(
+        "--input_folder", "-i", type=str, required=True, help="Folder with the source videos."
+    )
+    parser.add_argument(
+        "--output_folder", "-o", type=str, required=True, help="output folder"
+    )
+    parser.add_argument(
+        "--video", action="append", help="Only render these videos (repeatable)."
+    )
+    parser.add_argument(
+        "--min_conf", type=float, default=0.0, help="Hide detections below this confidence."
+    )
+    args = parser.parse_args()
+
+    store = DetectionStore(Path(args.store))
+    input_folder = Path(args.input_folder)
+    output_folder = Path(args.output_folder)
+
+    for name in args.video or store.videos():
+        video_path = input_folder / name
+        if not video_path.exists():
+            print(f"Skipping {name}: not found in {input_folder}")
+            continue
+        out_path = output_folder / f"{video_path.stem}.mp4"
+        print(f"Rendering {video_path} -> {out_path}")
+        render_video(store, video_path, out_path, min_conf=args.min_conf)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Tiled (sliced) inference for high-resolution frames.
+
+The model is trained at 420x420, so feeding a whole 4K frame shrinks small litter
+to a few pixels. TiledBackend cuts every frame into overlapping tiles near the
+training resolution, sends the tiles of all frames in a batch through the wrapped
+backend together, shifts the detections back into frame pixels and merges the
+duplicates found in the overlaps. It has the same interface as the backends in
+infer.backends, so predict.py, geotag.py and infer.pipeline use it unchanged.
+"""
+
+import numpy as np
+
+
+def tile_grid(height: int, width: int, tile: int, overlap: float = 0.2) -> np.ndarray:
+    """Returns (n, 4) x1, y1, x2, y2 tiles covering the frame, overlapping by at
+    least `overlap` of the tile size; the last row and column end at the border."""
+
+    def starts(size):
+        if size <= tile:
+            return np.zeros(1, dtype=np.int64)
+        stride = max(int(tile * (1 - overlap)), 1)
+        n = int(np.ceil((size - tile) / stride)) + 1
+        # spread the tiles evenly instead of leaving a thin last one
+        return np.linspace(0, size - tile, n).round().astype(np.int64)
+
+    ys, xs = np.meshgrid(starts(height), starts(width), indexing="ij")
+    x1, y1 = xs.ravel(), ys.ravel()
+    return np.stack(
+        [x1, y1, np.minimum(x1 + tile, width), np.minimum(y1 + tile, height)], axis=1
+    )
+
+
+def merge_detections(
+    boxes: np.ndarray,
+    conf: np.ndarray,
+    cls: np.ndarray,
+    threshold: float = 0.5,
+    metric: str = "ios",
+    chunk: int = 1024,
+    full_frame: np.ndarray = None,
+) -> np.ndarray:
+    """Greedy NMS over detections from overlapping tiles, returns kept indices.
+
+    A box is dropped when a higher scoring kept box of the same class overlaps
+    it by more than `threshold`. With metric "ios" the overlap is the
+    intersection over the smaller box, so an object cut off at one tile's edge
+    still matches the whole object seen in the neighbouring tile. Pairs with a
+    `full_frame` box (mask of the boxes from the whole frame pass) always use
+    IoU, so one large box cannot swallow the small objects it contains.
+
+    Boxes are processed by descending score in chunks: a chunk is compared with
+    all boxes kept so far at once, and only the boxes that survive are resolved
+    against each other in score order.
+    """
+    n = len(conf)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.argsort(-conf, kind="stable")
+    boxes, cls = boxes[order].astype(np.float32), cls[order]
+    full_frame = (
+        np.zeros(n, dtype=bool) if full_frame is None else np.asarray(full_frame, dtype=bool)[order]
+    )
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    def suppresses(rows, cols):
+        """(rows, cols) mask of the pairs overlapping by more than the threshold."""
+        w = np.minimum(x2[rows, None], x2[cols]) - np.maximum(x1[rows, None], x1[cols])
+        h = np.minimum(y2[rows, None], y2[cols]) - np.maximum(y1[rows, None], y1[cols])
+        inter = np.clip(w, 0, None) * np.clip(h, 0, None)
+        union = areas[rows, None] + areas[cols] - inter
+        overlap = inter / (union + 1e-9)
+        if metric == "ios":
+            ios = inter / (np.minimum(areas[rows, None], areas[cols]) + 1e-9)
+            either_full = full_frame[rows, None] | full_frame[cols]
+            overlap = np.where(either_full, overlap, ios)
+        return (overlap > threshold) & (cls[rows, None] == cls[cols])
+
+    kept = np.empty(0, dtype=np.int64)
+    for start in range(0, n, chunk):
+        rows = np.arange(start, min(start + chunk, n))
+        if len(kept):
+            rows = rows[~suppresses(rows, kept).any(1)]
+        # within the chunk only the boxes kept so far suppress, in score order
+        inside = np.triu(suppresses(rows, rows), 1)
+        keep = np.ones(len(rows), dtype=bool)
+        for i in np.flatnonzero(inside.any(1)):
+            if keep[i]:
+                keep[inside[i]] = False
+        kept = np.concatenate([kept, rows[keep]])
+
+    return np.sort(order[kept])
+
+
+class TiledBackend:
+    """Wraps a backend so every frame is predicted as overlapping tiles.
+
+    With full_frame the downscaled whole frame is predicted as well, so objects
+    larger than a tile are still found in one piece.
+    """
+
+    def __init__(
+        self,
+        backend,
+        tile: int = 420,
+        overlap: float = 0.2,
+        iou: float = 0.5,
+        full_frame: bool = False,
+    ):
+        self.backend = backend
+        self.names = backend.names
+        self.thread_safe = getattr(backend, "thread_safe", False)
+        self.tile = tile
+        self.overlap = overlap
+        self.iou = iou
+        self.full_frame = full_frame
+        self.grids = {}
+
+    def windows(self, frame_shape) -> np.ndarray:
+        height, width = frame_shape[:2]
+        if (height, width) not in self.grids:
+            grid = tile_grid(height, width, self.tile, self.overlap)
+            if self.full_frame and len(grid) > 1:
+                grid = np.vstack([grid, [[0, 0, width, height]]])
+            self.grids[height, width] = grid
+        return self.grids[height, width]
+
+    def crops(self, frame: np.ndarray, windows: np.ndarray) -> list:
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+
+    def merge(self, windows: np.ndarray, detections: list):
+        """Shifts one frame's tile detections into frame pixels and merges them."""
+        boxes = np.concatenate(
+            [b.reshape(-1, 4) + np.tile(w[:2], 2) for w, (b, _, _) in zip(windows, detections)]
+        )
+        conf = np.concatenate([c for _, c, _ in detections])
+        cls = np.concatenate([k for _, _, k in detections]).astype(np.int64)
+        # the whole frame window is the one covering all others, see windows()
+        whole = np.all(windows == [0, 0, windows[:, 2].max(), windows[:, 3].max()], axis=1)
+        whole &= len(windows) > 1
+        full_frame = np.repeat(whole, [len(c) for _, c, _ in detections])
+        keep = merge_detections(boxes, conf, cls, self.iou, full_frame=full_frame)
+        return boxes[keep], conf[keep], cls[keep]
+
+    def split(self, windows_per_frame: list, detections: list) -> list:
+        results, start = [], 0
+        for windows in windows_per_frame:
+            results.append(self.merge(windows, detections[start:start + len(windows)]))
+            start += len(windows)
+        return results
+
+    def predict(self, frames: list) -> list:
+        windows = [self.windows(frame.shape) for frame in frames]
+        tiles = [crop for frame, w in zip(frames, windows) for crop in self.crops(frame, w)]
+        return self.split(windows, self.backend.predict(tiles))
+
+    def prepare(self, frame: np.ndarray):
+        windows = self.windows(frame.shape)
+        return windows, [self.backend.prepare(crop) for crop in self.crops(frame, windows)]
+
+    def infer(self, items: list) -> list:
+        prepared = [tile for _, tiles in items for tile in tiles]
+        return self.split([windows for windows, _ in items], self.backend.infer(prepared))
+
+
+def add_tiling_arguments(parser):
+    """Adds the tiled inference flags shared by the inference scripts."""
+    parser.add_argument(
+        "--tile",
+        type=int,
+        default=0,
+        help="Predict overlapping tiles of this size (e.g. 420, the training size); 0 = whole frames.",
+    )
+    parser.add_argument(
+        "--tile_overlap", type=float, default=0.2, help="Minimum overlap between tiles."
+    )
+    parser.add_argument(
+        "--tile_iou",
+        type=float,
+        default=0.5,
+        help="Intersection over the smaller box above which detections from two tiles are merged.",
+    )
+    parser.add_argument(
+        "--tile_full_frame",
+        action="store_true",
+        help="Also predict the whole frame, for objects larger than a tile.",
+    )
+
+
+def tiled_from_args(backend, args):
+    if args.tile <= 0:
+        return backend
+    return TiledBackend(
+        backend,
+        tile=args.tile,
+        overlap=args.tile_overlap,
+        iou=args.tile_iou,
+        full_frame=args.tile_full_frame,
+    )
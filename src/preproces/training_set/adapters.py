@@ -0,0 +1,290 @@
+"""Dataset source adapters with a common columnar annotation table.
+
+Every source format registers a reader that turns one source into an
+AnnotationTable: an images table (Image, Source, Split, Path) and a boxes
+table (Image, Class, X, Y, W, H) with normalized center boxes, plus the
+source's class names. The tables of all sources are concatenated and written
+by one parallel writer (see build_dataset), so a new format only needs a
+reader:
+
+    @register_reader("myformat")
+    def read_myformat(path):
+        ...
+        return AnnotationTable(images, boxes, names)
+
+Readers reuse the parsing of the single-format scripts: json2yolo (streamed
+COCO JSON), remondis2yolo (pixel xyxy boxes) and data_unifier (YOLO datasets).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from data_unifier import SPLITS, find_image, read_class_names
+from json2yolo import iter_coco_items, read_annotations, read_images, release_coco
+from remondis2yolo import xyxy_to_xywhn
+
+IMAGE_COLUMNS = ["Image", "Source", "Split", "Path"]
+BOX_COLUMNS = ["Image", "Class", "X", "Y", "W", "H"]
+MAX_CLASS = np.iinfo(np.int16).max  # the label index stores class ids as int16
+
+READERS = {}
+
+
+class AnnotationTable:
+    def __init__(self, images, boxes, names):
+        self.images = images
+        self.boxes = boxes
+        self.names = list(names)
+
+    def __len__(self):
+        return len(self.images)
+
+
+def register_reader(name):
+    """Registers a reader function (path -> AnnotationTable) under a format name."""
+
+    def register(reader):
+        READERS[name] = reader
+        return reader
+
+    return register
+
+
+def read_source(fmt, path):
+    """Reads a source with the reader registered for its format."""
+    if fmt not in READERS:
+        raise ValueError(f"Unknown source format {fmt!r}, expected one of {sorted(READERS)}")
+    return READERS[fmt](path)
+
+
+def make_table(source, splits, paths, image, cls, boxes, names):
+    """Builds an AnnotationTable from per-image (split, path) lists and per-box arrays."""
+    images = pd.DataFrame(
+        {
+            "Image": np.arange(len(paths), dtype=np.int64),
+            "Source": source,
+            "Split": splits,
+            "Path": paths,
+        },
+        columns=IMAGE_COLUMNS,
+    )
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    table = pd.DataFrame(
+        {
+            "Image": np.asarray(image, dtype=np.int64),
+            "Class": np.asarray(cls, dtype=np.int64),
+            "X": boxes[:, 0],
+            "Y": boxes[:, 1],
+            "W": boxes[:, 2],
+            "H": boxes[:, 3],
+        },
+        columns=BOX_COLUMNS,
+    )
+    return AnnotationTable(images, table, names)
+
+
+def split_of(path):
+    """The split a file belongs to by its folder names (val counts as valid), else train."""
+    parts = set(os.path.normpath(path).split(os.sep))
+    for split in SPLITS:
+        if split in parts:
+            return split
+    return "valid" if "val" in parts else "train"
+
+
+def parse_label_line(fields):
+    """(class, center box) of one split YOLO label line, or None if it is malformed.
+
+    A line is malformed when a field is not a finite number, the class is not
+    an integer id in [0, MAX_CLASS] or the coordinates are neither a box (4)
+    nor a polygon (an even number, at least 6).
+    """
+    try:
+        values = [float(field) for field in fields]
+    except ValueError:
+        return None
+    cls, coords = values[0], values[1:]
+    if not all(map(math.isfinite, values)) or not cls.is_integer() or not 0 <= cls <= MAX_CLASS:
+        return None
+    if len(coords) == 4:
+        return int(cls), coords
+    if len(coords) < 6 or len(coords) % 2:
+        return None
+    xs, ys = coords[0::2], coords[1::2]
+    low_x, high_x, low_y, high_y = min(xs), max(xs), min(ys), max(ys)
+    return int(cls), [(low_x + high_x) / 2, (low_y + high_y) / 2, high_x - low_x, high_y - low_y]
+
+
+def parse_label_files(label_files):
+    """
+    Parses YOLO label files into flat arrays. Lines with more than four
+    coordinates are segments; their bounding box is used. Malformed lines (see
+    parse_label_line) are skipped and counted per file.
+
+    Returns:
+        np.ndarray: Index of the file every box came from.
+        np.ndarray: Class ids.
+        np.ndarray: (n, 4) normalized center boxes.
+        np.ndarray: Malformed lines per label file.
+    """
+    owners, cls, boxes = [], [], []
+    malformed = np.zeros(len(label_files), dtype=np.int64)
+    for index, label_file in enumerate(label_files):
+        with open(label_file, "r", errors="replace") as file:
+            for line in file:
+                fields = line.split()
+                if not fields:
+                    continue
+                parsed = parse_label_line(fields)
+                if parsed is None:
+                    malformed[index] += 1
+                    continue
+                owners.append(index)
+                cls.append(parsed[0])
+                boxes.append(parsed[1])
+    return (
+        np.array(owners, dtype=np.int64),
+        np.array(cls, dtype=np.int64),
+        np.array(boxes, dtype=np.float64).reshape(-1, 4),
+        malformed,
+    )
+
+
+@register_reader("yolo")
+def read_yolo(path):
+    """A YOLO dataset: data.yaml with the class names and <split>/labels,images folders."""
+    source = os.path.basename(os.path.normpath(path))
+    splits, paths, label_files = [], [], []
+    for split in SPLITS:
+        labels_dir = os.path.join(path, split, "labels")
+        images_dir = os.path.join(path, split, "images")
+        if not os.path.isdir(labels_dir):
+            continue
+        image_names = {entry.name for entry in os.scandir(images_dir)} if os.path.isdir(images_dir) else set()
+        for entry in sorted(os.scandir(labels_dir), key=lambda entry: entry.name):
+            if not entry.is_file():
+                continue
+            image_name = find_image(image_names, entry.name)
+            splits.append(split)
+            paths.append(os.path.join(images_dir, image_name or entry.name.replace("txt", "jpg")))
+            label_files.append(entry.path)
+
+    owners, cls, boxes, malformed = parse_label_files(label_files)
+    if malformed.any():
+        print(f"{source}: skipped {malformed.sum()} malformed label lines in {np.count_nonzero(malformed)} files")
+    return make_table(source, splits, paths, owners, cls, boxes, read_class_names(path))
+
+
+@register_reader("coco")
+def read_coco(path):
+    """A COCO export: every *.json below path, images next to the json or in images/.
+
+    The split is taken from the folder names of the json file. Images without
+    annotations are kept as background.
+    """
+    source = os.path.basename(os.path.normpath(path))
+    splits, paths, owners, classes, boxes, names = [], [], [], [], [], {}
+    for root, _, files in sorted(os.walk(path)):
+        for json_name in sorted(name for name in files if name.endswith(".json")):
+            json_file = os.path.join(root, json_name)
+            image_index, widths, heights, file_names = read_images(json_file)
+            labels, _ = read_annotations(json_file, image_index, widths, heights)
+            names.update(
+                (category["id"], category["name"])
+                for category in iter_coco_items(json_file, "categories")
+            )
+            release_coco()
+
+            image_dir = root
+            if file_names and not os.path.exists(os.path.join(root, file_names[0])):
+                image_dir = os.path.join(root, "images")
+            owners.append(labels["Image"].to_numpy(np.int64) + len(paths))
+            classes.append(labels["Class"].to_numpy(np.int64))
+            boxes.append(labels[["X", "Y", "W", "H"]].to_numpy(np.float64))
+            splits += [split_of(json_file)] * len(file_names)
+            paths += [os.path.join(image_dir, name) for name in file_names]
+
+    # category ids index the names; ids without a category stay empty
+    class_names = [names.get(i, "") for i in range(max(names, default=-1) + 1)]
+    return make_table(
+        source,
+        splits,
+        paths,
+        np.concatenate(owners) if owners else [],
+        np.concatenate(classes) if classes else [],
+        np.concatenate(boxes) if boxes else [],
+        class_names,
+    )
+
+
+def image_size(path):
+    """(width, height) from the image header, or None if the image is missing."""
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except FileNotFoundError:
+        return None
+
+
+def parse_remondis_file(label_file):
+    """
+    Reads the pixel [left top right bottom] boxes in columns 4:8 of a Remondis
+    label file. Lines that are too short or whose box is not four finite numbers
+    are skipped and counted, like malformed YOLO lines (see parse_label_line).
+
+    Returns:
+        np.ndarray: (n, 4) pixel boxes.
+        int: Malformed lines.
+    """
+    boxes, malformed = [], 0
+    with open(label_file, "r", errors="replace") as file:
+        for line in file:
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                box = [float(field) for field in fields[4:8]]
+            except ValueError:
+                box = []
+            if len(box) == 4 and all(map(math.isfinite, box)):
+                boxes.append(box)
+            else:
+                malformed += 1
+    return np.array(boxes, dtype=np.float64).reshape(-1, 4), malformed
+
+
+@register_reader("remondis")
+def read_remondis(path, workers=16):
+    """A Remondis dataset: labels/*.txt with pixel [left top right bottom] boxes in
+    columns 4:8 and images/*.jpg; every box is a bag."""
+    source = os.path.basename(os.path.normpath(path))
+    labels_dir = os.path.join(path, "labels")
+    label_files = sorted(entry.path for entry in os.scandir(labels_dir) if entry.is_file())
+    paths = [
+        os.path.join(path, "images", os.path.basename(label).replace("txt", "jpg"))
+        for label in label_files
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sizes = list(pool.map(image_size, paths))
+
+    owners, boxes, malformed = [], [], 0
+    for index, (label, size) in enumerate(zip(label_files, sizes)):
+        if size is None or not os.path.getsize(label):
+            continue
+        xyxy, bad = parse_remondis_file(label)
+        malformed += bad
+        boxes.append(xyxy_to_xywhn(xyxy, *size))
+        owners.append(np.full(len(xyxy), index, dtype=np.int64))
+    if malformed:
+        print(f"{source}: skipped {malformed} malformed label lines")
+
+    owners = np.concatenate(owners) if owners else np.empty(0, dtype=np.int64)
+    boxes = np.concatenate(boxes) if boxes else np.empty((0, 4))
+    return make_table(
+        source, [split_of(path)] * len(paths), paths, owners, np.zeros(len(owners)), boxes, ["bag"]
+    )
@@ -0,0 +1,252 @@
+"""Builds one unified YOLO dataset from sources of any registered format.
+
+Every source is read into an AnnotationTable (see adapters) in parallel; the
+tables are concatenated, their classes remapped onto the unified classes with
+the compiled lookups of data_unifier, duplicate boxes dropped, and the result
+written by one parallel writer: label files on a process pool, images placed
+from the content-addressed image store (or copied) on a thread pool.
+
+Images are named <source>_<file name> in the target, so sources cannot
+overwrite each other. Images whose boxes were all discarded are left out,
+images without boxes are kept as background.
+
+    python build_dataset.py --yolo datasets/a datasets/b --coco exports/c --remondis remondis/d -t datasets/unified
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from adapters import READERS, read_source
+from data_unifier import SPLITS, UNIFIED_IDS, compile_mapping, write_data_yaml
+from image_store import LINK_MODES, ImageStore, copy_all
+
+
+def _read_source_task(task):
+    return read_source(*task)
+
+
+def read_sources(sources, workers):
+    """Reads every (format, path) source, one per worker."""
+    if workers <= 1:
+        return [_read_source_task(source) for source in sources]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_read_source_task, sources))
+
+
+def combine(tables, unified_ids=UNIFIED_IDS):
+    """
+    Concatenates the tables of all sources with unified class ids.
+
+    Returns:
+        pd.DataFrame: Images that are kept, with their target Name.
+        pd.DataFrame: Their unique boxes, Image referring to the images' index.
+        Counter: Kept and discarded images and boxes.
+    """
+    images, boxes = [], []
+    offset = 0
+    for table in tables:
+        lookup = compile_mapping(table.names, unified_ids)
+        cls = table.boxes["Class"].to_numpy(np.int64)
+        in_range = (cls >= 0) & (cls < len(lookup))
+        mapped = np.full(len(cls), -1, dtype=np.int64)
+        mapped[in_range] = lookup[cls[in_range]]
+        images.append(table.images.assign(Image=table.images["Image"] + offset))
+        boxes.append(table.boxes.assign(Image=table.boxes["Image"] + offset, Class=mapped))
+        offset += len(table)
+
+    images = pd.concat(images, ignore_index=True)
+    boxes = pd.concat(boxes, ignore_index=True)
+    counts = Counter()
+
+    had_boxes = np.bincount(boxes["Image"], minlength=len(images)) > 0
+    keep = boxes["Class"].to_numpy() >= 0
+    counts["discarded_boxes"] = int((~keep).sum())
+    boxes = boxes[keep]
+    kept_boxes = np.bincount(boxes["Image"], minlength=len(images)) > 0
+    declined = had_boxes & ~kept_boxes
+    counts["declined_images"] = int(declined.sum())
+    counts["background_images"] = int((~had_boxes).sum())
+
+    duplicated = boxes.duplicated()
+    counts["duplicate_boxes"] = int(duplicated.sum())
+    boxes = boxes[~duplicated]
+    counts["boxes"] = len(boxes)
+
+    images = images[~declined].reset_index(drop=True)
+    # renumber the kept images so Image is their position in the table
+    new_ids = np.full(len(declined), -1, dtype=np.int64)
+    new_ids[images["Image"].to_numpy()] = np.arange(len(images))
+    boxes = boxes.assign(Image=new_ids[boxes["Image"].to_numpy()])
+    images["Image"] = np.arange(len(images))
+    images["Name"] = images["Source"] + "_" + images["Path"].map(os.path.basename)
+    return images, boxes.sort_values("Image", kind="stable").reset_index(drop=True), counts
+
+
+def write_label_files(paths, classes, boxes, ends):
+    """Writes a label file per path, with the rows up to the path's end offset."""
+    start = 0
+    for path, end in zip(paths, ends):
+        with open(path, "w") as file:
+            file.writelines(
+                "%g %g %g %g %g\n" % (cls, *box)
+                for cls, box in zip(classes[start:end].tolist(), boxes[start:end].tolist())
+            )
+        start = end
+    return len(paths)
+
+
+def _write_label_files_task(task):
+    return write_label_files(*task)
+
+
+def write_dataset(
+    images,
+    boxes,
+    target_dataset_dir,
+    workers=os.cpu_count(),
+    image_store=None,
+    link_mode="auto",
+):
+    """
+    Writes the combined tables as a YOLO dataset, <split>/images and <split>/labels.
+
+    Returns:
+        Counter: Label files written, images placed per method and missing images.
+    """
+    counts = Counter()
+    for split in SPLITS:
+        os.makedirs(os.path.join(target_dataset_dir, split, "images"), exist_ok=True)
+        os.makedirs(os.path.join(target_dataset_dir, split, "labels"), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        exists = np.array(list(pool.map(os.path.exists, images["Path"])), dtype=bool)
+    counts["missing_images"] = int((~exists).sum())
+
+    target_images = [
+        os.path.join(target_dataset_dir, split, "images", name)
+        for split, name in zip(images["Split"], images["Name"])
+    ]
+    target_labels = [
+        os.path.join(target_dataset_dir, split, "labels", os.path.splitext(name)[0] + ".txt")
+        for split, name in zip(images["Split"], images["Name"])
+    ]
+
+    # the boxes are sorted by image, so the rows of the present images are
+    # contiguous and a chunk of images is a slice of rows
+    present = np.flatnonzero(exists)
+    rows = exists[boxes["Image"].to_numpy()]
+    classes = boxes["Class"].to_numpy()[rows]
+    xywh = boxes[["X", "Y", "W", "H"]].to_numpy()[rows]
+    ends = np.cumsum(np.bincount(boxes["Image"], minlength=len(images))[present])
+    tasks = []
+    for chunk in np.array_split(np.arange(len(present)), max(1, workers * 4)):
+        if not len(chunk):
+            continue
+        start = ends[chunk[0] - 1] if chunk[0] else 0
+        tasks.append(
+            (
+                [target_labels[i] for i in present[chunk]],
+                classes[start:ends[chunk[-1]]],
+                xywh[start:ends[chunk[-1]]],
+                ends[chunk] - start,
+            )
+        )
+
+    if workers <= 1:
+        written = sum(map(_write_label_files_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(_write_label_files_task, tasks))
+    counts["label_files"] = written
+
+    jobs = [(images["Path"][i], target_images[i]) for i in present if not os.path.exists(target_images[i])]
+    if image_store:
+        placed = ImageStore(image_store, link_mode).place_all(jobs)
+    else:
+        placed = copy_all(jobs)
+    for method, n in placed.items():
+        counts[f"images_{method}"] += n
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="build_dataset",
+        description="Build one unified YOLO dataset from sources of any registered format.",
+    )
+    for fmt in READERS:
+        parser.add_argument(
+            f"--{fmt}", nargs="+", default=[], metavar="PATH", help=f"Source(s) in {fmt} format."
+        )
+    parser.add_argument(
+        "--target_dataset_dir",
+        "-t",
+        type=str,
+        required=True,
+        help="Path to the directory containing the target dataset.",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of sources read and label file chunks written in parallel.",
+    )
+    parser.add_argument(
+        "--image_store",
+        type=str,
+        default="auto",
+        help="Content-addressed image store to link images from "
+        "('auto': .image_store next to the target, 'none': plain copies).",
+    )
+    parser.add_argument(
+        "--link_mode",
+        choices=LINK_MODES,
+        default="auto",
+        help="Place images from the store as hardlinks, reflinks or copies (auto: first that works).",
+    )
+    args = parser.parse_args()
+
+    sources = [(fmt, path) for fmt in READERS for path in getattr(args, fmt)]
+    if not sources:
+        parser.error(f"no sources given, use one of {', '.join('--' + fmt for fmt in READERS)}")
+
+    image_store = args.image_store
+    if image_store == "auto":
+        image_store = os.path.join(
+            os.path.dirname(os.path.abspath(args.target_dataset_dir)), ".image_store"
+        )
+    elif image_store == "none":
+        image_store = None
+
+    tables = read_sources(sources, args.workers)
+    for (fmt, path), table in zip(sources, tables):
+        print(f"{path} ({fmt}): {len(table)} images, {len(table.boxes)} boxes, classes {table.names}")
+
+    images, boxes, counts = combine(tables)
+    os.makedirs(args.target_dataset_dir, exist_ok=True)
+    write_data_yaml(args.target_dataset_dir)
+    counts.update(
+        write_dataset(images, boxes, args.target_dataset_dir, args.workers, image_store, args.link_mode)
+    )
+
+    print(f"Wrote {counts['label_files']} label files with {counts['boxes']} boxes")
+    print(f"{counts['background_images']} background images")
+    print(f"{counts['declined_images']} images without any unified class left out")
+    print(f"{counts['discarded_boxes']} boxes of other classes, {counts['duplicate_boxes']} duplicates dropped")
+    placed = {key[len("images_"):]: n for key, n in counts.items() if key.startswith("images_")}
+    if placed:
+        methods = ", ".join(f"{n} by {method}" for method, n in sorted(placed.items()))
+        print(f"Placed {sum(placed.values())} images: {methods}")
+    if counts["missing_images"]:
+        print(f"{counts['missing_images']} images not found")
+    return counts
+
+
+if __name__ == "__main__":
+    main()
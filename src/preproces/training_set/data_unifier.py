@@ -1,133 +1,326 @@
 import os
 import yaml
 import argparse
-import shutil
+import hashlib
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from image_store import LINK_MODES, ImageStore, copy_all
+
+SPLITS = ["train", "test", "valid"]
+
+MANIFEST_NAME = ".unifier_manifest.json"
+# bump when the remapping rules in this file change, to rebuild everything
+RULES_VERSION = 1
+
+# dict of classes which all datasets need to map to if a class has the same substring name.
+UNIFIED_IDS = {
+    "bag": 0,
+    "other trash clustered cigarette litter straw lid pop tab scrap": 1,
+    "cardboard uht carton": 2,
+    "glass": 3,
+    "metal aluminium": 4,
+    "paper wrapper": 5,
+    "plastic vinyl pet bottle cup tyres": 6,
+    "styrofoam": 7,
+    "wood pallets": 8,
+}
+
+SIMPLE_NAMES_LOOKUP = {
+    "bag": "bag",
+    "other trash clustered cigarette litter straw lid pop tab scrap": "litter",
+    "cardboard uht carton": "cardboard",
+    "glass": "glass",
+    "metal aluminium": "metal",
+    "paper wrapper": "paper",
+    "plastic vinyl pet bottle cup tyres": "plastic",
+    "styrofoam": "styrofoam",
+    "wood pallets": "wood",
+}
+
+
+def unified_class_id(name, unified_ids=UNIFIED_IDS):
+    """
+    Returns the unified id of a source class name, or None if it is discarded.
 
+    The name maps to the first unified class (in unified_ids order) that has one
+    of the name's words as a substring, after lower-casing and treating '-' and
+    '_' as spaces.
+    """
+    words = [
+        word.strip()
+        for word in name.lower().replace("-", " ").replace("_", " ").split(" ")
+    ]
+    for unified_name, unified_id in unified_ids.items():
+        for word in words:
+            if word and word in unified_name:
+                return unified_id
+    return None
+
+
+def compile_mapping(names, unified_ids=UNIFIED_IDS):
+    """
+    Compiles a dataset's old -> new class mapping into a lookup array.
 
-def list_all_class_names(args):
+    Parameters:
+        names (list): Class names of the dataset, indexed by old class id.
+
+    Returns:
+        np.ndarray: New class id per old class id, -1 for discarded classes.
     """
-    Lists all unique class names from the data.yaml files in the given datasets directory.
+    lookup = np.full(len(names), -1, dtype=np.int64)
+    for old_id, name in enumerate(names):
+        new_id = unified_class_id(name, unified_ids)
+        if new_id is not None:
+            lookup[old_id] = new_id
+    return lookup
+
+
+def read_class_names(dataset_path):
+    yaml_path = os.path.join(dataset_path, "data.yaml")
+    if not os.path.exists(yaml_path):
+        return []
+    with open(yaml_path, "r") as file:
+        data = yaml.safe_load(file) or {}
+    names = data.get("names", [])
+    # data.yaml may list names or map ids to names
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    return names
+
+
+def find_image(image_names, label_name):
+    """The source image of a label file: the .jpg, else the .PNG, else None."""
+    for candidate in (label_name.replace("txt", "jpg"), label_name.replace("txt", "PNG")):
+        if candidate in image_names:
+            return candidate
+    return None
+
+
+def mapping_version(unified_ids=UNIFIED_IDS):
+    key = json.dumps({"rules": RULES_VERSION, "unified_ids": unified_ids}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def remap_split(
+    dataset_path,
+    split,
+    lookup,
+    target_dataset_dir,
+    files=None,
+    image_store=None,
+    link_mode="auto",
+):
+    """
+    Rewrites the labels of one split of a dataset into the target dataset and
+    copies the images that keep at least one label, or have none (background).
+
+    All label lines of the split are parsed at once and remapped with one
+    lookup into the compiled mapping.
 
     Parameters:
-        datasets_dir (str): Path to the directory containing the datasets.
+        files (iterable): Only these label file names, default all of the split.
+        image_store (str): Content-addressed image store (see image_store) the
+            images are linked from; without one they are copied.
+        link_mode (str): How images are placed from the store.
 
     Returns:
-        set: A set of all unique class names.
+        Counter: files/labels remapped, declined and background, discarded
+        labels per (dataset, old class id) and missing images.
+        dict: Per label file, whether a label was written and the target image name.
     """
-    datasets_dir = args.source_datasets_dir
-    target_dataset_dir = args.target_dataset_dir
+    counts = Counter()
+    outputs = {}
+    split_path = os.path.join(dataset_path, split)
+    labels_dir = os.path.join(split_path, "labels")
+    images_dir = os.path.join(split_path, "images")
+    if not os.path.isdir(labels_dir):
+        return counts, outputs
+
+    label_files = sorted(
+        entry.name for entry in os.scandir(labels_dir) if entry.is_file()
+    )
+    if files is not None:
+        label_files = sorted(set(label_files) & set(files))
+    image_names = (
+        {entry.name for entry in os.scandir(images_dir)}
+        if os.path.isdir(images_dir)
+        else set()
+    )
 
-    # dict of classes which all datasets need to map to if a class has the same substring name.
-    unified_ids = {
-        "bag": 0,
-        "other trash clustered cigarette litter straw lid pop tab scrap": 1,
-        "cardboard uht carton": 2,
-        "glass": 3,
-        "metal aluminium": 4,
-        "paper wrapper": 5,
-        "plastic vinyl pet bottle cup tyres": 6,
-        "styrofoam": 7,
-        "wood pallets": 8,
+    # one flat list of fields over all files of the split
+    rows, owners = [], []
+    for index, file_name in enumerate(label_files):
+        with open(os.path.join(labels_dir, file_name), "r") as file:
+            for line in file:
+                fields = line.split()
+                if fields:
+                    rows.append(fields)
+                    owners.append(index)
+
+    owners = np.array(owners, dtype=np.int64)
+    old_ids = np.array([int(fields[0]) for fields in rows], dtype=np.int64)
+    in_range = (old_ids >= 0) & (old_ids < len(lookup))
+    new_ids = np.full(len(old_ids), -1, dtype=np.int64)
+    new_ids[in_range] = lookup[old_ids[in_range]]
+    keep = new_ids >= 0
+
+    lines_per_file = np.bincount(owners, minlength=len(label_files))
+    kept_per_file = np.bincount(owners[keep], minlength=len(label_files))
+    for old_id, count in zip(*np.unique(old_ids[~keep], return_counts=True)):
+        counts[("discarded", os.path.basename(dataset_path), int(old_id))] += int(count)
+    counts["remapped_labels"] += int(keep.sum())
+    counts["declined_labels"] += int((~keep).sum())
+
+    # the kept lines of each file, in file order
+    kept_rows = np.flatnonzero(keep)
+    bounds = np.searchsorted(owners[kept_rows], np.arange(len(label_files) + 1))
+
+    target_labels = os.path.join(target_dataset_dir, split, "labels")
+    target_images = os.path.join(target_dataset_dir, split, "images")
+    copies = []
+    for index, file_name in enumerate(label_files):
+        if lines_per_file[index] and not kept_per_file[index]:
+            counts["declined_files"] += 1
+            outputs[file_name] = [False, None]
+            continue
+
+        if lines_per_file[index]:
+            with open(os.path.join(target_labels, file_name), "w") as file:
+                file.writelines(
+                    f"{new_ids[row]} {' '.join(rows[row][1:])}\n"
+                    for row in kept_rows[bounds[index]:bounds[index + 1]]
+                )
+            counts["remapped_files"] += 1
+        else:
+            counts["background_files"] += 1
+
+        image_name = find_image(image_names, file_name)
+        target_image_path = os.path.join(target_images, file_name.replace("txt", "jpg"))
+        if image_name is None:
+            counts["missing_images"] += 1
+        elif not os.path.exists(target_image_path):
+            copies.append((os.path.join(images_dir, image_name), target_image_path))
+        outputs[file_name] = [
+            bool(lines_per_file[index]),
+            None if image_name is None else os.path.basename(target_image_path),
+        ]
+
+    # all images of the split are placed at once, on a thread pool
+    if image_store:
+        placed = ImageStore(image_store, link_mode).place_all(copies)
+    else:
+        placed = copy_all(copies)
+    for method, n in placed.items():
+        counts[f"images_{method}"] += n
+
+    return counts, outputs
+
+
+def scan_split(split_path):
+    """(size, mtime) of every label file and of its image, {label name: [...]}."""
+    labels_dir = os.path.join(split_path, "labels")
+    images_dir = os.path.join(split_path, "images")
+    if not os.path.isdir(labels_dir):
+        return {}
+
+    images = {}
+    if os.path.isdir(images_dir):
+        for entry in os.scandir(images_dir):
+            stat = entry.stat()
+            images[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+    state = {}
+    for entry in os.scandir(labels_dir):
+        if entry.is_file():
+            stat = entry.stat()
+            image_name = find_image(images, entry.name)
+            state[entry.name] = [stat.st_size, stat.st_mtime_ns] + (
+                images[image_name] if image_name else [None, None]
+            )
+    return state
+
+
+def remove_outputs(target_dataset_dir, split, files):
+    """Deletes the unified label and image written for each {label name: record}."""
+    for file_name, record in files.items():
+        wrote_label, image_name = record["outputs"]
+        if wrote_label:
+            path = os.path.join(target_dataset_dir, split, "labels", file_name)
+            if os.path.exists(path):
+                os.remove(path)
+        if image_name:
+            path = os.path.join(target_dataset_dir, split, "images", image_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def update_split(
+    dataset_path,
+    split,
+    lookup,
+    target_dataset_dir,
+    previous,
+    version,
+    image_store=None,
+    link_mode="auto",
+):
+    """
+    Brings one split of the unified dataset up to date with its source.
+
+    Only label files that are new or whose label or image changed (size or
+    mtime) are rewritten; outputs of changed and deleted files are removed
+    first. If the mapping version or the split's compiled lookup changed, the
+    whole split is rewritten.
+
+    Returns:
+        Counter: As remap_split, plus unchanged and deleted files.
+        dict: The split's new manifest entry.
+    """
+    state = scan_split(os.path.join(dataset_path, split))
+    previous = previous or {}
+    previous_files = previous.get("files", {})
+    up_to_date = previous.get("version") == version and previous.get("lookup") == lookup.tolist()
+
+    if up_to_date:
+        changed = [name for name in state if previous_files.get(name, {}).get("source") != state[name]]
+    else:
+        changed = list(state)
+    changed_set = set(changed)
+    stale = {
+        name: record
+        for name, record in previous_files.items()
+        if name not in state or name in changed_set or not up_to_date
     }
+    remove_outputs(target_dataset_dir, split, stale)
 
-    # test: unified_dataset/test/images
-    # train: unified_dataset/train/images
-    # val: unified_dataset/valid/images
+    counts, outputs = remap_split(
+        dataset_path, split, lookup, target_dataset_dir, changed, image_store, link_mode
+    )
+    counts["unchanged_files"] += len(state) - len(changed)
+    counts["deleted_files"] += sum(name not in state for name in previous_files)
 
-    from_old_to_new_id_mapping = {}
-
-    # Each dataset has a folder which includes a train, test and valid folder.enumerate
-    # Each dataset also includes a data.yaml file which includes the class names and the number of classes
-    # The loop below goes through each dataset folder and reads the data.yaml file to get the class names
-    # The class names are then checked against the unified_classes dict to see if the class name is in the dict
-    # If the class name is in the dict, the class name is appended to the all_classes list with the corresponding value in the dict
-    # If the class name is not in the dict its discarded
-    discarded_items = 0
-    discarded_classes = []
-    remapped_items = 0
-    remapped_classes = []
-    all_classes = []
-    for dataset_folder in os.listdir(datasets_dir):
-        dataset_path = os.path.join(datasets_dir, dataset_folder)
-        from_old_to_new_id_mapping[dataset_path] = {}
-        if os.path.isdir(dataset_path):
-            yaml_path = os.path.join(dataset_path, "data.yaml")
-            if os.path.exists(yaml_path):
-                with open(yaml_path, "r") as file:
-                    data = yaml.safe_load(file)
-                    if "names" in data:
-                        for old_id, name in enumerate(data["names"]):
-                            name = name.lower()
-                            all_classes.append(name)
-                            temp = 0
-                            # check if the name is a substring of any of the unified_ids keys
-                            for unified_id in unified_ids.keys():
-                                if temp == 1:
-                                    break
-                                name = name.replace("-", " ")
-                                name = name.replace("_", " ")
-
-                                for word in name.split(" "):
-                                    word = word.strip()
-                                    if word:
-                                        if word in unified_id:
-                                            # check if the name is already in the unified_ids dict
-                                            if (
-                                                unified_id
-                                                in from_old_to_new_id_mapping[
-                                                    dataset_path
-                                                ]
-                                            ):
-                                                from_old_to_new_id_mapping[
-                                                    dataset_path
-                                                ][old_id] = from_old_to_new_id_mapping[
-                                                    dataset_path
-                                                ][unified_id]
-
-                                            else:
-                                                from_old_to_new_id_mapping[
-                                                    dataset_path
-                                                ][old_id] = unified_ids[unified_id]
-                                            remapped_items += 1
-                                            temp = 1
-                                            break
-
-                            if not temp:
-                                discarded_items += 1
-                                discarded_classes.append(name)
-                            else:
-                                remapped_classes.append(name)
-
-    declined_files = 0
-    remapped_files = 0
-    background_files = 0
-    remapped_labels = 0
-    declined_labels = 0
-    # initialize the new dataset dir
-    if not os.path.exists(target_dataset_dir):
-        os.makedirs(target_dataset_dir)
-        # initialize the train, test and valid folders
-        for split in ["train", "test", "valid"]:
-            if not os.path.exists(os.path.join(target_dataset_dir, split)):
-                os.makedirs(os.path.join(target_dataset_dir, split, "images"))
-                os.makedirs(os.path.join(target_dataset_dir, split, "labels"))
+    files = {name: previous_files[name] for name in state if name not in changed_set}
+    for name in changed:
+        if name in outputs:
+            files[name] = {"source": state[name], "outputs": outputs[name]}
+    entry = {"version": version, "lookup": lookup.tolist(), "files": files}
+    return counts, entry
 
-    simple_names_lookup = {
-        "bag": "bag",
-        "other trash clustered cigarette litter straw lid pop tab scrap": "litter",
-        "cardboard uht carton": "cardboard",
-        "glass": "glass",
-        "metal aluminium": "metal",
-        "paper wrapper": "paper",
-        "plastic vinyl pet bottle cup tyres": "plastic",
-        "styrofoam": "styrofoam",
-        "wood pallets": "wood",
-    }
 
+def _update_split_task(task):
+    return update_split(*task)
+
+
+def write_data_yaml(target_dataset_dir, unified_ids=UNIFIED_IDS):
+    """Writes the data.yaml of the unified dataset and labels.yaml (for training) in the working directory."""
     simple_names = {}
     # remap the unified_ids dict to simple names
     for key in unified_ids.keys():
-        simple_names[simple_names_lookup[key]] = unified_ids[key]
+        simple_names[SIMPLE_NAMES_LOOKUP[key]] = unified_ids[key]
 
     # initalize the data.yaml file
     with open(os.path.join(target_dataset_dir, "data.yaml"), "w") as file:
@@ -155,110 +348,149 @@ def list_all_class_names(args):
             file,
         )
 
-    for mapping in from_old_to_new_id_mapping:
-        print(mapping)
-        print(from_old_to_new_id_mapping[mapping])
-
-    for dataset_folder in os.listdir(datasets_dir):
-        dataset_path = os.path.join(datasets_dir, dataset_folder)
-        # Now we overwrite the label files in the train,test and valid folders of the dataset with the new class ids
-        for split in ["train", "test", "valid"]:
-            split_path = os.path.join(dataset_path, split)
-            if os.path.isdir(split_path):
-                for file_name in os.listdir(os.path.join(split_path, "labels")):
-                    class_id = None
-                    file_path = os.path.join(split_path, "labels", file_name)
-                    target_file_path = os.path.join(
-                        target_dataset_dir, split, "labels", file_name
-                    )
-
-                    with open(file_path, "r") as file:
-                        lines = file.readlines()
-
-                    if lines:
-                        with open(target_file_path, "w") as file:
-                            switch = 0
-                            for line in lines:
-                                class_id = int(line.split()[0])
-                                if class_id in from_old_to_new_id_mapping[dataset_path]:
-                                    new_class_id = from_old_to_new_id_mapping[
-                                        dataset_path
-                                    ][class_id]
-                                    file.write(
-                                        f"{new_class_id} {' '.join(line.split()[1:])}\n"
-                                    )
-
-                                    # copy the image file to the new dataset folder
-                                    image_path = os.path.join(
-                                        split_path,
-                                        "images",
-                                        file_name.replace("txt", "jpg"),
-                                    )
-                                    target_image_path = os.path.join(
-                                        target_dataset_dir,
-                                        split,
-                                        "images",
-                                        file_name.replace("txt", "jpg"),
-                                    )
-                                    image_path_2 = os.path.join(
-                                        split_path,
-                                        "images",
-                                        file_name.replace("txt", "PNG"),
-                                    )
-
-                                    if not os.path.exists(target_image_path):
-                                        try:
-                                            shutil.copy(image_path, target_image_path)
-                                        except:
-                                            shutil.copy(image_path_2, target_image_path)
-
-                                    remapped_labels += 1
-                                    switch = 1
-                                else:
-                                    declined_labels += 1
-                                    print(
-                                        f"Discarded class {class_id} in {split_path + file_name}"
-                                    )
-
-                        if switch == 0:
-                            declined_files += 1
-                            os.remove(target_file_path)
-
-                        else:
-                            remapped_files += 1
-                    else:
-                        background_files += 1
-                        image_path = os.path.join(
-                            split_path, "images", file_name.replace("txt", "jpg")
-                        )
-                        target_image_path = os.path.join(
-                            target_dataset_dir,
-                            split,
-                            "images",
-                            file_name.replace("txt", "jpg"),
-                        )
-                        image_path_2 = os.path.join(
-                            split_path, "images", file_name.replace("txt", "PNG")
-                        )
-
-                        if not os.path.exists(target_image_path):
-                            try:
-                                shutil.copy(image_path, target_image_path)
-                            except:
-                                shutil.copy(image_path_2, target_image_path)
-
-    print(f"Discarded {discarded_items} / {remapped_items + discarded_items} classes")
-    print(f"Remapped {remapped_items} classes")
-
-    print(f"Remapped {remapped_files} files")
-    print(f"{declined_files} files not copied")
-
-    print(f"Remapped {remapped_labels} classes")
-    print(f"{declined_labels} classes not copied")
-
-    print(f"{background_files} background files copied")
-
-    print(f"Total copied files: {remapped_files + background_files}")
+
+def list_all_class_names(args):
+    """
+    Lists all unique class names from the data.yaml files in the given datasets
+    directory, maps them onto the unified classes and writes the unified dataset.
+
+    Parameters:
+        args: source_datasets_dir, target_dataset_dir and workers.
+
+    Returns:
+        Counter: The aggregated counters of all datasets and splits.
+    """
+    datasets_dir = args.source_datasets_dir
+    target_dataset_dir = args.target_dataset_dir
+    unified_ids = UNIFIED_IDS
+
+    # test: unified_dataset/test/images
+    # train: unified_dataset/train/images
+    # val: unified_dataset/valid/images
+
+    # Each dataset has a folder which includes a train, test and valid folder.
+    # Each dataset also includes a data.yaml file with the class names; every
+    # class name is compiled once into the dataset's old -> new lookup array.
+    # Datasets without a data.yaml keep no labels.
+    lookups = {}
+    remapped_classes, discarded_classes = [], []
+    for entry in sorted(os.scandir(datasets_dir), key=lambda entry: entry.name):
+        if not entry.is_dir():
+            continue
+        names = read_class_names(entry.path)
+        lookups[entry.path] = compile_mapping(names, unified_ids)
+        for name, new_id in zip(names, lookups[entry.path]):
+            (remapped_classes if new_id >= 0 else discarded_classes).append(name.lower())
+
+    # initialize the new dataset dir
+    if not os.path.exists(target_dataset_dir):
+        os.makedirs(target_dataset_dir)
+        # initialize the train, test and valid folders
+        for split in SPLITS:
+            if not os.path.exists(os.path.join(target_dataset_dir, split)):
+                os.makedirs(os.path.join(target_dataset_dir, split, "images"))
+                os.makedirs(os.path.join(target_dataset_dir, split, "labels"))
+
+    write_data_yaml(target_dataset_dir, unified_ids)
+
+    for dataset_path, lookup in lookups.items():
+        print(f"{dataset_path}: {dict(enumerate(lookup.tolist()))}")
+
+    # The manifest records per (dataset, split) the compiled lookup and per
+    # label file its source (size, mtime) and outputs. In incremental mode only
+    # the difference with the manifest is processed.
+    manifest_path = os.path.join(target_dataset_dir, MANIFEST_NAME)
+    manifest = {}
+    if args.incremental and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+    version = mapping_version(unified_ids)
+
+    # images are stored once by content and linked into the splits; the
+    # default store sits next to the target so sibling datasets share it
+    image_store = args.image_store
+    if image_store == "auto":
+        image_store = os.path.join(
+            os.path.dirname(os.path.abspath(target_dataset_dir)), ".image_store"
+        )
+    elif image_store == "none":
+        image_store = None
+
+    def split_key(dataset_path, split):
+        return f"{os.path.basename(dataset_path)}/{split}"
+
+    tasks = [
+        (
+            dataset_path,
+            split,
+            lookup,
+            target_dataset_dir,
+            manifest.get(split_key(dataset_path, split)),
+            version,
+            image_store,
+            args.link_mode,
+        )
+        for dataset_path, lookup in lookups.items()
+        for split in SPLITS
+        if os.path.isdir(os.path.join(dataset_path, split))
+    ]
+    counts = Counter()
+
+    # splits (or whole datasets) that disappeared from the source
+    current = {split_key(task[0], task[1]) for task in tasks}
+    for key, entry in manifest.items():
+        if key not in current:
+            remove_outputs(target_dataset_dir, key.rsplit("/", 1)[1], entry["files"])
+            counts["deleted_files"] += len(entry["files"])
+
+    # every (dataset, split) is updated by its own worker
+    if args.workers <= 1:
+        results = [_update_split_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(_update_split_task, tasks))
+
+    entries = {}
+    for task, (result, entry) in zip(tasks, results):
+        counts.update(result)
+        entries[split_key(task[0], task[1])] = entry
+
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(entries, file)
+    os.replace(tmp_path, manifest_path)
+
+    discarded = sorted(
+        ((key[1], key[2], n) for key, n in counts.items() if isinstance(key, tuple)),
+        key=lambda item: -item[2],
+    )
+    print(f"Discarded {len(discarded_classes)} / {len(remapped_classes) + len(discarded_classes)} classes")
+    print(f"Remapped {len(remapped_classes)} classes")
+
+    print(f"Remapped {counts['remapped_files']} files")
+    print(f"{counts['declined_files']} files not copied")
+
+    print(f"Remapped {counts['remapped_labels']} classes")
+    print(f"{counts['declined_labels']} classes not copied")
+    for dataset, old_id, n in discarded[:10]:
+        print(f"  {n} labels of class {old_id} in {dataset}")
+
+    print(f"{counts['background_files']} background files copied")
+    placed = {
+        key[len("images_"):]: n
+        for key, n in counts.items()
+        if isinstance(key, str) and key.startswith("images_")
+    }
+    if placed:
+        methods = ", ".join(f"{n} by {method}" for method, n in sorted(placed.items()))
+        print(f"Placed {sum(placed.values())} images: {methods}")
+    if counts["missing_images"]:
+        print(f"{counts['missing_images']} label files without an image")
+
+    print(f"Total copied files: {counts['remapped_files'] + counts['background_files']}")
+    if args.incremental:
+        print(f"{counts['unchanged_files']} files unchanged, {counts['deleted_files']} deleted")
+    return counts
 
 
 if __name__ == "__main__":
@@ -283,6 +515,31 @@ if __name__ == "__main__":
         required=True,
         help="Path to the directory containing the target dataset.",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of dataset splits rewritten in parallel.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process source files that are new, changed or deleted since the last run.",
+    )
+    parser.add_argument(
+        "--image_store",
+        type=str,
+        default="auto",
+        help="Content-addressed image store to link images from "
+        "('auto': .image_store next to the target, 'none': plain copies).",
+    )
+    parser.add_argument(
+        "--link_mode",
+        choices=LINK_MODES,
+        default="auto",
+        help="Place images from the store as hardlinks, reflinks or copies (auto: first that works).",
+    )
     args = parser.parse_args()
     # List all unique class names
     list_all_class_names(args)
@@ -0,0 +1,227 @@
+"""Audit report of a YOLO dataset.
+
+The labels are loaded in one batched pass through the label index (see
+label_index, refreshed incrementally first), and every check runs on the
+flat box arrays at once:
+
+    classes      boxes and images per class per split, unknown class ids
+    boxes        histograms of box size (sqrt of the area) and aspect ratio
+    coordinates  boxes reaching outside the image, degenerate (empty) boxes
+    duplicates   identical boxes of the same class in the same image
+    files        empty label files, images without a label file (YOLO trains
+                 on them as background, data_unifier writes its background
+                 images that way) and label files without an image
+    malformed    label lines the index could not parse (a bad class id, a
+                 non-numeric or non-finite field, a wrong number of
+                 coordinates), which are left out of every other check
+
+The report is written as JSON, with up to --examples file names per issue:
+
+    python dataset_audit.py -d datasets/unified -o audit.json
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_unifier import SPLITS
+from label_index import LabelIndex
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+SIZE_BINS = [0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, np.inf]
+ASPECT_BINS = [0, 0.125, 0.25, 0.5, 1, 2, 4, 8, np.inf]
+EPSILON = 1e-6  # tolerance on the [0, 1] coordinate range
+
+
+def histogram(values, bins):
+    counts, _ = np.histogram(values, bins=bins)
+    edges = [f"{low:g}-{high:g}" for low, high in zip(bins[:-1], bins[1:])]
+    return dict(zip(edges, counts.tolist()))
+
+
+def examples(files, image_ids, limit):
+    """Split/label name of the first `limit` distinct images."""
+    image_ids = pd.unique(np.asarray(image_ids))[:limit]
+    return [f"{files['Split'].iat[i]}/{files['Name'].iat[i]}" for i in image_ids]
+
+
+def scan_images(dataset_dir):
+    """{split: set of image stems} of every split's images folder."""
+    stems = {}
+    for split in SPLITS:
+        images_dir = os.path.join(dataset_dir, split, "images")
+        if os.path.isdir(images_dir):
+            stems[split] = {
+                os.path.splitext(entry.name)[0]
+                for entry in os.scandir(images_dir)
+                if os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES
+            }
+    return stems
+
+
+def audit(index, limit=20):
+    """
+    Audits an up to date label index.
+
+    Parameters:
+        index (LabelIndex): Index of the dataset.
+        limit (int): Example files listed per issue.
+
+    Returns:
+        dict: The report.
+    """
+    files = index.files
+    classes = np.asarray(index.classes, dtype=np.int64)
+    boxes = np.asarray(index.boxes, dtype=np.float64)
+    owners = index.box_owners()
+    split = files["Split"].to_numpy()
+    names = index.names
+    report = {
+        "dataset": os.path.abspath(index.dataset_dir),
+        "images": len(files),
+        "boxes": len(classes),
+        "names": names,
+    }
+
+    # per class per split
+    box_counts = pd.crosstab(classes, split[owners]) if len(classes) else pd.DataFrame()
+    pairs = pd.DataFrame({"Class": classes, "Image": owners}).drop_duplicates()
+    image_counts = pd.crosstab(pairs["Class"], split[pairs["Image"]]) if len(pairs) else pd.DataFrame()
+
+    def per_split(table):
+        return {
+            names[c] if 0 <= c < len(names) else str(c): {s: int(n) for s, n in row.items()}
+            for c, row in table.iterrows()
+        }
+
+    # negative ids are malformed lines, not in the index
+    unknown = classes >= len(names) if names else np.zeros(len(classes), dtype=bool)
+    report["classes"] = {
+        "boxes": per_split(box_counts),
+        "images": per_split(image_counts),
+        "unknown_class_boxes": int(unknown.sum()),
+        "unknown_class_examples": examples(files, owners[unknown], limit),
+    }
+
+    # box size and aspect distributions
+    x, y, w, h = boxes.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aspect = w / h
+    valid = (w > 0) & (h > 0)
+    report["box_size"] = {
+        "sqrt_area": histogram(np.sqrt(w[valid] * h[valid]), SIZE_BINS),
+        "aspect_w_h": histogram(aspect[valid], ASPECT_BINS),
+        "width_quantiles": np.quantile(w, [0.01, 0.5, 0.99]).tolist() if len(w) else [],
+        "height_quantiles": np.quantile(h, [0.01, 0.5, 0.99]).tolist() if len(h) else [],
+    }
+
+    # coordinates
+    x1, y1, x2, y2 = x - w / 2, y - h / 2, x + w / 2, y + h / 2
+    out_of_range = (
+        (np.minimum(x1, y1) < -EPSILON)
+        | (np.maximum(x2, y2) > 1 + EPSILON)
+        | ~np.isfinite(boxes).all(axis=1)
+    )
+    degenerate = ~valid
+    report["coordinates"] = {
+        "out_of_range_boxes": int(out_of_range.sum()),
+        "out_of_range_examples": examples(files, owners[out_of_range], limit),
+        "degenerate_boxes": int(degenerate.sum()),
+        "degenerate_examples": examples(files, owners[degenerate], limit),
+    }
+
+    # exact duplicates within an image, by hashing the rows
+    table = pd.DataFrame({"Image": owners, "Class": classes, "X": x, "Y": y, "W": w, "H": h})
+    duplicated = table.duplicated().to_numpy()
+    report["duplicates"] = {
+        "duplicate_boxes": int(duplicated.sum()),
+        "images": int(pd.unique(owners[duplicated]).size),
+        "examples": examples(files, owners[duplicated], limit),
+    }
+
+    # label files against image files
+    stems = scan_images(index.dataset_dir)
+    label_stems = {
+        s: {os.path.splitext(name)[0] for name in files["Name"].to_numpy()[split == s]}
+        for s in SPLITS
+    }
+    missing_images = sorted(
+        f"{s}/{stem}" for s in SPLITS for stem in label_stems[s] - stems.get(s, set())
+    )
+    missing_labels = sorted(
+        f"{s}/{stem}" for s in SPLITS for stem in stems.get(s, set()) - label_stems[s]
+    )
+    background = np.diff(np.asarray(index.offsets)) == 0
+    report["files"] = {
+        "background_images": int(background.sum()),
+        "labels_without_image": len(missing_images),
+        "labels_without_image_examples": missing_images[:limit],
+        "images_without_label": len(missing_labels),
+        "images_without_label_examples": missing_labels[:limit],
+    }
+
+    # lines skipped while indexing
+    malformed = files["Malformed"].to_numpy(np.int64)
+    worst = np.argsort(-malformed, kind="stable")[: min(limit, np.count_nonzero(malformed))]
+    report["malformed"] = {
+        "malformed_lines": int(malformed.sum()),
+        "files": int(np.count_nonzero(malformed)),
+        "examples": {
+            f"{files['Split'].iat[i]}/{files['Name'].iat[i]}": int(malformed[i]) for i in worst
+        },
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="dataset_audit",
+        description="Audit the labels and files of a YOLO dataset and write a JSON report.",
+    )
+    parser.add_argument(
+        "--dataset_dir", "-d", type=str, required=True, help="Path to the YOLO dataset."
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, default=None, help="Report path, default <dataset>/audit.json."
+    )
+    parser.add_argument(
+        "--examples", type=int, default=20, help="File names listed per issue."
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=os.cpu_count(), help="Processes parsing label files."
+    )
+    args = parser.parse_args()
+
+    index = LabelIndex(args.dataset_dir)
+    index.refresh(args.workers)
+    report = audit(index, args.examples)
+
+    output = args.output or os.path.join(args.dataset_dir, "audit.json")
+    with open(output, "w") as file:
+        json.dump(report, file, indent=1)
+
+    print(f"{report['images']} images, {report['boxes']} boxes")
+    print(f"{report['classes']['unknown_class_boxes']} boxes with an unknown class")
+    print(
+        f"{report['coordinates']['out_of_range_boxes']} boxes out of range, "
+        f"{report['coordinates']['degenerate_boxes']} degenerate"
+    )
+    print(f"{report['duplicates']['duplicate_boxes']} duplicate boxes in {report['duplicates']['images']} images")
+    print(
+        f"{report['files']['labels_without_image']} labels without image, "
+        f"{report['files']['images_without_label']} images without label, "
+        f"{report['files']['background_images']} background images"
+    )
+    print(
+        f"{report['malformed']['malformed_lines']} malformed label lines skipped "
+        f"in {report['malformed']['files']} files"
+    )
+    print(f"Report: {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
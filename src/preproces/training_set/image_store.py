@@ -0,0 +1,140 @@
+"""Content-addressed image store for building datasets.
+
+Every image is stored once under the hash of its bytes, in
+<store>/objects/<first two hex digits>/<hash><suffix>, and dataset split folders
+are populated with hardlinks (or reflinks) to the stored object instead of
+copies. Dataset variants built from the same sources then share their image
+bytes. Placing is batched and runs on a thread pool.
+
+Link modes:
+    auto     hardlink, else reflink, else copy (e.g. across filesystems)
+    hardlink / reflink / copy   only that method, copy when it is not possible
+
+Hardlinked files share one inode, so they must be treated as read-only.
+
+Garbage collection finds unused objects by their link count, which only works
+while every dataset built from the store is hardlinked: a reflinked or copied
+image does not count as a link. The first placement by another method leaves
+a marker file in the store, after which collect_garbage refuses to run.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import fcntl
+import hashlib
+import os
+import shutil
+
+HASH_CHUNK = 1 << 20
+FICLONE = 0x40049409  # linux/fs.h, _IOW(0x94, 9, int)
+LINK_MODES = ("auto", "hardlink", "reflink", "copy")
+UNTRACKED_MARKER = "untracked_placements"  # images placed other than by hardlink
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src, dest):
+    """Copy-on-write clone of src (btrfs, xfs, ...); raises OSError if unsupported."""
+    with open(src, "rb") as source, open(dest, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dest)
+            raise
+
+
+class ImageStore:
+    def __init__(self, root, mode="auto", workers=16):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {mode!r}, expected one of {LINK_MODES}")
+        self.root = root
+        self.mode = mode
+        self.workers = workers
+        self.untracked = os.path.join(root, UNTRACKED_MARKER)
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    def object_path(self, digest, suffix):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}{suffix.lower()}")
+
+    def add(self, src):
+        """Stores the bytes of src (once) and returns the object's path."""
+        digest = file_digest(src)
+        path = self.object_path(digest, os.path.splitext(src)[1])
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # copied under a unique temporary name, so concurrent adds of the
+            # same bytes cannot leave a partial object behind
+            tmp = f"{path}.{os.getpid()}.{id(src)}.tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+        return path
+
+    def link(self, path, dest):
+        """Places a stored object at dest by the store's link mode; returns the method used."""
+        if self.mode in ("auto", "hardlink"):
+            try:
+                os.link(path, dest)
+                return "hardlink"
+            except OSError:
+                pass
+        if self.mode in ("auto", "reflink"):
+            try:
+                reflink(path, dest)
+                return "reflink"
+            except OSError:
+                pass
+        shutil.copyfile(path, dest)
+        return "copy"
+
+    def place(self, src, dest):
+        if os.path.lexists(dest):
+            os.remove(dest)
+        method = self.link(self.add(src), dest)
+        if method != "hardlink" and not os.path.exists(self.untracked):
+            # the object's link count no longer shows this use
+            with open(self.untracked, "a"):
+                pass
+        return method
+
+    def place_all(self, jobs):
+        """Places every (src, dest) pair on a thread pool; returns {method: count}."""
+        methods = {}
+        if not jobs:
+            return methods
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for method in pool.map(lambda job: self.place(*job), jobs):
+                methods[method] = methods.get(method, 0) + 1
+        return methods
+
+    def collect_garbage(self):
+        """Deletes objects no dataset links to any more.
+
+        Raises RuntimeError when an image was ever placed from the store other
+        than by hardlink, since those uses cannot be seen in the link counts.
+        """
+        if os.path.exists(self.untracked):
+            raise RuntimeError(
+                f"{self.root} has images placed by reflink or copy ({self.untracked}), "
+                "unused objects cannot be told apart; not collecting garbage"
+            )
+        removed = 0
+        for prefix in os.scandir(os.path.join(self.root, "objects")):
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".tmp") or entry.stat().st_nlink == 1:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+
+def copy_all(jobs, workers=16):
+    """Plain parallel copies of (src, dest) pairs, for builds without a store."""
+    if jobs:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda job: shutil.copy(*job), jobs))
+    return {"copy": len(jobs)} if jobs else {}
@@ -1,61 +1,173 @@
 import json
+import os
 from collections import defaultdict
+from pathlib import Path
 
-from ..utils.utils import *
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
 
+try:  # optional, parses the annotation file incrementally
+    import ijson
+except ImportError:
+    ijson = None
 
-def convert_coco_json(json_dir="../coco/annotations/", use_segments=False):
-    """Converts COCO JSON format to YOLO label format, with options for segments and class mapping."""
+CHUNK_SIZE = 100_000  # annotations normalized per batch
+WRITE_BUFFER = 1 << 16
+
+_loaded = {}  # without ijson: the last loaded COCO file, {(path, mtime_ns): data}
+
+
+def load_coco(json_file):
+    """Loads a COCO file with json, reusing the last load of the same unchanged file."""
+    key = (str(Path(json_file).resolve()), os.stat(json_file).st_mtime_ns)
+    if key not in _loaded:
+        _loaded.clear()  # keep a single file in memory
+        with open(json_file) as f:
+            _loaded[key] = json.load(f)
+    return _loaded[key]
+
+
+def release_coco():
+    """Frees the COCO file kept by load_coco."""
+    _loaded.clear()
+
+
+def iter_coco_items(json_file, key):
+    """Yields the items of a top-level list ("images", "annotations") of a COCO file.
+
+    With ijson installed the file is streamed, so only the current item is in
+    memory; otherwise the whole file is loaded with json once and shared by
+    the reads of its images, annotations and categories.
+    """
+    if ijson is not None:
+        with open(json_file, "rb") as f:
+            yield from ijson.items(f, f"{key}.item", use_float=True)
+    else:
+        yield from load_coco(json_file).get(key, [])
+
+
+def read_images(json_file):
+    """Returns (image id -> index, widths, heights, file names) of a COCO file."""
+    index, widths, heights, names = {}, [], [], []
+    for img in iter_coco_items(json_file, "images"):
+        index[img["id"]] = len(names)
+        widths.append(img["width"])
+        heights.append(img["height"])
+        names.append(img["file_name"])
+    return index, np.array(widths, dtype=np.float64), np.array(heights, dtype=np.float64), names
+
+
+def normalize_boxes(image, cls, boxes, crowd, widths, heights):
+    """Converts a batch of COCO boxes (top left x, top left y, w, h) to normalized
+    YOLO boxes (center x, center y, w, h), dropping crowd and empty boxes.
+
+    Returns the image indices, classes and boxes that are kept.
+    """
+    boxes = boxes.copy()
+    boxes[:, :2] += boxes[:, 2:] / 2  # xy top-left corner to center
+    boxes[:, [0, 2]] /= widths[image, None]  # normalize x
+    boxes[:, [1, 3]] /= heights[image, None]  # normalize y
+    keep = ~crowd & (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+    return image[keep], cls[keep], boxes[keep]
+
+
+def read_annotations(json_file, image_index, widths, heights, chunk_size=CHUNK_SIZE):
+    """Streams the annotations in batches of chunk_size and normalizes each batch at once.
+
+    Returns a table of the kept boxes (Image, Class, X, Y, W, H) in file order,
+    and a mask of the images that have any annotation, crowd or not.
+    """
+    annotated = np.zeros(len(widths), dtype=bool)
+    tables = []
+    batch = defaultdict(list)
+
+    def flush():
+        image = np.array(batch["image"], dtype=np.int64)
+        annotated[image] = True
+        image, cls, boxes = normalize_boxes(
+            image,
+            np.array(batch["cls"], dtype=np.int64),
+            np.array(batch["box"], dtype=np.float64).reshape(-1, 4),
+            np.array(batch["crowd"], dtype=bool),
+            widths,
+            heights,
+        )
+        tables.append(
+            pd.DataFrame(
+                {"Image": image, "Class": cls, "X": boxes[:, 0], "Y": boxes[:, 1], "W": boxes[:, 2], "H": boxes[:, 3]}
+            )
+        )
+        batch.clear()
+
+    for ann in iter_coco_items(json_file, "annotations"):
+        batch["image"].append(image_index[ann["image_id"]])
+        batch["cls"].append(ann["category_id"])
+        batch["box"].append(ann["bbox"])
+        batch["crowd"].append(ann.get("iscrowd", 0))
+        if len(batch["image"]) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+
+    columns = ["Image", "Class", "X", "Y", "W", "H"]
+    labels = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=columns)
+    return labels, annotated
+
+
+def write_labels(labels, annotated, names, label_dir):
+    """Writes one label file per annotated image, in order of the image's first annotation.
+
+    Images whose annotations were all dropped get an empty label file.
+    Returns the number of (unique) boxes and of files written.
+    """
+    labels = labels[~labels.duplicated()]  # hashed rows, keeps the first
+    codes, images = pd.factorize(labels["Image"])  # images in order of first appearance
+    rows = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(images))
+    ends = np.cumsum(counts)
+    classes = labels["Class"].to_numpy()[rows]
+    boxes = labels[["X", "Y", "W", "H"]].to_numpy()[rows]
+
+    groups = list(zip(images, ends - counts, ends))
+    labelled = set(images.tolist())
+    groups += [(image, 0, 0) for image in np.flatnonzero(annotated) if image not in labelled]
+
+    for image, start, end in tqdm(groups, desc="Writing labels"):
+        lines = "".join(
+            "%g %g %g %g %g\n" % (cls, *box) for cls, box in zip(classes[start:end], boxes[start:end])
+        )
+        path = (label_dir / names[image]).with_suffix(".txt")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", buffering=WRITE_BUFFER) as file:
+            file.write(lines)
+    return len(labels), len(groups)
+
+
+def convert_coco_json(json_dir="../coco/annotations/", use_segments=False, chunk_size=CHUNK_SIZE):
+    """Converts COCO JSON format to YOLO label format, with options for segments and class mapping.
+
+    The annotations are streamed (with ijson) and normalized in batches of
+    chunk_size, so only the boxes themselves are kept in memory, not the
+    segmentations or the rest of the JSON. Label files are overwritten, so a
+    re-run does not append duplicate lines.
+    """
     save_dir = json_dir.replace("annotations/", "")
     json_dir = Path(json_dir)
     if not json_dir.is_absolute():
         json_dir = Path(__file__).resolve().parent.parent / json_dir
+    if ijson is None:
+        print("ijson is not installed, each annotation file is loaded into memory at once")
 
-    # Import json
     for json_file in sorted(Path(json_dir).resolve().glob("*.json")):
         fn = Path(save_dir) / "labels"  # folder name
         fn.mkdir(parents=True, exist_ok=True)
-        with open(json_file) as f:
-            data = json.load(f)
-
-        # Create image dict
-        images = {"{:g}".format(x["id"]): x for x in data["images"]}
-        # Create image-annotations dict
-        imgToAnns = defaultdict(list)
-        for ann in data["annotations"]:
-            imgToAnns[ann["image_id"]].append(ann)
-
-        # Write labels file
-        for img_id, anns in tqdm(imgToAnns.items(), desc=f"Annotations {json_file}"):
-            img = images[f"{img_id:g}"]
-            h, w, f = img["height"], img["width"], img["file_name"]
-
-            bboxes = []
-            segments = []
-            for ann in anns:
-                if ann["iscrowd"]:
-                    continue
-                # The COCO box format is [top left x, top left y, width, height]
-                box = np.array(ann["bbox"], dtype=np.float64)
-                box[:2] += box[2:] / 2  # xy top-left corner to center
-                box[[0, 2]] /= w  # normalize x
-                box[[1, 3]] /= h  # normalize y
-                if box[2] <= 0 or box[3] <= 0:  # if w <= 0 and h <= 0
-                    continue
-
-                cls = ann["category_id"]
-
-                box = [cls] + box.tolist()
-                if box not in bboxes:
-                    bboxes.append(box)
-
-            # Write
-            with open((fn / f).with_suffix(".txt"), "a") as file:
-                print(fn, f)
-                for i in range(len(bboxes)):
-                    # cls, box or segments
-                    line = (*(bboxes[i]),)
-                    file.write(("%g " * len(line)).rstrip() % line + "\n")
+
+        image_index, widths, heights, names = read_images(json_file)
+        labels, annotated = read_annotations(json_file, image_index, widths, heights, chunk_size)
+        boxes, written = write_labels(labels, annotated, names, fn)
+        print(f"{json_file.name}: {boxes} boxes, {written} label files in {fn}")
+        release_coco()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+"""Memory-mapped binary index of the labels of a YOLO dataset.
+
+All <split>/labels/*.txt files of a dataset are compiled once into
+<dataset>/.label_index:
+
+    boxes.npy          (n, 4) float32 normalized center boxes
+    classes.npy        (n,) int16 class id per box
+    offsets.npy        (images + 1,) int64, the boxes of image i are offsets[i]:offsets[i + 1]
+    class_offsets.npy  (classes + 1,) int64 and
+    class_images.npy   image ids per class, an inverted index: the images that
+                       contain class c are class_images[class_offsets[c]:class_offsets[c + 1]]
+    files.json         class names and per image its split, label name, source
+                       dataset, size, mtime and number of malformed lines
+
+The arrays are opened memory-mapped, so questions such as "which images
+contain glass" or "boxes per class per split" are answered without touching
+the label files. refresh() re-parses only label files whose size or mtime
+changed since the last build and reuses the rows of the others. Malformed
+label lines (see adapters.parse_label_line) are left out of the index and
+counted per file.
+
+The source dataset of a file is taken from data_unifier's manifest when the
+dataset has one.
+
+    python label_index.py -d datasets/unified refresh
+    python label_index.py -d datasets/unified stats
+    python label_index.py -d datasets/unified images glass --split valid
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from adapters import parse_label_files
+from data_unifier import MANIFEST_NAME, SPLITS, read_class_names
+
+INDEX_DIR = ".label_index"
+INDEX_VERSION = 2
+FILE_COLUMNS = ["Split", "Name", "Source", "Size", "MtimeNs", "Malformed"]
+ARRAYS = ("boxes", "classes", "offsets", "class_offsets", "class_images")
+
+
+def scan_labels(dataset_dir):
+    """(split, label name, size, mtime_ns, path) of every label file, sorted."""
+    files = []
+    for split in SPLITS:
+        labels_dir = os.path.join(dataset_dir, split, "labels")
+        if not os.path.isdir(labels_dir):
+            continue
+        for entry in os.scandir(labels_dir):
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                files.append((split, entry.name, stat.st_size, stat.st_mtime_ns, entry.path))
+    return sorted(files)
+
+
+def read_sources(dataset_dir):
+    """{(split, label name): source dataset} from data_unifier's manifest, if any."""
+    manifest_path = os.path.join(dataset_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    sources = {}
+    for key, entry in manifest.items():
+        dataset, split = key.rsplit("/", 1)
+        for name, record in entry["files"].items():
+            if record["outputs"][0]:
+                sources[(split, name)] = dataset
+    return sources
+
+
+def _parse_task(paths):
+    return parse_label_files(paths)
+
+
+def parse_parallel(paths, workers):
+    """parse_label_files over chunks of paths on a process pool, owners relative to paths."""
+    if workers <= 1 or len(paths) < 1000:
+        return parse_label_files(paths)
+    chunks = np.array_split(np.arange(len(paths)), workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_parse_task, [[paths[i] for i in chunk] for chunk in chunks]))
+    owners = [result[0] + chunk[0] for chunk, result in zip(chunks, results) if len(chunk)]
+    return (
+        np.concatenate(owners) if owners else np.empty(0, dtype=np.int64),
+        np.concatenate([result[1] for result in results]),
+        np.concatenate([result[2] for result in results]).reshape(-1, 4),
+        np.concatenate([result[3] for result in results]),
+    )
+
+
+def save_array(index_dir, name, array):
+    tmp = os.path.join(index_dir, f".{name}.tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(index_dir, f"{name}.npy"))
+
+
+class LabelIndex:
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+        self.index_dir = os.path.join(dataset_dir, INDEX_DIR)
+        self.load()
+
+    @property
+    def exists(self):
+        """Whether an index of the current version was built, else refresh rebuilds it."""
+        return self.version == INDEX_VERSION
+
+    def load(self):
+        meta = {}
+        meta_path = os.path.join(self.index_dir, "files.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as file:
+                meta = json.load(file)
+        self.version = meta.get("version")
+        if not self.exists:
+            self.names, self.files = [], pd.DataFrame(columns=FILE_COLUMNS)
+            self.boxes = np.empty((0, 4), dtype=np.float32)
+            self.classes = np.empty(0, dtype=np.int16)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.class_offsets = np.zeros(1, dtype=np.int64)
+            self.class_images = np.empty(0, dtype=np.int64)
+            return
+        self.names = meta["names"]
+        self.files = pd.DataFrame(meta["files"], columns=FILE_COLUMNS)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode="r"))
+
+    def refresh(self, workers=os.cpu_count()):
+        """
+        Brings the index up to date with the label files.
+
+        Returns:
+            Counter: Label files parsed, unchanged and removed, and malformed
+                lines left out of the index.
+        """
+        scanned = scan_labels(self.dataset_dir)
+        names = read_class_names(self.dataset_dir)
+        sources = read_sources(self.dataset_dir)
+        counts = Counter()
+
+        previous = {
+            (split, name): (i, size, mtime)
+            for i, (split, name, size, mtime) in enumerate(
+                self.files[["Split", "Name", "Size", "MtimeNs"]].itertuples(index=False)
+            )
+        }
+        reused, changed = [], []
+        for position, (split, name, size, mtime, path) in enumerate(scanned):
+            old = previous.get((split, name))
+            if old and old[1] == size and old[2] == mtime:
+                reused.append((position, old[0]))
+            else:
+                changed.append(position)
+        counts["unchanged_files"] = len(reused)
+        counts["parsed_files"] = len(changed)
+        current = {(split, name) for split, name, *_ in scanned}
+        counts["removed_files"] = sum(key not in current for key in previous)
+
+        # rows of unchanged files are copied from the old index, the others parsed
+        old_counts = np.diff(np.asarray(self.offsets))
+        owner_parts, class_parts, box_parts = [], [], []
+        malformed = np.zeros(len(scanned), dtype=np.int64)
+        if reused:
+            positions, old_ids = np.array(reused, dtype=np.int64).T
+            malformed[positions] = self.files["Malformed"].to_numpy(np.int64)[old_ids]
+            starts = np.asarray(self.offsets)[old_ids]
+            lengths = old_counts[old_ids]
+            rows = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            owner_parts.append(np.repeat(positions, lengths))
+            class_parts.append(np.asarray(self.classes)[rows].astype(np.int64))
+            box_parts.append(np.asarray(self.boxes)[rows].astype(np.float64))
+        if changed:
+            owners, cls, boxes, bad = parse_parallel([scanned[i][4] for i in changed], workers)
+            malformed[changed] = bad
+            owner_parts.append(np.asarray(changed, dtype=np.int64)[owners])
+            class_parts.append(cls)
+            box_parts.append(boxes)
+
+        owners = np.concatenate(owner_parts) if owner_parts else np.empty(0, dtype=np.int64)
+        order = np.argsort(owners, kind="stable")
+        owners = owners[order]
+        classes = (np.concatenate(class_parts) if class_parts else np.empty(0, dtype=np.int64))[order]
+        boxes = (np.concatenate(box_parts) if box_parts else np.empty((0, 4)))[order]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(owners, minlength=len(scanned)))])
+
+        # inverted index: unique (class, image) pairs sorted by class
+        n_classes = max(len(names), int(classes.max()) + 1 if len(classes) else 0)
+        pairs = np.unique(classes * len(scanned) + owners) if len(scanned) else np.empty(0, dtype=np.int64)
+        pair_classes = pairs // max(len(scanned), 1)
+        class_images = pairs % max(len(scanned), 1)
+        class_offsets = np.concatenate([[0], np.cumsum(np.bincount(pair_classes, minlength=n_classes))])
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        save_array(self.index_dir, "boxes", boxes.astype(np.float32))
+        save_array(self.index_dir, "classes", classes.astype(np.int16))
+        save_array(self.index_dir, "offsets", offsets.astype(np.int64))
+        save_array(self.index_dir, "class_offsets", class_offsets.astype(np.int64))
+        save_array(self.index_dir, "class_images", class_images.astype(np.int64))
+        meta = {
+            "version": INDEX_VERSION,
+            "names": names,
+            "files": [
+                [split, name, sources.get((split, name), ""), size, mtime, int(bad)]
+                for (split, name, size, mtime, _), bad in zip(scanned, malformed)
+            ],
+        }
+        tmp = os.path.join(self.index_dir, ".files.json.tmp")
+        with open(tmp, "w") as file:
+            json.dump(meta, file)
+        os.replace(tmp, os.path.join(self.index_dir, "files.json"))
+
+        counts["malformed_lines"] = int(malformed.sum())
+        self.load()
+        return counts
+
+    def class_id(self, cls):
+        """Class id of a class name or id."""
+        if isinstance(cls, str) and not cls.isdigit():
+            return self.names.index(cls)
+        return int(cls)
+
+    def image_ids(self, cls=None, split=None):
+        """Ids of the images that contain a class (any image if None), optionally in one split."""
+        if cls is None:
+            ids = np.arange(len(self.files))
+        else:
+            cls = self.class_id(cls)
+            if cls + 1 >= len(self.class_offsets):
+                return np.empty(0, dtype=np.int64)
+            ids = np.asarray(self.class_images[self.class_offsets[cls]:self.class_offsets[cls + 1]])
+        if split is not None:
+            ids = ids[self.files["Split"].to_numpy()[ids] == split]
+        return ids
+
+    def images(self, cls=None, split=None):
+        """Split, label name and source of the images that contain a class."""
+        return self.files.iloc[self.image_ids(cls, split)][["Split", "Name", "Source"]]
+
+    def labels(self, image_id):
+        """(classes, boxes) of one image."""
+        start, end = self.offsets[image_id], self.offsets[image_id + 1]
+        return np.asarray(self.classes[start:end]), np.asarray(self.boxes[start:end])
+
+    def box_owners(self):
+        """Image id of every box."""
+        return np.repeat(np.arange(len(self.files)), np.diff(np.asarray(self.offsets)))
+
+    def class_counts(self, by="Split"):
+        """Boxes per class and per value of a files column (Split or Source)."""
+        column = self.files[by].to_numpy()[self.box_owners()]
+        counts = pd.crosstab(np.asarray(self.classes), column).rename_axis(index="Class", columns=by)
+        if self.names:
+            counts.index = [self.names[i] if i < len(self.names) else str(i) for i in counts.index]
+        return counts
+
+    def image_counts(self, by="Source"):
+        """Label files per value of a files column (Split or Source)."""
+        return self.files.groupby(by).size()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="label_index",
+        description="Compile the labels of a YOLO dataset into a memory-mapped index and query it.",
+    )
+    parser.add_argument(
+        "--dataset_dir", "-d", type=str, required=True, help="Path to the YOLO dataset."
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=os.cpu_count(), help="Processes parsing label files."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refresh", help="Build the index or update it with changed label files.")
+    stats = commands.add_parser("stats", help="Boxes per class per split and files per source.")
+    stats.add_argument("--by", choices=("Split", "Source"), default="Split")
+    images = commands.add_parser("images", help="List the images that contain a class.")
+    images.add_argument("cls", type=str, help="Class name or id.")
+    images.add_argument("--split", choices=SPLITS, default=None)
+    args = parser.parse_args()
+
+    index = LabelIndex(args.dataset_dir)
+    if args.command == "refresh" or not index.exists:
+        counts = index.refresh(args.workers)
+        print(
+            f"Indexed {len(index.files)} label files, {len(index.classes)} boxes: "
+            f"{counts['parsed_files']} parsed, {counts['unchanged_files']} unchanged, "
+            f"{counts['removed_files']} removed"
+        )
+        if counts["malformed_lines"]:
+            print(
+                f"Skipped {counts['malformed_lines']} malformed label lines in "
+                f"{np.count_nonzero(index.files['Malformed'])} files"
+            )
+    if args.command == "stats":
+        print(index.class_counts(args.by).to_string())
+        print(index.image_counts("Split").to_string())
+        if index.files["Source"].any():
+            print(index.image_counts("Source").to_string())
+    elif args.command == "images":
+        selected = index.images(args.cls, args.split)
+        for split, name in zip(selected["Split"], selected["Name"]):
+            print(os.path.join(split, "labels", name))
+        print(f"{len(selected)} images")
+
+
+if __name__ == "__main__":
+    main()
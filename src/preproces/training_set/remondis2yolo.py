@@ -2,17 +2,74 @@ from PIL import Image
 import os
 import yaml
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def xyxy_to_xywhn(boxes, image_width, image_height):
+    """
+    Converts [left top right bottom] pixel boxes to [center_x center_y width height]
+    normalized by the image size, all at once.
+
+    Parameters:
+        boxes (np.ndarray): (n, 4) boxes in pixels.
+
+    Returns:
+        np.ndarray: (n, 4) normalized boxes.
+    """
+    xywh = np.empty_like(boxes)
+    xywh[:, :2] = (boxes[:, :2] + boxes[:, 2:]) / 2
+    xywh[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    xywh /= [image_width, image_height, image_width, image_height]
+    return xywh
+
+
+def convert_label_file(label_path, image_path, target_file_path):
+    """
+    Converts one Remondis label file; every line becomes a class 0 YOLO box.
+
+    Returns:
+        int: Number of boxes written, or -1 if the image is missing.
+    """
+    if not os.path.getsize(label_path):
+        return 0
+    # columns 4:8 hold the box as [<left> <top> <right> <bottom>]
+    boxes = np.loadtxt(label_path, usecols=(4, 5, 6, 7), ndmin=2, dtype=np.float64)
+    if not len(boxes):
+        return 0
+
+    # only the header is read to get the image size
+    try:
+        with Image.open(image_path) as image:
+            image_width, image_height = image.size
+    except FileNotFoundError:
+        return -1
+
+    xywh = xyxy_to_xywhn(boxes, image_width, image_height)
+    classId = 0
+    # round to 3 decimal places when formatting; Python's round is exact where
+    # numpy's round can differ on the last digit
+    with open(target_file_path, "w") as target_file:
+        target_file.writelines(
+            f"{classId} {' '.join(str(round(v, 3)) for v in row)}\n" for row in xywh.tolist()
+        )
+    return len(xywh)
+
+
+def _convert_label_file_task(task):
+    return convert_label_file(*task)
 
 
 def list_all_class_names(args):
     """
-    Lists all unique class names from the data.yaml files in the given datasets directory.
+    Converts the Remondis datasets in the given datasets directory to YOLO labels.
 
     Parameters:
-        datasets_dir (str): Path to the directory containing the datasets.
+        args: source_datasets_dir, target_dataset_dir and workers.
 
     Returns:
-        set: A set of all unique class names.
+        dict: Files converted, boxes written and images missing per dataset.
     """
     datasets_dir = args.source_datasets_dir
     target_dataset_dir = args.target_dataset_dir
@@ -28,67 +85,47 @@ def list_all_class_names(args):
         "trash facemask clustered cigarette litter straw bag": 6,
     }
 
-    from_old_to_new_id_mapping = {}
-
-    for dataset_folder in os.listdir(datasets_dir):
-        print(dataset_folder)
+    # every label file of every dataset is one task for the process pool
+    tasks, owners = [], []
+    for dataset_folder in sorted(os.listdir(datasets_dir)):
         dataset_path = os.path.join(datasets_dir, dataset_folder)
-        from_old_to_new_id_mapping[dataset_path] = {}
-        if os.path.isdir(dataset_path):
-            # open the labels folder
-            labels_path = os.path.join(dataset_path, "labels")
-            target_labels_path = os.path.join(
-                target_dataset_dir, dataset_folder, "labels"
-            )
-            print(labels_path)
-            if os.path.exists(labels_path):
-                for file_name in os.listdir(labels_path):
-                    with open(os.path.join(labels_path, file_name), "r") as file:
-                        lines = file.readlines()
-                        if lines:
-                            # create file to write remapped labels
-                            target_file_path = os.path.join(
-                                target_labels_path, file_name
-                            )
-                            with open(target_file_path, "w") as target_file:
-                                classId = 0
-                                for line in lines:
-                                    bboxes = line.split()[4:8]
-
-                                    # bboxes represent [<left> <top> <right> <bottom>]
-                                    # make bounding boxes to be [center_x center_y width height] format normalized by the images size
-
-                                    center_x = (float(bboxes[0]) + float(bboxes[2])) / 2
-                                    center_y = (float(bboxes[1]) + float(bboxes[3])) / 2
-                                    width = float(bboxes[2]) - float(bboxes[0])
-                                    height = float(bboxes[3]) - float(bboxes[1])
-
-                                    # get image size from the image file
-                                    image_path = os.path.join(
-                                        labels_path, file_name.replace("txt", "jpg")
-                                    )
-                                    image_path = image_path.replace("labels", "images")
-
-                                    # get image size from image file
-
-                                    image = Image.open(image_path)
-                                    image_size = image.size
-
-                                    print(image_size)
-                                    # normalize the bounding boxes round to 3 decimal places
-                                    center_x = round(center_x / image_size[0], 3)
-                                    center_y = round(center_y / image_size[1], 3)
-                                    width = round(width / image_size[0], 3)
-                                    height = round(height / image_size[1], 3)
-
-                                    bboxes = [
-                                        str(center_x),
-                                        str(center_y),
-                                        str(width),
-                                        str(height),
-                                    ]
-
-                                    target_file.write(f"{classId} {' '.join(bboxes)}\n")
+        labels_path = os.path.join(dataset_path, "labels")
+        if not os.path.isdir(labels_path):
+            continue
+        images_path = os.path.join(dataset_path, "images")
+        target_labels_path = os.path.join(target_dataset_dir, dataset_folder, "labels")
+        os.makedirs(target_labels_path, exist_ok=True)
+
+        for entry in os.scandir(labels_path):
+            if entry.is_file():
+                tasks.append(
+                    (
+                        entry.path,
+                        os.path.join(images_path, entry.name.replace("txt", "jpg")),
+                        os.path.join(target_labels_path, entry.name),
+                    )
+                )
+                owners.append(dataset_folder)
+
+    if args.workers <= 1:
+        results = list(map(_convert_label_file_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(_convert_label_file_task, tasks, chunksize=64))
+
+    summary = {}
+    for dataset_folder, boxes in zip(owners, results):
+        counts = summary.setdefault(dataset_folder, {"files": 0, "boxes": 0, "missing_images": 0})
+        if boxes < 0:
+            counts["missing_images"] += 1
+        elif boxes:
+            counts["files"] += 1
+            counts["boxes"] += boxes
+    for dataset_folder, counts in summary.items():
+        print(
+            f"{dataset_folder}: {counts['files']} files, {counts['boxes']} boxes, "
+            f"{counts['missing_images']} missing images"
+        )
 
     # save the unique class names to a data.yaml
     with open(os.path.join(target_dataset_dir, "data.yaml"), "w") as file:
@@ -103,6 +140,8 @@ def list_all_class_names(args):
             file,
         )
 
+    return summary
+
 
 if __name__ == "__main__":
     # Retrieve dataset path from argparser
@@ -127,6 +166,13 @@ if __name__ == "__main__":
         required=True,
         help="Path to the directory containing the target dataset.",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of label files converted in parallel.",
+    )
     args = parser.parse_args()
     # List all unique class names
     list_all_class_names(args)
@@ -0,0 +1,118 @@
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from extract_gps import parse_dji_srt, srt_time_to_seconds
+
+
+# =========================================================
+# SYNTHETIC DJI SRT
+# One cue per video frame, like the DJI Mini 3 writes them.
+# =========================================================
+def format_srt_time(t: float) -> str:
+    ms = int(round(t * 1000))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def write_synthetic_srt(path: Path, hours: float, fps: float = 30.0, bracketed: bool = False):
+    n = int(hours * 3600 * fps)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            start, end = i / fps, (i + 1) / fps
+            lat = 52.37 + i * 1e-7
+            lon = 4.89 + i * 1e-7
+            f.write(f"{i + 1}\n{format_srt_time(start)} --> {format_srt_time(end)}\n")
+            if bracketed:
+                f.write(
+                    f"<font size=\"28\">FrameCnt: {i + 1}, DiffTime: 33ms\n"
+                    f"[iso: 100] [shutter: 1/1000.0] [fnum: 1.7] [ev: 0] [focal_len: 24.00] "
+                    f"[latitude: {lat:.6f}] [longitude: {lon:.6f}] "
+                    f"[rel_alt: 10.200 abs_alt: 50.100] [ct: 5500] </font>\n\n"
+                )
+            else:
+                f.write(
+                    f"F/2.8, SS 1000, ISO 100, EV 0, DZOOM 1.000, "
+                    f"GPS ({lon:.6f}, {lat:.6f}, 19), D 24.56m, H 10.20m, "
+                    f"H.S 3.20m/s, V.S 0.00m/s\n\n"
+                )
+    return n
+
+
+# =========================================================
+# PREVIOUS PARSER (line list + three regexes + list of dicts)
+# =========================================================
+def parse_dji_srt_legacy(srt_path: Path) -> pd.DataFrame:
+    rows = []
+    lines = srt_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+
+    gps_pattern = re.compile(
+        r"GPS\s*\(\s*([-0-9.]+)\s*,\s*([-0-9.]+)\s*,\s*([-0-9.]+)\s*\)",
+        re.IGNORECASE,
+    )
+    hs_pattern = re.compile(r"H\.S\s*([-0-9.]+)", re.IGNORECASE)
+    vs_pattern = re.compile(r"V\.S\s*([-0-9.]+)", re.IGNORECASE)
+
+    for i, line in enumerate(lines):
+        if "-->" in line and i + 1 < len(lines):
+            t = srt_time_to_seconds(line.split(" --> ")[0].strip())
+            text = lines[i + 1]
+            gps_match = gps_pattern.search(text)
+            if gps_match:
+                lon, lat, alt = map(float, gps_match.groups())
+                m_hs = hs_pattern.search(text)
+                m_vs = vs_pattern.search(text)
+                rows.append({
+                    "SampleTime": t,
+                    "GPSLatitude": lat,
+                    "GPSLongitude": lon,
+                    "GPSAltitude": alt,
+                    "HorizontalSpeed": float(m_hs.group(1)) if m_hs else None,
+                    "VerticalSpeed": float(m_vs.group(1)) if m_vs else None,
+                })
+
+    return pd.DataFrame(rows)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+# =========================================================
+# ENTRYPOINT
+# =========================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the DJI SRT parser on synthetic multi-hour logs"
+    )
+    parser.add_argument("--hours", type=float, default=3.0, help="Flight length per log.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Cues per second.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for bracketed in (False, True):
+            srt = Path(tmp) / f"bench_{int(bracketed)}.srt"
+            n = write_synthetic_srt(srt, args.hours, args.fps, bracketed=bracketed)
+            size_mb = srt.stat().st_size / 1e6
+            label = "bracketed" if bracketed else "mini 3"
+            print(f"{label}: {n} cues, {size_mb:.1f} MB")
+
+            if not bracketed:
+                legacy, dt = timed(parse_dji_srt_legacy, srt)
+                print(f"  legacy parser   {dt:7.2f} s  {len(legacy) / dt:12,.0f} cues/s")
+
+            parsed, dt = timed(parse_dji_srt, srt)
+            print(f"  streaming file  {dt:7.2f} s  {len(parsed) / dt:12,.0f} cues/s")
+
+            data = srt.read_bytes()
+            parsed, dt = timed(parse_dji_srt, data)
+            print(f"  streaming bytes {dt:7.2f} s  {len(parsed) / dt:12,.0f} cues/s")
@@ -0,0 +1,358 @@
+"""Frame extraction from DJI videos into labeling candidates.
+
+Frames are sampled from every video by time (one per N seconds), by frame
+stride, or by ground distance travelled (one per N metres of the flight track
+from the video's DJI SRT telemetry, see extract_gps). Only the sampled frames
+are decoded: short gaps are skipped with grab(), long gaps are crossed by
+seeking, which decodes from the preceding keyframe only. With --keyframes the
+samples are snapped to keyframes themselves, so a seek decodes one frame.
+
+Near-identical consecutive samples (hovering, waiting on the ground) are
+dropped by comparing 64-bit difference hashes (dHash) of the frames.
+
+Frames are written as <output>/images/<video stem>_<frame index>.jpg, the
+layout utils.make_dirs creates (the empty labels/ folder is there for the
+annotations), and frames.csv lists every frame with its time and GPS
+position. The <video stem>_<frame> names group by video for
+utils.splitting. Videos run in a process pool. Run from this folder, like
+extract_gps:
+
+    python extract_frames.py -i <dji folder> -o <output> --every 25 --by distance
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import os
+import subprocess
+
+import cv2
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# extract_gps also makes the src folder importable for the shared utils
+from extract_gps import (
+    extract_embedded_srt,
+    extract_frame_times,
+    interpolate_gps,
+    parse_dji_srt,
+)
+from utils.utils import make_dirs, vid_formats
+from utils.video_catalog import DEFAULT_CATALOG, VideoCatalog
+
+EARTH_RADIUS = 6_371_000.0
+SAMPLING_MODES = ("time", "stride", "distance")
+SEEK_GAP = 48  # frames; larger gaps are crossed by seeking instead of grabbing
+
+
+# =========================================================
+# SAMPLING
+# Target frame indices are computed from the frames' presentation times (see
+# extract_gps.extract_frame_times, exact for variable-frame-rate clips) and the
+# GPS track for distance sampling, before any frame is decoded.
+# =========================================================
+def track_distance(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Cumulative ground distance in metres along a track of positions."""
+    lat0 = np.radians(np.nanmean(lat))
+    x = EARTH_RADIUS * np.radians(lon) * np.cos(lat0)
+    y = EARTH_RADIUS * np.radians(lat)
+    steps = np.hypot(np.diff(x), np.diff(y))
+    return np.concatenate([[0.0], np.cumsum(np.nan_to_num(steps))])
+
+
+def load_track(video: Path, subtitle_stream: int = 2) -> pd.DataFrame:
+    srt = video.with_suffix(".srt")
+    if not srt.exists():
+        tmp_srt = srt.with_name(f".{srt.name}.tmp.srt")
+        extract_embedded_srt(video, tmp_srt, subtitle_stream)
+        tmp_srt.replace(srt)
+    return parse_dji_srt(srt)
+
+
+def sample_frames(times: np.ndarray, by: str, every: float, gps: pd.DataFrame = None) -> np.ndarray:
+    """Sorted, unique indices of the frames to extract, given every frame's time."""
+    frame_count = len(times)
+    if by == "stride":
+        return np.arange(0, frame_count, max(1, int(every)), dtype=np.int64)
+
+    if by == "time":
+        if not frame_count:
+            return np.empty(0, dtype=np.int64)
+        # the frame nearest to every multiple of `every` seconds
+        targets = np.arange(times[0], times[-1] + 1e-9, every)
+        right = np.searchsorted(times, targets).clip(max=frame_count - 1)
+        left = (right - 1).clip(min=0)
+        return np.unique(np.where(targets - times[left] <= times[right] - targets, left, right))
+
+    # distance: the first frame, then every frame where the track passes a multiple of `every`
+    track = interpolate_gps(gps, {"FrameTime": times}, extrapolate="clamp")
+    distance = track_distance(track["GPSLatitude"], track["GPSLongitude"])
+    marks = np.arange(0, distance[-1] + 1e-9, every) if frame_count else np.empty(0)
+    return np.unique(np.searchsorted(distance, marks).clip(0, max(frame_count - 1, 0)))
+
+
+def keyframe_indices(video: Path):
+    """Indices of the keyframes from the container's packet flags (ffprobe), or None."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        str(video),
+    ]
+    try:
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    packets = [line.split(",") for line in out.split() if line and not line.startswith("N/A")]
+    if not packets:
+        return None
+    times = np.array([float(pts) for pts, _ in packets])
+    keyframe = np.array(["K" in flags for _, flags in packets])
+    # packets are in decode order, presentation order is sorted by time
+    order = np.argsort(times, kind="stable")
+    return np.flatnonzero(keyframe[order])
+
+
+def snap_to_keyframes(targets: np.ndarray, keyframes: np.ndarray) -> np.ndarray:
+    """Moves every target to its nearest keyframe (unique, sorted)."""
+    if keyframes is None or not len(keyframes) or not len(targets):
+        return targets
+    i = np.clip(np.searchsorted(keyframes, targets), 1, len(keyframes) - 1)
+    left, right = keyframes[i - 1], keyframes[i]
+    return np.unique(np.where(targets - left <= right - targets, left, right))
+
+
+# =========================================================
+# DECODING
+# =========================================================
+def iter_sampled_frames(video: Path, targets: np.ndarray, seek_gap: int = SEEK_GAP):
+    """Yields (frame index, BGR frame) of the target frames only, in order."""
+    cap = cv2.VideoCapture(str(video))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open {video}")
+    position = 0  # index of the next frame read() returns
+    try:
+        for target in targets:
+            if target - position > seek_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(target))
+                position = int(target)
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+            ret, frame = cap.read()
+            if not ret:
+                return
+            position += 1
+            yield int(target), frame
+    finally:
+        cap.release()
+
+
+def dhash(frame: np.ndarray) -> int:
+    """64-bit difference hash: signs of horizontal gradients of a 9x8 grey thumbnail."""
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def extract_video(
+    video: Path,
+    images_dir: Path,
+    record: dict,
+    by: str = "time",
+    every: float = 1.0,
+    frame_times: str = "packets",
+    keyframes: bool = False,
+    max_distance: int = 4,
+    quality: int = 95,
+    seek_gap: int = SEEK_GAP,
+) -> pd.DataFrame:
+    """
+    Extracts the sampled frames of one video into images_dir.
+
+    Parameters:
+        record (dict): The video's catalog record (fps, frame_count, subtitle_stream).
+        frame_times (str): How frame times are read, see extract_gps.extract_frame_times.
+        max_distance (int): Frames whose dHash differs from the last written
+            frame in at most this many bits are dropped; negative keeps all.
+
+    Returns:
+        pd.DataFrame: Per written frame its image name, index, time and GPS position.
+    """
+    times = extract_frame_times(video, method=frame_times)["FrameTime"]
+    stream = 2 if record["subtitle_stream"] is None else record["subtitle_stream"]
+    gps = None
+    srt = video.with_suffix(".srt")
+    if by == "distance" or srt.exists() or record["subtitle_stream"] is not None:
+        try:
+            gps = load_track(video, stream)
+        except (OSError, subprocess.CalledProcessError, RuntimeError):
+            if by == "distance":
+                raise
+    targets = sample_frames(times, by, every, gps)
+    if keyframes:
+        targets = snap_to_keyframes(targets, keyframe_indices(video))
+
+    rows = []
+    last_hash = None
+    for index, frame in iter_sampled_frames(video, targets, seek_gap):
+        frame_hash = dhash(frame)
+        if last_hash is not None and bin(frame_hash ^ last_hash).count("1") <= max_distance:
+            continue
+        last_hash = frame_hash
+        name = f"{video.stem}_{index:06d}.jpg"
+        cv2.imwrite(str(images_dir / name), frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        rows.append((name, video.name, index, times[index]))
+
+    frames = pd.DataFrame(rows, columns=["Image", "SourceFile", "FrameIndex", "FrameTime"])
+    if gps is not None and len(frames):
+        frames = interpolate_gps(gps, frames, extrapolate="clamp")
+    frames.attrs["sampled"] = len(targets)
+    return frames
+
+
+def _extract_video_isolated(video: Path, images_dir: Path, record: dict, options: dict):
+    """Runs extract_video in a worker and returns (frames, sampled, error) instead of raising."""
+    cv2.setNumThreads(1)  # the pool already runs a video per core
+    try:
+        frames = extract_video(video, images_dir, record, **options)
+    except Exception as e:
+        return None, 0, f"{type(e).__name__}: {e}"
+    return frames, frames.attrs["sampled"], None
+
+
+# =========================================================
+# PROCESS FOLDER
+# =========================================================
+def process_folder(
+    input_folder: Path,
+    output_folder: Path,
+    workers: int = 1,
+    overwrite: bool = False,
+    catalog_path: Path = None,
+    **options,
+):
+    videos = sorted(
+        video for video in input_folder.rglob("*") if video.suffix.lower()[1:] in vid_formats
+    )
+    if not videos:
+        raise RuntimeError(f"No videos found in {input_folder}")
+
+    if overwrite or not (output_folder / "images").exists():
+        make_dirs(output_folder)
+    images_dir = output_folder / "images"
+
+    with VideoCatalog(catalog_path or DEFAULT_CATALOG) as catalog:
+        records = catalog.scan(videos)
+    failures = {video: "unreadable video" for video, record in records.items() if record is None}
+    runnable = [video for video in videos if records[video] and records[video]["fps"]]
+
+    results, sampled = [], 0
+    with tqdm(total=len(runnable), desc="Videos", unit="video") as progress:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(_extract_video_isolated, video, images_dir, records[video], options): video
+                for video in runnable
+            }
+            for future in as_completed(futures):
+                video = futures[future]
+                frames, n, error = future.result()
+                if error:
+                    failures[video] = error
+                    progress.write(f"✗ {video.name}: {error}")
+                else:
+                    results.append(frames)
+                    sampled += n
+                progress.update()
+
+    frames = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    index_path = output_folder / "frames.csv"
+    if len(frames):
+        if index_path.exists() and not overwrite:
+            previous = pd.read_csv(index_path)
+            frames = pd.concat(
+                [previous[~previous["Image"].isin(frames["Image"])], frames], ignore_index=True
+            )
+        frames.sort_values(["SourceFile", "FrameIndex"]).to_csv(index_path, index=False)
+
+    written = sum(len(f) for f in results)
+    print(
+        f"Wrote {written} frames from {len(results)} videos "
+        f"({sampled - written} near-duplicates dropped), {len(failures)} failed: {images_dir}"
+    )
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="extract_frames",
+        description="Extract sampled, de-duplicated frames from DJI videos into an images/ folder for labeling.",
+    )
+    parser.add_argument("-i", "--input_folder", required=True)
+    parser.add_argument("-o", "--output_folder", required=True)
+    parser.add_argument(
+        "--by",
+        choices=SAMPLING_MODES,
+        default="time",
+        help="Sample one frame per --every seconds, frames or metres travelled.",
+    )
+    parser.add_argument(
+        "--every", type=float, default=1.0, help="Sampling interval in seconds, frames or metres."
+    )
+    parser.add_argument(
+        "--frame_times",
+        choices=["packets", "decode"],
+        default="packets",
+        help="Read frame timestamps from the container index (exact for variable frame rates) or by decoding every frame.",
+    )
+    parser.add_argument(
+        "--keyframes",
+        action="store_true",
+        help="Snap samples to the nearest keyframe, so every seek decodes a single frame (needs ffprobe).",
+    )
+    parser.add_argument(
+        "--max_distance",
+        type=int,
+        default=4,
+        help="Drop frames whose dHash differs from the last kept frame in at most this many of 64 bits (-1 keeps all).",
+    )
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality.")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of videos processed in parallel.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Empty the output folder first (utils.make_dirs), instead of adding to it.",
+    )
+    parser.add_argument(
+        "--catalog",
+        default=None,
+        help="Video catalog database (default: $VIDEO_CATALOG or ~/.cache/dodo_analytics).",
+    )
+
+    args = parser.parse_args()
+    failures = process_folder(
+        Path(args.input_folder),
+        Path(args.output_folder),
+        workers=args.workers,
+        overwrite=args.overwrite,
+        catalog_path=args.catalog,
+        by=args.by,
+        every=args.every,
+        frame_times=args.frame_times,
+        keyframes=args.keyframes,
+        max_distance=args.max_distance,
+        quality=args.quality,
+    )
+    if failures:
+        raise SystemExit(1)
@@ -1,9 +1,22 @@
+import io
+import os
 import subprocess
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import cv2
-from scipy.interpolate import interp1d
+from tqdm import tqdm
+
+# run as a script from this folder (python extract_gps.py): make the src
+# folder importable for the shared utils
+SRC_DIR = Path(__file__).resolve().parents[2]
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+from utils.video_catalog import DEFAULT_CATALOG, VideoCatalog
 
 
 # =========================================================
@@ -18,12 +31,12 @@ def srt_time_to_seconds(t: str) -> float:
 # =========================================================
 # EXTRACT EMBEDDED DJI SRT
 # =========================================================
-def extract_embedded_srt(video: Path, srt_out: Path):
+def extract_embedded_srt(video: Path, srt_out: Path, stream: int = 2):
     cmd = [
         "ffmpeg",
         "-y",
         "-i", str(video),
-        "-map", "0:2",
+        "-map", f"0:{stream}",
         "-c:s", "srt",
         str(srt_out),
     ]
@@ -36,151 +49,482 @@ def extract_embedded_srt(video: Path, srt_out: Path):
 
 
 # =========================================================
-# PARSE DJI MINI 3 SRT
-# GPS (lon, lat, alt), H.S x m/s, V.S y m/s
+# PARSE DJI SRT
+# Older firmwares (Mini 3) write one telemetry line per cue:
+#   F/2.8, SS 1000, ISO 100, EV 0, GPS (lon, lat, alt), D 24.5m, H 10.2m, H.S 3.2m/s, V.S 0.0m/s
+# newer ones write bracketed fields, possibly spread over several lines:
+#   [iso: 100] [shutter: 1/1000.0] [focal_len: 24.00] [latitude: 52.37] [longitude: 4.89] [rel_alt: 10.2 abs_alt: 50.1]
+# The file is read once in large chunks of whole cues. Each field is pulled out
+# of a chunk with one findall and converted as a numpy column; a chunk where a
+# field is missing from some cues falls back to matching cue by cue.
 # =========================================================
-def parse_dji_srt(srt_path: Path) -> pd.DataFrame:
+SRT_COLUMNS = {
+    "SampleTime": np.float64,
+    "GPSLatitude": np.float64,
+    "GPSLongitude": np.float64,
+    "GPSAltitude": np.float32,
+    "RelativeAltitude": np.float32,
+    "HorizontalSpeed": np.float32,
+    "VerticalSpeed": np.float32,
+    "HomeDistance": np.float32,
+    "ISO": np.float32,
+    "ExposureTime": np.float32,
+    "FocalLength": np.float32,
+}
+
+SRT_TIME_PATTERN = re.compile(rb"\n(\d+):(\d+):(\d+)[,.](\d+)\s*-->")
+
+# (columns, pattern) per telemetry field; every pattern starts with a literal
+# so the regex engine can skip ahead. Several patterns may fill one column.
+SRT_FIELD_PATTERNS = [
+    (
+        ("GPSLongitude", "GPSLatitude", "GPSAltitude"),
+        re.compile(rb"GPS\s*\(\s*([-0-9.]+)\s*,\s*([-0-9.]+)\s*,\s*([-0-9.]+)"),
+    ),
+    (("GPSLatitude",), re.compile(rb"latitude\s*:?\s*([-0-9.]+)")),
+    (("GPSLongitude",), re.compile(rb"longitude\s*:?\s*([-0-9.]+)")),
+    (("GPSAltitude",), re.compile(rb"abs_alt\s*:?\s*([-0-9.]+)")),
+    (("RelativeAltitude",), re.compile(rb"rel_alt\s*:?\s*([-0-9.]+)")),
+    (("RelativeAltitude",), re.compile(rb", H ([-0-9.]+)m")),
+    (("HorizontalSpeed",), re.compile(rb"H\.S\s*:?\s*([-0-9.]+)")),
+    (("VerticalSpeed",), re.compile(rb"V\.S\s*:?\s*([-0-9.]+)")),
+    (("HomeDistance",), re.compile(rb", D ([-0-9.]+)m")),
+    (("ISO",), re.compile(rb"ISO\s*:?\s*([0-9.]+)")),
+    (("ISO",), re.compile(rb"iso\s*:?\s*([0-9.]+)")),
+    (("ExposureTime",), re.compile(rb"SS\s*:?\s*([0-9./]+)")),
+    (("ExposureTime",), re.compile(rb"shutter\s*:?\s*([0-9./]+)")),
+    (("FocalLength",), re.compile(rb"focal_len\s*:?\s*([0-9.]+)")),
+]
+
+
+def _to_float_column(values: list, column: str) -> np.ndarray:
+    values = np.array(values)
+    if column != "ExposureTime":
+        return values.astype(np.float64)
+
+    # DJI writes either a fraction ("1/1000.0") or just the denominator ("1000")
+    num, sep, den = np.char.partition(values, b"/").T
+    num = num.astype(np.float64)
+    exposure = 1.0 / num
+    fraction = sep == b"/"
+    exposure[fraction] = num[fraction] / den[fraction].astype(np.float64)
+    return exposure
+
+
+def _parse_srt_chunk(chunk: bytes) -> dict:
+    """Parses a chunk of whole cues (starting with a newline) into float64 columns."""
+    times = SRT_TIME_PATTERN.findall(chunk)
+    n = len(times)
+    if not n:
+        return {name: np.empty(0) for name in SRT_COLUMNS}
+
+    h, m, s, ms = np.array(times).astype(np.float64).T
+    columns = {"SampleTime": h * 3600 + m * 60 + s + ms / 1000}
+
+    for names, pattern in SRT_FIELD_PATTERNS:
+        if names[0] in columns:
+            continue
+        found = pattern.findall(chunk)
+        if not found:
+            continue
+        if len(found) != n:
+            return _parse_srt_cues(chunk)
+        found = np.array(found).reshape(n, len(names))
+        for i, name in enumerate(names):
+            columns[name] = _to_float_column(found[:, i], name)
+
+    for name in SRT_COLUMNS:
+        if name not in columns:
+            columns[name] = np.full(n, np.nan)
+    return columns
+
+
+def _parse_srt_cues(chunk: bytes) -> dict:
+    """Slow path for chunks with irregular cues: matches every field cue by cue."""
+    starts = [m.start() for m in SRT_TIME_PATTERN.finditer(chunk)] + [len(chunk)]
     rows = []
-    lines = srt_path.read_text(encoding="utf-8", errors="ignore").splitlines()
-
-    gps_pattern = re.compile(
-        r"GPS\s*\(\s*([-0-9.]+)\s*,\s*([-0-9.]+)\s*,\s*([-0-9.]+)\s*\)",
-        re.IGNORECASE,
-    )
-    hs_pattern = re.compile(r"H\.S\s*([-0-9.]+)", re.IGNORECASE)
-    vs_pattern = re.compile(r"V\.S\s*([-0-9.]+)", re.IGNORECASE)
-
-    i = 0
-    while i < len(lines):
-        if "-->" in lines[i]:
-            start_time = lines[i].split(" --> ")[0].strip()
-            t = srt_time_to_seconds(start_time)
-
-            if i + 1 < len(lines):
-                text = lines[i + 1]
-
-                gps_match = gps_pattern.search(text)
-                if gps_match:
-                    lon, lat, alt = map(float, gps_match.groups())
-
-                    hs = None
-                    vs = None
-
-                    m_hs = hs_pattern.search(text)
-                    if m_hs:
-                        hs = float(m_hs.group(1))
-
-                    m_vs = vs_pattern.search(text)
-                    if m_vs:
-                        vs = float(m_vs.group(1))
-
-                    rows.append({
-                        "SampleTime": t,
-                        "GPSLatitude": lat,
-                        "GPSLongitude": lon,
-                        "GPSAltitude": alt,
-                        "HorizontalSpeed": hs,
-                        "VerticalSpeed": vs,
-                    })
-        i += 1
-
-    if not rows:
+    for begin, end in zip(starts[:-1], starts[1:]):
+        cue = chunk[begin:end]
+        h, m, s, ms = map(float, SRT_TIME_PATTERN.match(cue).groups())
+        row = dict.fromkeys(SRT_COLUMNS, np.nan)
+        row["SampleTime"] = h * 3600 + m * 60 + s + ms / 1000
+        for names, pattern in SRT_FIELD_PATTERNS:
+            match = pattern.search(cue)
+            if match and row[names[0]] != row[names[0]]:
+                for name, value in zip(names, match.groups()):
+                    row[name] = _to_float_column([value], name)[0]
+        rows.append([row[name] for name in SRT_COLUMNS])
+
+    rows = np.array(rows, dtype=np.float64).reshape(len(rows), len(SRT_COLUMNS))
+    return {name: rows[:, i] for i, name in enumerate(SRT_COLUMNS)}
+
+
+def parse_dji_srt_columns(source, chunk_size: int = 1 << 22) -> dict:
+    """Parses DJI telemetry into a dict of typed numpy columns (see SRT_COLUMNS).
+
+    source is an .srt path, the raw file bytes, or an open binary file. Fields a
+    cue does not carry are NaN; cues without a GPS position are dropped.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(source)
+    elif isinstance(source, (str, Path)):
+        stream = open(source, "rb")
+    else:
+        stream = source
+
+    parts = {name: [] for name in SRT_COLUMNS}
+    tail = b"\n"
+    try:
+        while True:
+            data = stream.read(chunk_size)
+            buffer = (tail + data).replace(b"\r\n", b"\n")
+            if data:
+                # keep the last, possibly incomplete cue for the next chunk
+                cut = buffer.rfind(b"\n\n") + 1
+                if not cut:
+                    tail = buffer
+                    continue
+                buffer, tail = buffer[:cut], buffer[cut - 1:]
+            chunk = _parse_srt_chunk(buffer)
+            for name, values in chunk.items():
+                parts[name].append(values)
+            if not data:
+                break
+    finally:
+        if stream is not source:
+            stream.close()
+
+    columns = {
+        name: np.concatenate(values).astype(SRT_COLUMNS[name], copy=False)
+        for name, values in parts.items()
+    }
+    has_gps = ~(np.isnan(columns["GPSLatitude"]) | np.isnan(columns["GPSLongitude"]))
+    if not has_gps.all():
+        columns = {name: values[has_gps] for name, values in columns.items()}
+    return columns
+
+
+def parse_dji_srt(srt_path) -> pd.DataFrame:
+    columns = parse_dji_srt_columns(srt_path)
+    if not len(columns["SampleTime"]):
         raise RuntimeError(f"No GPS data parsed from {srt_path}")
 
-    return pd.DataFrame(rows)
+    return pd.DataFrame(columns, copy=False)
 
 
 # =========================================================
 # FRAME TIMES
+# Presentation timestamps come from the container packet index via ffprobe,
+# so no frame is decoded. Packets are listed in decode order; sorting the PTS
+# gives presentation order and keeps variable-frame-rate clips exact.
 # =========================================================
-def extract_frame_times(video_path: Path) -> pd.DataFrame:
+def extract_frame_times_packets(video_path: Path) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time",
+        "-of", "csv=p=0",
+        str(video_path),
+    ]
+    out = subprocess.run(
+        cmd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    tokens = [t for t in out.split() if t and t != "N/A"]
+    if not tokens:
+        raise RuntimeError(f"No packet timestamps found in {video_path}")
+
+    times = np.sort(np.array(tokens, dtype=np.float64))
+    times -= times[0]
+
+    return {
+        "FrameIndex": np.arange(len(times), dtype=np.int64),
+        "FrameTime": times,
+    }
+
+
+def extract_frame_times_decode(video_path: Path) -> dict:
     cap = cv2.VideoCapture(str(video_path))
     fps = cap.get(cv2.CAP_PROP_FPS)
 
-    frames = []
-    idx = 0
-
+    count = 0
     while cap.isOpened():
-        ret, _ = cap.read()
+        ret = cap.grab()
         if not ret:
             break
-        frames.append({
-            "FrameIndex": idx,
-            "FrameTime": idx / fps,
-        })
-        idx += 1
+        count += 1
 
     cap.release()
-    return pd.DataFrame(frames)
+
+    index = np.arange(count, dtype=np.int64)
+    return {
+        "FrameIndex": index,
+        "FrameTime": index / fps,
+    }
+
+
+def extract_frame_times(video_path: Path, method: str = "packets") -> dict:
+    """Returns per-frame FrameIndex/FrameTime numpy columns for a video.
+
+    method="packets" reads timestamps from the container without decoding and
+    falls back to method="decode" (constant fps, every frame read) when the
+    container cannot be probed.
+    """
+    if method == "decode":
+        return extract_frame_times_decode(video_path)
+
+    try:
+        return extract_frame_times_packets(video_path)
+    except (OSError, subprocess.CalledProcessError, RuntimeError, ValueError) as e:
+        print(f"  ↳ Packet index unusable ({e}), decoding frames instead")
+        return extract_frame_times_decode(video_path)
 
 
 # =========================================================
 # INTERPOLATE GPS TO EVERY FRAME
+# All channels are interpolated at once from one telemetry matrix. Samples are
+# sorted by time and duplicate timestamps dropped, so out-of-order SRT cues do
+# not break the interpolation. Frames outside the telemetry range are linearly
+# extrapolated ("linear"), held at the first/last sample ("clamp") or NaN.
 # =========================================================
-def interpolate_gps(gps: pd.DataFrame, frames: pd.DataFrame) -> pd.DataFrame:
-    interp_lat = interp1d(
-        gps["SampleTime"], gps["GPSLatitude"], fill_value="extrapolate"
-    )
-    interp_lon = interp1d(
-        gps["SampleTime"], gps["GPSLongitude"], fill_value="extrapolate"
-    )
-    interp_alt = interp1d(
-        gps["SampleTime"], gps["GPSAltitude"], fill_value="extrapolate"
-    )
+GPS_CHANNELS = [
+    "GPSLatitude",
+    "GPSLongitude",
+    "GPSAltitude",
+    "RelativeAltitude",
+    "HorizontalSpeed",
+    "VerticalSpeed",
+    "HomeDistance",
+]
+
+
+def interpolate_gps(
+    gps: pd.DataFrame,
+    frames,
+    extrapolate: str = "linear",
+    channels: list = GPS_CHANNELS,
+):
+    channels = [c for c in channels if c in gps]
+
+    t = np.asarray(gps["SampleTime"], dtype=np.float64)
+    order = np.argsort(t, kind="stable")
+    t, first = np.unique(t[order], return_index=True)
+    values = np.column_stack(
+        [np.asarray(gps[c], dtype=np.float64) for c in channels]
+    )[order][first]
+
+    x = np.asarray(frames["FrameTime"], dtype=np.float64)
+    if len(t) == 1:
+        out = np.repeat(values, len(x), axis=0)
+    else:
+        i = np.clip(np.searchsorted(t, x, side="right"), 1, len(t) - 1)
+        w = (x - t[i - 1]) / (t[i] - t[i - 1])
+        if extrapolate == "clamp":
+            w = np.clip(w, 0.0, 1.0)
+        out = values[i - 1] + w[:, None] * (values[i] - values[i - 1])
+
+    if extrapolate == "nan":
+        out[(x < t[0]) | (x > t[-1])] = np.nan
+
+    for j, c in enumerate(channels):
+        frames[c] = out[:, j]
+
+    return frames
 
-    frames["GPSLatitude"] = interp_lat(frames["FrameTime"])
-    frames["GPSLongitude"] = interp_lon(frames["FrameTime"])
-    frames["GPSAltitude"] = interp_alt(frames["FrameTime"])
 
-    if "HorizontalSpeed" in gps.columns:
-        interp_hs = interp1d(
-            gps["SampleTime"], gps["HorizontalSpeed"], fill_value="extrapolate"
-        )
-        frames["HorizontalSpeed"] = interp_hs(frames["FrameTime"])
+# =========================================================
+# WRITE FRAMES
+# Parquet output is one hive-partitioned dataset, flight=<folder>/<video>.parquet,
+# which pandas/pyarrow read back in one call: pd.read_parquet(output_folder).
+# float32 precision halves the file size; latitude/longitude stay float64
+# because float32 degrees only resolve to ~0.5 m.
+# =========================================================
+def flight_name(video: Path) -> str:
+    return video.parent.name
 
-    if "VerticalSpeed" in gps.columns:
-        interp_vs = interp1d(
-            gps["SampleTime"], gps["VerticalSpeed"], fill_value="extrapolate"
-        )
-        frames["VerticalSpeed"] = interp_vs(frames["FrameTime"])
 
-    return frames
+def output_path(video: Path, output_dir: Path, fmt: str = "parquet") -> Path:
+    if fmt == "csv":
+        return output_dir / f"{video.stem}.csv"
+    return output_dir / f"flight={flight_name(video)}" / f"{video.stem}.parquet"
+
+
+def write_frames(frames: pd.DataFrame, out: Path, fmt: str = "parquet", precision: str = "float64"):
+    if precision == "float32":
+        keep = {"FrameTime", "GPSLatitude", "GPSLongitude"}
+        frames = frames.astype({
+            c: np.float32
+            for c in frames.select_dtypes("float64").columns
+            if c not in keep
+        })
+
+    # write next to the target and rename, so an interrupted run never leaves
+    # a truncated output that looks up to date on the next run
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}.tmp")
+    if fmt == "csv":
+        frames.to_csv(tmp, index=False)
+    else:
+        frames.to_parquet(tmp, index=False, engine="pyarrow", compression="zstd")
+    tmp.replace(out)
 
 
 # =========================================================
 # PROCESS SINGLE VIDEO
 # =========================================================
-def process_single_video(video: Path, output_dir: Path):
-    print(f"▶ Processing {video.name}")
+def is_up_to_date(video: Path, output_dir: Path, fmt: str = "parquet") -> bool:
+    out = output_path(video, output_dir, fmt)
+    if not out.exists():
+        return False
+
+    inputs = [video, video.with_suffix(".srt")]
+    newest_input = max(p.stat().st_mtime for p in inputs if p.exists())
+    return out.stat().st_mtime >= newest_input
+
+
+def process_single_video(
+    video: Path,
+    output_dir: Path,
+    frame_times: str = "packets",
+    fmt: str = "parquet",
+    precision: str = "float64",
+    extrapolate: str = "linear",
+    subtitle_stream: int = 2,
+    verbose: bool = True,
+):
+    if verbose:
+        print(f"▶ Processing {video.name}")
 
     srt = video.with_suffix(".srt")
     if not srt.exists():
-        print("  ↳ Extracting embedded DJI subtitles")
-        extract_embedded_srt(video, srt)
+        if verbose:
+            print("  ↳ Extracting embedded DJI subtitles")
+        tmp_srt = srt.with_name(f".{srt.name}.tmp.srt")
+        extract_embedded_srt(video, tmp_srt, subtitle_stream)
+        tmp_srt.replace(srt)
 
     gps = parse_dji_srt(srt)
-    frames = extract_frame_times(video)
-    frames = interpolate_gps(gps, frames)
+    frames = pd.DataFrame(extract_frame_times(video, method=frame_times))
+    frames = interpolate_gps(gps, frames, extrapolate=extrapolate)
 
     frames["SourceFile"] = video.name
 
-    output_dir.mkdir(parents=True, exist_ok=True)
-    out_csv = output_dir / f"{video.stem}.csv"
-    frames.to_csv(out_csv, index=False)
+    out = output_path(video, output_dir, fmt)
+    write_frames(frames, out, fmt=fmt, precision=precision)
+
+    if verbose:
+        print(f"Wrote {out}")
 
-    print(f"Wrote {out_csv}")
+
+def _process_video_isolated(video: Path, output_dir: Path, options: dict):
+    """Runs process_single_video in a worker and returns an error string instead of raising."""
+    try:
+        process_single_video(video, output_dir, verbose=False, **options)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
 
 
 # =========================================================
 # PROCESS FOLDER
+# Videos run in a process pool; a failing video is reported and the rest of
+# the batch continues. Videos whose output is newer than the video and its
+# .srt are skipped unless force=True, so a crashed batch resumes where it was.
+# The video catalog (utils.video_catalog) tells up front which videos are
+# unreadable or have no embedded subtitles, and which stream to extract.
 # =========================================================
-def process_folder(input_folder: Path, output_folder: Path):
-    videos = list(input_folder.rglob("*.mp4"))
+def plan_videos(videos: list, catalog_path: Path = None):
+    """Returns ({video: subtitle stream to extract}, {video: reason it cannot be processed})."""
+    with VideoCatalog(catalog_path or DEFAULT_CATALOG) as catalog:
+        records = catalog.scan(videos)
+
+    streams, problems = {}, {}
+    for video, record in records.items():
+        has_srt = video.with_suffix(".srt").exists()
+        if record is None:
+            problems[video] = "unreadable video"
+        elif (
+            not has_srt
+            and record["subtitle_stream"] is None
+            and record["prober"] == "ffprobe"
+        ):
+            problems[video] = "no .srt and no embedded subtitle stream"
+        else:
+            stream = record["subtitle_stream"]
+            streams[video] = 2 if stream is None else stream
+    return streams, problems
+
+
+def process_folder(
+    input_folder: Path,
+    output_folder: Path,
+    frame_times: str = "packets",
+    workers: int = 1,
+    force: bool = False,
+    fmt: str = "parquet",
+    precision: str = "float64",
+    extrapolate: str = "linear",
+    catalog_path: Path = None,
+) -> dict:
+    videos = sorted(input_folder.rglob("*.mp4"))
     if not videos:
         raise RuntimeError("No MP4 files found")
 
-    for video in videos:
-        process_single_video(video, output_folder)
+    options = {
+        "frame_times": frame_times,
+        "fmt": fmt,
+        "precision": precision,
+        "extrapolate": extrapolate,
+    }
+    pending = [v for v in videos if force or not is_up_to_date(v, output_folder, fmt)]
+    skipped = len(videos) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} up-to-date videos")
+
+    streams, failures = plan_videos(pending, catalog_path)
+    for video, problem in failures.items():
+        print(f"✗ {video.name}: {problem}")
+    runnable = [v for v in pending if v in streams]
+
+    def video_options(video):
+        return {**options, "subtitle_stream": streams[video]}
+
+    with tqdm(total=len(runnable), desc="Videos", unit="video") as progress:
+        if workers <= 1:
+            for video in runnable:
+                error = _process_video_isolated(video, output_folder, video_options(video))
+                if error:
+                    failures[video] = error
+                    progress.write(f"✗ {video.name}: {error}")
+                progress.update()
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(
+                        _process_video_isolated, video, output_folder, video_options(video)
+                    ): video
+                    for video in runnable
+                }
+                for future in as_completed(futures):
+                    video = futures[future]
+                    try:
+                        error = future.result()
+                    except Exception as e:  # worker process died
+                        error = f"{type(e).__name__}: {e}"
+                    if error:
+                        failures[video] = error
+                        progress.write(f"✗ {video.name}: {error}")
+                    progress.update()
+
+    print(
+        f"Processed {len(pending) - len(failures)} / {len(pending)} videos, "
+        f"{skipped} skipped, {len(failures)} failed"
+    )
+    return failures
 
 
 # =========================================================
@@ -190,10 +534,63 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(
-        description="Extract per-frame GPS from DJI Mini 3 videos (one CSV per video)"
+        description="Extract per-frame GPS from DJI Mini 3 videos into a Parquet dataset partitioned by flight"
     )
     parser.add_argument("-i", "--input_folder", required=True)
     parser.add_argument("-o", "--output_folder", required=True)
+    parser.add_argument(
+        "--frame_times",
+        choices=["packets", "decode"],
+        default="packets",
+        help="Read frame timestamps from the container index (fast) or by decoding every frame.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of videos processed in parallel.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess videos whose output is already newer than the video and .srt.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["parquet", "csv"],
+        default="parquet",
+        help="Parquet dataset partitioned by flight, or one CSV per video.",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=["float64", "float32"],
+        default="float64",
+        help="Store telemetry channels as float32 (latitude/longitude stay float64).",
+    )
+    parser.add_argument(
+        "--extrapolate",
+        choices=["linear", "clamp", "nan"],
+        default="linear",
+        help="How frames before the first / after the last SRT sample are filled.",
+    )
+    parser.add_argument(
+        "--catalog",
+        default=None,
+        help="Video catalog database (default: $VIDEO_CATALOG or ~/.cache/dodo_analytics).",
+    )
 
     args = parser.parse_args()
-    process_folder(Path(args.input_folder), Path(args.output_folder))
+    failures = process_folder(
+        Path(args.input_folder),
+        Path(args.output_folder),
+        frame_times=args.frame_times,
+        workers=args.workers,
+        force=args.force,
+        fmt=args.format,
+        precision=args.precision,
+        extrapolate=args.extrapolate,
+        catalog_path=args.catalog,
+    )
+    if failures:
+        raise SystemExit(1)
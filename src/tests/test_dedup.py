@@ -0,0 +1,90 @@
+"""Run from the src folder: python -m pytest tests"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from infer.dedup import EARTH_RADIUS, deduplicate
+from infer.geotiles import focal_length_px
+
+LAT, LON = 52.37, 4.89
+WIDTH, HEIGHT, ALTITUDE = 3840, 2160, 20.0
+
+
+class MemoryStore:
+    """Stands in for a GeotagStore holding the given detections."""
+
+    names = {0: "can"}
+
+    def __init__(self, detections):
+        self.detections = detections
+
+    def read(self, columns=None):
+        return pa.Table.from_pandas(self.detections, preserve_index=False)
+
+
+def eastbound_pass(objects, speed=5.0, fps=30, seconds=4.0):
+    """Detections of ground objects (east, north metres from the start) seen
+    from a drone flying east, one detection per object per frame in view."""
+    focal = focal_length_px(WIDTH, HEIGHT, 82.1)
+    rows = []
+    for frame in range(int(seconds * fps)):
+        t = frame / fps
+        east = speed * t
+        for object_east, object_north in objects:
+            # heading east: image up is east, image right is south
+            u = WIDTH / 2 - object_north * focal / ALTITUDE
+            v = HEIGHT / 2 - (object_east - east) * focal / ALTITUDE
+            if 0 <= u < WIDTH and 0 <= v < HEIGHT:
+                rows.append((frame, t, east, u, v))
+    frame, t, east, u, v = map(np.array, zip(*rows))
+    return pd.DataFrame(
+        {
+            "SourceFile": "a.mp4",
+            "FrameIndex": frame,
+            "FrameTime": t,
+            "Class": np.zeros(len(t), dtype=np.int16),
+            "Confidence": np.full(len(t), 0.9, dtype=np.float32),
+            "X1": u - 10,
+            "Y1": v - 10,
+            "X2": u + 10,
+            "Y2": v + 10,
+            "GPSLatitude": LAT,
+            "GPSLongitude": LON + np.degrees(east / (EARTH_RADIUS * np.cos(np.radians(LAT)))),
+            "RelativeAltitude": ALTITUDE,
+        }
+    )
+
+
+def metres(lat, lon):
+    """East, north metres from the start of the pass."""
+    lat, lon = np.asarray(lat), np.asarray(lon)
+    east = np.radians(lon - LON) * EARTH_RADIUS * np.cos(np.radians(LAT))
+    return east, np.radians(lat - LAT) * EARTH_RADIUS
+
+
+def test_moving_drone_sees_one_object():
+    detections = eastbound_pass([(10.0, 0.0)])
+    assert detections["FrameIndex"].nunique() > 30
+
+    located, items = deduplicate(MemoryStore(detections), {"a.mp4": (WIDTH, HEIGHT)}, radius=1.0)
+
+    assert len(located) == len(detections)
+    assert len(items) == 1
+    assert items["Observations"].iat[0] == len(detections)
+    # every sighting lands on the object, not smeared along the track and
+    # chained together by single linkage
+    for frame in (located, items):
+        east, north = metres(frame["GroundLatitude"], frame["GroundLongitude"])
+        assert np.abs(east - 10.0).max() < 0.1 and np.abs(north).max() < 0.1
+
+
+def test_moving_drone_keeps_separate_objects_apart():
+    detections = eastbound_pass([(10.0, 0.0), (10.0, 3.0), (14.0, -2.0)])
+
+    _, items = deduplicate(
+        MemoryStore(detections), {"a.mp4": (WIDTH, HEIGHT)}, radius=1.0, time_window=2.0
+    )
+
+    assert len(items) == 3
+    assert items["Observations"].sum() == len(detections)
@@ -0,0 +1,115 @@
+"""In-process bulk file operations.
+
+Folders are scanned with os.scandir and files are copied or hardlinked on a
+thread pool, without starting a shell per file (paths with quotes or spaces
+need no escaping). A bulk operation first builds a plan of (src, dest) pairs,
+which can be returned as a dry run, and reports errors per file instead of
+stopping at the first one:
+
+    plan = [(src, dest_dir / src.name) for src in scan_files(folder, IMAGE_SUFFIXES)]
+    result = bulk_copy(plan, mode="hardlink")
+    print(result.summary())
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import shutil
+
+COPY_MODES = ("copy", "hardlink", "auto")
+
+
+def scan_files(root, suffixes=None, recursive=True):
+    """Yields the files below root (sorted per folder), optionally only with the given suffixes."""
+    suffixes = {suffix.lower() for suffix in suffixes} if suffixes else None
+    try:
+        entries = sorted(os.scandir(root), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from scan_files(entry.path, suffixes, recursive)
+        elif entry.is_file() and (suffixes is None or Path(entry.name).suffix.lower() in suffixes):
+            yield Path(entry.path)
+
+
+class BulkResult:
+    def __init__(self, plan, dry_run=False):
+        self.plan = plan
+        self.dry_run = dry_run
+        self.done = 0
+        self.errors = []  # (src, dest, error message)
+        self.methods = {}
+
+    def summary(self):
+        if self.dry_run:
+            return f"Dry run: {len(self.plan)} files planned"
+        methods = ", ".join(f"{n} by {method}" for method, n in sorted(self.methods.items()))
+        return f"{self.done} / {len(self.plan)} files placed ({methods}), {len(self.errors)} errors"
+
+
+def place_file(src, dest, mode="copy"):
+    """Copies or hardlinks one file; returns the method used."""
+    if mode in ("hardlink", "auto"):
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError:
+            if mode == "hardlink":
+                raise
+    shutil.copy2(src, dest)
+    return "copy"
+
+
+def bulk_copy(plan, mode="copy", workers=32, dry_run=False, overwrite=True):
+    """
+    Places every (src, dest) pair of the plan on a thread pool.
+
+    Parameters:
+        mode (str): copy, hardlink, or auto (hardlink, else copy).
+        dry_run (bool): Only return the plan, touch nothing.
+        overwrite (bool): Replace existing destinations, else report them as errors.
+
+    Returns:
+        BulkResult: The plan, number placed, methods used and per-file errors.
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {COPY_MODES}")
+    plan = [(Path(src), Path(dest)) for src, dest in plan]
+    result = BulkResult(plan, dry_run)
+    if dry_run or not plan:
+        return result
+
+    for folder in {dest.parent for _, dest in plan}:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    def place(job):
+        src, dest = job
+        try:
+            if os.path.lexists(dest):
+                if not overwrite:
+                    raise FileExistsError(f"{dest} exists")
+                os.remove(dest)
+            return place_file(src, dest, mode), None
+        except OSError as error:
+            return None, f"{type(error).__name__}: {error}"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (src, dest), (method, error) in zip(plan, pool.map(place, plan)):
+            if error:
+                result.errors.append((str(src), str(dest), error))
+            else:
+                result.done += 1
+                result.methods[method] = result.methods.get(method, 0) + 1
+    return result
+
+
+def print_result(result, limit=10):
+    """Prints the summary of a bulk operation and its first errors (or planned pairs)."""
+    print(result.summary())
+    if result.dry_run:
+        for src, dest in result.plan[:limit]:
+            print(f"  {src} -> {dest}")
+    for src, dest, error in result.errors[:limit]:
+        print(f"  {src} -> {dest}: {error}")
@@ -0,0 +1,138 @@
+"""Deterministic, group-aware train/test/val splitting.
+
+Every item is assigned to a split from a stable hash of its group key instead
+of a shuffle, so the assignment of an item never depends on the other items:
+adding new images only assigns the new ones, and everything assigned before
+keeps its split (and every artifact cached per split stays valid). All items
+of a group (e.g. the frames of one video or flight) land in the same split,
+so near-identical frames cannot leak from train into test.
+
+    assigner = SplitAssigner({"train": 0.8, "val": 0.2}, group=r"^(.+)_\\d+$")
+    for name in file_names:  # any iterable, processed as a stream
+        split = assigner.assign(name)
+
+With `stratify`, a new group is put in the split that is furthest below its
+ratio among the groups of the same stratum (e.g. the rarest class in the
+group's labels), which keeps rare classes spread over all splits. Those
+choices depend on arrival order, so they are recorded in a state file and
+reused on the next run.
+"""
+
+from itertools import repeat
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+
+DEFAULT_RATIOS = {"train": 0.9, "test": 0.1, "val": 0.0}
+
+
+def stable_hash(key, salt="") -> float:
+    """Uniform value in [0, 1) from the blake2b hash of salt and key."""
+    digest = hashlib.blake2b(f"{salt}\0{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def hash_split(key, ratios=DEFAULT_RATIOS, salt="") -> str:
+    """The split of a key by where its hash falls in the cumulative ratios."""
+    value = stable_hash(key, salt) * sum(ratios.values())
+    for split, ratio in ratios.items():
+        if value < ratio:
+            return split
+        value -= ratio
+    return next(split for split, ratio in reversed(ratios.items()) if ratio > 0)
+
+
+def group_function(group):
+    """Turns a group spec into a function item -> group key.
+
+    None groups by the item itself, a string is a regex whose first group (or
+    the whole match) is the key, applied to the item's file stem; items that
+    do not match are their own group.
+    """
+    if group is None:
+        return str
+    if callable(group):
+        return group
+    pattern = re.compile(group)
+
+    def key(item):
+        stem = Path(str(item)).stem
+        match = pattern.search(stem)
+        if match is None:
+            return stem
+        return match.group(1) if pattern.groups else match.group(0)
+
+    return key
+
+
+class SplitAssigner:
+    def __init__(self, ratios=DEFAULT_RATIOS, salt="", group=None, stratify=False, state=None):
+        """
+        Parameters:
+            ratios (dict): Split name -> fraction, in order.
+            salt (str): Changes every assignment, for a different but still stable split.
+            group: Group key spec, see group_function.
+            stratify (bool): Balance new groups per stratum instead of by hash alone.
+            state (str): JSON file that records the assignments of groups, needed
+                for stratified splits to stay stable across runs.
+        """
+        self.ratios = {split: float(ratio) for split, ratio in ratios.items()}
+        if not any(ratio > 0 for ratio in self.ratios.values()):
+            raise ValueError(f"No split has a positive ratio: {ratios}")
+        self.salt = salt
+        self.group = group_function(group)
+        self.stratify = stratify
+        self.state = Path(state) if state else None
+        self.groups, self.counts = {}, {}
+        if self.state and self.state.exists():
+            data = json.loads(self.state.read_text())
+            if data["ratios"] != self.ratios or data["salt"] != salt:
+                raise ValueError(
+                    f"{self.state} was made with ratios {data['ratios']} and salt {data['salt']!r}"
+                )
+            self.groups, self.counts = data["groups"], data["counts"]
+
+    def choose(self, key, stratum):
+        if not self.stratify or stratum is None:
+            return hash_split(key, self.ratios, self.salt)
+        counts = self.counts.setdefault(str(stratum), {})
+        total = sum(counts.values()) + 1
+        # furthest below its share of the stratum; ties go by hash
+        return max(
+            (split for split, ratio in self.ratios.items() if ratio > 0),
+            key=lambda split: (
+                self.ratios[split] * total - counts.get(split, 0),
+                stable_hash(f"{key}\0{split}", self.salt),
+            ),
+        )
+
+    def assign(self, item, stratum=None) -> str:
+        """The split of an item; the first item of a group decides its stratum."""
+        key = self.group(item)
+        split = self.groups.get(key)
+        if split is None:
+            split = self.choose(key, stratum)
+            if self.stratify or self.state:
+                self.groups[key] = split
+                if stratum is not None:
+                    counts = self.counts.setdefault(str(stratum), {})
+                    counts[split] = counts.get(split, 0) + 1
+        return split
+
+    def assign_all(self, items, strata=None):
+        """Yields (item, split) for a stream of items (and optionally their strata)."""
+        strata = strata if strata is not None else repeat(None)
+        for item, stratum in zip(items, strata):
+            yield item, self.assign(item, stratum)
+
+    def save(self):
+        if self.state is None:
+            return
+        self.state.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state.with_name(f".{self.state.name}.tmp")
+        tmp.write_text(
+            json.dumps({"ratios": self.ratios, "salt": self.salt, "groups": self.groups, "counts": self.counts})
+        )
+        os.replace(tmp, self.state)
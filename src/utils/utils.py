@@ -1,31 +1,40 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import cv2
 import glob
 import os
 import shutil
 import numpy as np
 from PIL import ExifTags
-from tqdm import tqdm
 
+try:
+    from .file_ops import bulk_copy, print_result, scan_files
+    from .splitting import DEFAULT_RATIOS, SplitAssigner
+    from .video_catalog import VideoCatalog
+except ImportError:
+    # imported from this folder (from utils import *) rather than as utils.utils
+    from file_ops import bulk_copy, print_result, scan_files
+    from splitting import DEFAULT_RATIOS, SplitAssigner
+    from video_catalog import VideoCatalog
 
-def get_video_resolutions(video_dir):
-    video_dir = Path(video_dir)
-    results = {}
-
-    for video_path in sorted(video_dir.glob("*.mp4")):
-        cap = cv2.VideoCapture(str(video_path))
-        if not cap.isOpened():
-            results[video_path.name] = None
-            continue
 
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        results[video_path.name] = (width, height)
+def get_video_resolutions(video_dir, catalog=None):
+    """Maps every mp4 in video_dir to (width, height), or None if unreadable.
 
-        cap.release()
+    Reads the video catalog (see video_catalog), which probes new or changed
+    videos in parallel and answers the rest from its index.
+    """
+    video_dir = Path(video_dir)
+    videos = sorted(video_dir.glob("*.mp4"))
+    if catalog is None:
+        with VideoCatalog() as catalog:
+            records = catalog.scan(videos)
+    else:
+        records = catalog.scan(videos)
 
-    return results
+    return {
+        video.name: (record["width"], record["height"]) if record else None
+        for video, record in records.items()
+    }
 
 
 # Parameters
@@ -69,48 +78,83 @@ def exif_size(img):
 
 
 def split_rows_simple(
-    file="../data/sm4/out.txt",
+    file="../data/sm4/out.txt", group=None, salt=""
 ):  # from utils import *; split_rows_simple()
-    """Splits a text file into train, test, and val files based on specified ratios; expects a file path as input."""
-    with open(file) as f:
-        lines = f.readlines()
+    """Splits a text file into train, test, and val files based on specified ratios; expects a file path as input.
 
+    Every line goes to the split of its stable hash (see utils.splitting), so
+    lines keep their split when the file grows.
+    """
     s = Path(file).suffix
-    lines = sorted(list(filter(lambda x: len(x) > 0, lines)))
-    i, j, k = split_indices(lines, train=0.9, test=0.1, validate=0.0)
-    for k, v in {"train": i, "test": j, "val": k}.items():  # key, value pairs
-        if v.any():
-            new_file = file.replace(s, f"_{k}{s}")
-            with open(new_file, "w") as f:
-                f.writelines([lines[i] for i in v])
-
-
-def split_files(out_path, file_name, prefix_path=""):  # split training data
-    """Splits file names into separate train, test, and val datasets and writes them to prefixed paths."""
-    file_name = list(filter(lambda x: len(x) > 0, file_name))
-    file_name = sorted(file_name)
-    i, j, k = split_indices(file_name, train=0.9, test=0.1, validate=0.0)
-    datasets = {"train": i, "test": j, "val": k}
-    for key, item in datasets.items():
-        if item.any():
-            with open(f"{out_path}_{key}.txt", "a") as file:
-                for i in item:
-                    file.write(f"{prefix_path}{file_name[i]}\n")
+    assigner = SplitAssigner(DEFAULT_RATIOS, salt=salt, group=group)
+    outputs = {}
+    with open(file) as f:
+        for line in f:
+            if len(line) > 0:
+                split = assigner.assign(line.rstrip("\n"))
+                if split not in outputs:
+                    outputs[split] = open(file.replace(s, f"_{split}{s}"), "w")
+                outputs[split].write(line)
+    for output in outputs.values():
+        output.close()
+
+
+def split_files(
+    out_path, file_name, prefix_path="", group=None, salt="", stratify=None, state=None
+):  # split training data
+    """Splits file names into separate train, test, and val datasets and writes them to prefixed paths.
+
+    file_name may be any iterable and is processed as a stream. Each name is
+    assigned by the stable hash of its group (see utils.splitting.SplitAssigner),
+    so calling this again with only the new names appends them without moving
+    any earlier one. `stratify` maps a file name to its stratum (e.g. its
+    rarest class); stratified assignments are kept in the `state` file.
+    """
+    assigner = SplitAssigner(
+        DEFAULT_RATIOS,
+        salt=salt,
+        group=group,
+        stratify=stratify is not None,
+        state=state,
+    )
+    outputs = {}
+    try:
+        for name in file_name:
+            if len(name) == 0:
+                continue
+            key = assigner.assign(name, stratify(name) if stratify else None)
+            if key not in outputs:
+                outputs[key] = open(f"{out_path}_{key}.txt", "a")
+            outputs[key].write(f"{prefix_path}{name}\n")
+    finally:
+        for output in outputs.values():
+            output.close()
+        assigner.save()
 
 
 def split_indices(
-    x, train=0.9, test=0.1, validate=0.0, shuffle=True
+    x, train=0.9, test=0.1, validate=0.0, shuffle=True, group=None, salt=""
 ):  # split training data
-    """Splits array indices for train, test, and validate datasets according to specified ratios."""
+    """Splits array indices for train, test, and validate datasets according to specified ratios.
+
+    With shuffle, every element is assigned by the stable hash of its group
+    key (the element itself by default, see utils.splitting), so the split of
+    an element does not change when elements are added; the sizes then follow
+    the ratios on average instead of exactly.
+    """
     n = len(x)
     v = np.arange(n)
-    if shuffle:
-        np.random.shuffle(v)
+    if not shuffle:
+        i = round(n * train)  # train
+        j = round(n * test) + i  # test
+        k = round(n * validate) + j  # validate
+        return v[:i], v[i:j], v[j:k]  # return indices
 
-    i = round(n * train)  # train
-    j = round(n * test) + i  # test
-    k = round(n * validate) + j  # validate
-    return v[:i], v[i:j], v[j:k]  # return indices
+    assigner = SplitAssigner(
+        {"train": train, "test": test, "validate": validate}, salt=salt, group=group
+    )
+    splits = np.array([assigner.assign(item) for item in x], dtype=object)
+    return v[splits == "train"], v[splits == "test"], v[splits == "validate"]
 
 
 def make_dirs(dir="new_dir/"):
@@ -147,47 +191,75 @@ def image_folder2file(folder="images/"):  # from utils import *; image_folder2fi
 
 
 def add_coco_background(
-    path="../data/sm4/", n=1000
+    path="../data/sm4/", n=1000, mode="copy", dry_run=False
 ):  # from utils import *; add_coco_background()
     """
     Adds COCO dataset background images to a specified folder and lists them in outb.txt; usage:
 
     `add_coco_background('path/', 1000)`.
+
+    The images are copied (or hardlinked, see utils.file_ops) on a thread pool;
+    with dry_run only the plan is printed.
     """
-    p = f"{path}background"
-    if os.path.exists(p):
+    p = Path(f"{path}background")
+    images = sorted(glob.glob("../coco/images/train2014/*.*"))[:n]
+    plan = [(image, p / Path(image).name) for image in images]
+    if dry_run:
+        result = bulk_copy(plan, mode, dry_run=True)
+        print_result(result)
+        return result
+
+    if p.exists():
         shutil.rmtree(p)  # delete output folder
-    os.makedirs(p)  # make new output folder
+    p.mkdir(parents=True)  # make new output folder
 
     # copy images
-    for image in glob.glob("../coco/images/train2014/*.*")[:n]:
-        os.system(f"cp {image} {p}")
+    result = bulk_copy(plan, mode)
+    print_result(result)
 
     # add to outb.txt and make train, test.txt files
     f = f"{path}out.txt"
     fb = f"{path}outb.txt"
-    os.system(f"cp {f} {fb}")
+    shutil.copyfile(f, fb)
     with open(fb, "a") as file:
-        file.writelines(i + "\n" for i in glob.glob(f"{p}/*.*"))
+        file.writelines(f"{p}/{entry.name}\n" for entry in sorted(os.scandir(p), key=lambda e: e.name))
     split_rows_simple(file=fb)
+    return result
 
 
 def create_single_class_dataset(
     path="../data/sm3",
 ):  # from utils import *; create_single_class_dataset('../data/sm3/')
     """Creates a single-class version of an existing dataset in the specified path."""
-    os.system(f"mkdir {path}_1cls")
+    os.makedirs(f"{path}_1cls", exist_ok=True)
 
 
 def flatten_recursive_folders(
-    path="../../Downloads/data/sm4/",
+    path="../../Downloads/data/sm4/", mode="copy", workers=32, dry_run=False
 ):  # from utils import *; flatten_recursive_folders()
     """Flattens nested folders in 'path/images' and 'path/json' into single 'images_flat' and 'json_flat'
     directories.
+
+    Files are placed by utils.file_ops.bulk_copy, copied or hardlinked
+    (mode) on a thread pool; missing jsons are reported per file. With dry_run
+    the plan is printed and returned without touching anything.
     """
-    idir, _jdir = f"{path}images/", f"{path}json/"
+    idir = f"{path}images/"
     nidir, njdir = Path(f"{path}images_flat/"), Path(f"{path}json_flat/")
+
+    plan = []
     n = 0
+    for image in scan_files(idir, suffixes=[f".{suffix}" for suffix in img_formats]):
+        n += 1
+        stem_new = f"{n:g}_{image.stem}"
+        json = Path(str(image.parent).replace("images", "json")) / f"{image.stem}.json"
+        plan.append((json, njdir / f"{stem_new}.json"))
+        plan.append((image, nidir / (stem_new + image.suffix)))
+
+    if dry_run:
+        result = bulk_copy(plan, mode, dry_run=True)
+        print_result(result)
+        return result
 
     # Create output folders
     for p in [nidir, njdir]:
@@ -195,26 +267,10 @@ def flatten_recursive_folders(
             shutil.rmtree(p)  # delete output folder
         os.makedirs(p)  # make new output folder
 
-    for parent, dirs, files in os.walk(idir):
-        for f in tqdm(files, desc=parent):
-            f = Path(f)
-            stem, suffix = f.stem, f.suffix
-            if suffix.lower()[1:] in img_formats:
-                n += 1
-                stem_new = f"{n:g}_{stem}"
-                image_new = nidir / (stem_new + suffix)  # converts all formats to *.jpg
-                json_new = njdir / f"{stem_new}.json"
-
-                image = parent / f
-                json = Path(parent.replace("images", "json")) / str(f).replace(
-                    suffix, ".json"
-                )
-
-                os.system(f"cp '{json}' '{json_new}'")
-                os.system(f"cp '{image}' '{image_new}'")
-                # cv2.imwrite(str(image_new), cv2.imread(str(image)))
-
+    result = bulk_copy(plan, mode, workers)
+    print_result(result)
     print(f"Flattening complete: {n:g} jsons and images")
+    return result
 
 
 def coco91_to_coco80_class():  # converts 80-index (val2014) to 91-index (paper)
@@ -0,0 +1,197 @@
+"""Cached catalog of video metadata.
+
+Videos are probed once with ffprobe (OpenCV when ffprobe is missing) for
+resolution, fps, frame count, duration, codec and the index of an embedded DJI
+subtitle stream, in parallel. Results are kept in a local SQLite index keyed
+by absolute path and re-probed only when a file's size or mtime changes, so
+every tool can plan its work without opening the videos again:
+
+    catalog = VideoCatalog()
+    info = catalog.scan(videos)  # {path: record or None if unreadable}
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from pathlib import Path
+import json
+import os
+import sqlite3
+import subprocess
+
+import cv2
+
+DEFAULT_CATALOG = Path(
+    os.environ.get(
+        "VIDEO_CATALOG", Path.home() / ".cache" / "dodo_analytics" / "video_catalog.sqlite"
+    )
+)
+
+FIELDS = (
+    "width",
+    "height",
+    "fps",
+    "frame_count",
+    "duration",
+    "codec",
+    "subtitle_stream",
+    "prober",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    readable INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    frame_count INTEGER,
+    duration REAL,
+    codec TEXT,
+    subtitle_stream INTEGER,
+    prober TEXT
+)
+"""
+
+
+def probe_ffprobe(video: Path) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries",
+        "stream=index,codec_type,codec_name,width,height,avg_frame_rate,nb_frames,duration"
+        ":format=duration",
+        "-of", "json",
+        str(video),
+    ]
+    result = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+    streams = result.get("streams", [])
+    video_streams = [s for s in streams if s.get("codec_type") == "video"]
+    if not video_streams:
+        raise ValueError(f"No video stream in {video}")
+    stream = video_streams[0]
+    subtitles = [s["index"] for s in streams if s.get("codec_type") == "subtitle"]
+
+    rate = stream.get("avg_frame_rate", "0/0")
+    fps = float(Fraction(rate)) if not rate.endswith("/0") else 0.0
+    duration = float(stream.get("duration") or result.get("format", {}).get("duration") or 0)
+    frame_count = int(stream["nb_frames"]) if stream.get("nb_frames") else round(duration * fps)
+    return {
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "fps": fps,
+        "frame_count": frame_count,
+        "duration": duration,
+        "codec": stream.get("codec_name"),
+        "subtitle_stream": subtitles[0] if subtitles else None,
+        "prober": "ffprobe",
+    }
+
+
+def probe_opencv(video: Path) -> dict:
+    """Fallback without ffprobe; cannot see subtitle streams, so a missing
+    subtitle_stream only means "none" when the prober is ffprobe."""
+    cap = cv2.VideoCapture(str(video))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open {video}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        return {
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": fps,
+            "frame_count": frame_count,
+            "duration": frame_count / fps if fps else 0.0,
+            "codec": fourcc.to_bytes(4, "little").decode("ascii", "replace").strip("\x00"),
+            "subtitle_stream": None,
+            "prober": "opencv",
+        }
+    finally:
+        cap.release()
+
+
+def probe_video(video: Path):
+    """Metadata dict of a video, or None if it cannot be read."""
+    try:
+        return probe_ffprobe(video)
+    except OSError:  # no ffprobe
+        pass
+    except (subprocess.CalledProcessError, ValueError, KeyError):
+        return None
+    try:
+        return probe_opencv(video)
+    except RuntimeError:
+        return None
+
+
+class VideoCatalog:
+    def __init__(self, path: Path = DEFAULT_CATALOG, workers: int = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 2)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def cached(self, paths: list) -> dict:
+        """Stored rows for the given absolute paths, {path: row tuple}."""
+        rows = {}
+        names = [str(path) for path in paths]
+        # stay below SQLite's bound parameter limit
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            query = (
+                f"SELECT path, size, mtime_ns, readable, {', '.join(FIELDS)} "
+                f"FROM videos WHERE path IN ({', '.join('?' * len(chunk))})"
+            )
+            rows.update((row[0], row[1:]) for row in self.db.execute(query, chunk))
+        return rows
+
+    def scan(self, videos) -> dict:
+        """Returns {video path: metadata dict, or None if unreadable}, probing the
+        videos that are new or changed since they were cataloged."""
+        videos = [Path(video) for video in videos]
+        paths = [video.resolve() for video in videos]
+        stats = [path.stat() for path in paths]
+        rows = self.cached(paths)
+
+        records, stale = {}, []
+        for video, path, stat in zip(videos, paths, stats):
+            row = rows.get(str(path))
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                records[video] = dict(zip(FIELDS, row[3:])) if row[2] else None
+            else:
+                stale.append((video, path, stat))
+
+        if stale:
+            with ThreadPoolExecutor(self.workers) as pool:
+                probed = list(pool.map(probe_video, [path for _, path, _ in stale]))
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO videos (path, size, mtime_ns, readable, {', '.join(FIELDS)}) "
+                f"VALUES ({', '.join('?' * (len(FIELDS) + 4))})",
+                [
+                    (str(path), stat.st_size, stat.st_mtime_ns, record is not None)
+                    + tuple((record or {}).get(field) for field in FIELDS)
+                    for (_, path, stat), record in zip(stale, probed)
+                ],
+            )
+            self.db.commit()
+            for (video, _, _), record in zip(stale, probed):
+                records[video] = record
+
+        return {video: records[video] for video in videos}
+
+    def get(self, video: Path):
+        return self.scan([video])[Path(video)]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()